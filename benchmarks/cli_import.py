@@ -0,0 +1,64 @@
+# Start-up time of cli.py and heavy modules imported before a command runs
+#
+# Usage: python -m benchmarks.cli_import [config] [--repeat N]
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+HEAVY_MODULES = ("pandas", "numpy", "plotly")
+CASES = {
+    "python": "pass",
+    "cli --help": "import cli; cli.main(['--help'])",
+    "load_config": "import cli; cli.load_config(sys.argv[1])",
+    "loader": "import src.data_wrangling.loader",
+}
+
+
+def run_case(code: str, config: str) -> tuple:
+    """Run code in a fresh interpreter from the repository root
+    ----------
+    Parameters:
+    code : Python statements, sys is imported, config path is sys.argv[1]
+    config : configuration file passed to the code
+    -------
+    Returns:
+    tuple of wall time in seconds and imported heavy modules
+    """
+    report = (
+        f"print(json.dumps(sorted(set({list(HEAVY_MODULES)!r}) & set(sys.modules))))"
+    )
+    script = f"import sys\ntry:\n    {code}\nexcept SystemExit:\n    pass\n"
+    script += f"import json\n{report}\n"
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", script, config],
+        cwd=root,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    elapsed = time.perf_counter() - started
+    return elapsed, json.loads(result.stdout.splitlines()[-1])
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Time start-up of cli.py")
+    parser.add_argument("config", nargs="?", default="config.example.toml")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+    config = os.path.abspath(args.config)
+    for name, code in CASES.items():
+        runs = [run_case(code, config) for _ in range(args.repeat)]
+        best = min(elapsed for elapsed, _ in runs)
+        modules = ", ".join(runs[0][1]) or "-"
+        print(f"{name:>12}: {best * 1000:8.1f} ms, imports {modules}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
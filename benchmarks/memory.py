@@ -0,0 +1,110 @@
+# Memory of loaded dictionaries against CompactArchive on synthetic workbooks
+#
+# Usage: python -m benchmarks.memory [directory] [--years N] [--households N]
+#                                    [--channels N]
+
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+
+from benchmarks.synthetic import generate
+
+
+def frames_nbytes(prepared: dict) -> int:
+    """Deep size of DataFrames and Series of loaded households
+    ----------
+    Parameters:
+    prepared : dictionary household -> (incomes, savings, expenses, ...)
+    -------
+    Returns:
+    size in bytes including index and column labels
+    """
+    import numpy as np
+    import pandas as pd
+
+    size = 0
+    for sections in prepared.values():
+        for section in sections[:3]:
+            for frame in section.values():
+                size += int(np.sum(frame.memory_usage(deep=True, index=True)))
+                if isinstance(frame, pd.DataFrame):
+                    size += frame.columns.memory_usage(deep=True)
+    return size
+
+
+def run(directory: str, years: int, households: int, channels: int) -> dict:
+    """Load synthetic households as dictionaries and as CompactArchive
+    ----------
+    Parameters:
+    directory : directory for synthetic workbooks (reused if already generated)
+    years : number of years per household
+    households : number of households
+    channels : number of expense channels
+    -------
+    Returns:
+    dictionary measurement -> value
+    """
+    os.environ.setdefault("HFA_CACHE_DIR", os.path.join(directory, "cache"))
+    specs = generate(directory, years, households, channels)
+    from src.data_wrangling.compact import compact
+    from src.data_wrangling.forecaster import monthly_matrix
+    from src.data_wrangling.loader import prepare_many
+
+    prepare_many(specs)
+    gc.collect()
+    tracemalloc.start()
+    prepared = prepare_many(specs)
+    gc.collect()
+    dicts_traced = tracemalloc.get_traced_memory()[0]
+    archive = compact(prepared)
+    dicts_nbytes = frames_nbytes(prepared)
+    expenses = [sections[2] for sections in prepared.values()]
+    float_total = sum(monthly_matrix(section).values.sum() for section in expenses)
+    del prepared, expenses
+    gc.collect()
+    compact_traced = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    exact_total = int(archive.matrix("expenses", kopecks=True).values.sum())
+    return {
+        "months": len(archive.months("expenses")),
+        "channels": len(archive.channels),
+        "dicts_traced": dicts_traced,
+        "dicts_nbytes": dicts_nbytes,
+        "compact_traced": compact_traced,
+        "compact_nbytes": archive.nbytes,
+        "expenses_float": float_total,
+        "expenses_kopecks": exact_total,
+    }
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare memory of CompactArchive")
+    parser.add_argument("directory", nargs="?")
+    parser.add_argument("--years", type=int, default=30)
+    parser.add_argument("--households", type=int, default=3)
+    parser.add_argument("--channels", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.directory:
+        results = run(args.directory, args.years, args.households, args.channels)
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            results = run(directory, args.years, args.households, args.channels)
+    mib = 2**20
+    print(f"months x households: {results['months']} x {args.households}, "
+          f"channels: {results['channels']}")
+    print(f"dictionaries: {results['dicts_traced'] / mib:8.2f} MiB traced, "
+          f"{results['dicts_nbytes'] / mib:8.2f} MiB deep size")
+    print(f"compact:      {results['compact_traced'] / mib:8.2f} MiB traced, "
+          f"{results['compact_nbytes'] / mib:8.2f} MiB arrays")
+    drift = results["expenses_float"] - results["expenses_kopecks"] / 100
+    print(f"expenses: {results['expenses_float']:.6f} summed as float, "
+          f"{results['expenses_kopecks'] / 100:.2f} in kopecks (drift {drift:.2e})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+# Micro-benchmark of sort_dict_by_time on dictionaries with many month keys
+#
+# Usage: python -m benchmarks.month_keys [number_of_keys]
+
+import random
+import sys
+import timeit
+from datetime import datetime
+
+from src.data_wrangling.dict_handler import MONTHS, sort_dict_by_time
+
+
+def legacy_sort_dict_by_time(source_dict: dict, ascending: bool = True) -> dict:
+    """Previous implementation based on string replacing and strptime"""
+    ru_to_eng_months = {
+        "Январь": "January",
+        "Февраль": "February",
+        "Март": "March",
+        "Апрель": "April",
+        "Май": "May",
+        "Июнь": "June",
+        "Июль": "July",
+        "Август": "August",
+        "Сентябрь": "September",
+        "Октябрь": "October",
+        "Ноябрь": "November",
+        "Декабрь": "December",
+    }
+    keys = []
+    for key in source_dict.keys():
+        for ru_month, eng_month in ru_to_eng_months.items():
+            key = key.lower().capitalize()
+            key = key.replace(ru_month, eng_month)
+        key = datetime.strptime(key, "%B_%Y")
+        keys.append(key)
+    time_dict = dict(zip(keys, list(source_dict.values())))
+    sorted_time_dict = dict(sorted(time_dict.items(), reverse=(not ascending)))
+    keys = []
+    for key in sorted_time_dict.keys():
+        key = key.strftime("%B_%Y")
+        for ru_month, eng_month in ru_to_eng_months.items():
+            key = key.replace(eng_month, ru_month)
+        keys.append(key)
+    return dict(zip(keys, list(sorted_time_dict.values())))
+
+
+def month_dict(size: int) -> dict:
+    """Dictionary with `size` unique month keys in random order"""
+    keys = [f"{MONTHS[i % 12]}_{1200 + i // 12}" for i in range(size)]
+    random.Random(0).shuffle(keys)
+    return {key: i for i, key in enumerate(keys)}
+
+
+def main(size: int = 10_000) -> int:
+    source = month_dict(size)
+    expected = list(legacy_sort_dict_by_time(source).items())
+    assert expected == list(sort_dict_by_time(source).items())
+    presorted = sort_dict_by_time(source)
+    cases = {
+        "legacy": lambda: legacy_sort_dict_by_time(source),
+        "unsorted": lambda: sort_dict_by_time(source),
+        "presorted": lambda: sort_dict_by_time(presorted),
+    }
+    for name, case in cases.items():
+        best = min(timeit.repeat(case, number=1, repeat=5))
+        print(f"{name:>10}: {best * 1000:8.2f} ms for {size} keys")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main(*map(int, sys.argv[1:])))
@@ -0,0 +1,208 @@
+# Benchmark suite on synthetic workbooks, results are written as JSON
+#
+# Usage: python -m benchmarks.suite [--years N] [--households N] [--channels N]
+#                                   [--repeat N] [--statement-rows N]
+#                                   [--output benchmarks/results/latest.json]
+#                                   [--compare previous.json]
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import timeit
+from datetime import datetime, timezone
+
+from benchmarks.synthetic import generate, statement_rules, write_statement
+
+
+def measure(func, repeat: int) -> dict:
+    """Time the function
+    ----------
+    Parameters:
+    func : function without arguments
+    repeat : number of runs
+    -------
+    Returns:
+    dictionary with best, mean and all timings in seconds
+    """
+    timings = timeit.repeat(func, number=1, repeat=repeat)
+    return {
+        "best": min(timings),
+        "mean": sum(timings) / len(timings),
+        "runs": timings,
+    }
+
+
+def run(
+    directory: str,
+    years: int,
+    households: int,
+    channels: int,
+    repeat: int,
+    statement_rows: int = 200_000,
+) -> dict:
+    """Generate workbooks and time loading, forecasting and plotting
+    ----------
+    Parameters:
+    directory : directory for synthetic workbooks
+    years : number of years per household
+    households : number of households
+    channels : number of expense channels
+    repeat : number of runs of every benchmark
+    statement_rows : number of transactions of the synthetic bank statement
+    -------
+    Returns:
+    dictionary benchmark name -> timings from measure(),
+    import_statement also has rows and rows_per_second
+    """
+    from src.data_wrangling.backtest import backtest
+    from src.data_wrangling.dict_handler import reduce_dict_by_time, sort_dict_by_time
+    from src.data_wrangling.importer import CompiledRules, import_statement
+    from src.data_wrangling.forecaster import (
+        FORECAST_METHODS,
+        forecast,
+        forecast_savings,
+    )
+    from src.data_wrangling.loader import prepare_data, prepare_many
+    from src.data_wrangling.plotter import plot_alluvial, plot_margin, sankey_data
+
+    os.environ["HFA_CACHE_DIR"] = os.path.join(directory, "cache")
+    start = time.perf_counter()
+    specs = generate(directory, years, households, channels, food=True)
+    elapsed = time.perf_counter() - start
+    results = {"generate": {"best": elapsed, "mean": elapsed, "runs": [elapsed]}}
+    first = specs[0]
+
+    results["prepare_data"] = measure(
+        lambda: prepare_data(first.filename, food_consume=True, use_cache=False),
+        repeat,
+    )
+    prepare_data(first.filename, food_consume=True)
+    results["prepare_data_cached"] = measure(
+        lambda: prepare_data(first.filename, food_consume=True), repeat
+    )
+    results["prepare_many"] = measure(
+        lambda: prepare_many(specs, use_cache=False), 1
+    )
+    incomes, savings, expenses, _ = prepare_many(specs)[first.household]
+    months = list(incomes)
+    until = months[-len(months) // 4 - 1]
+    middle = months[len(months) // 2]
+    unsorted = dict(reversed(list(expenses.items())))
+
+    results["sort_dict_by_time"] = measure(
+        lambda: sort_dict_by_time(dict(unsorted)), repeat
+    )
+    results["reduce_dict_by_time"] = measure(
+        lambda: reduce_dict_by_time(expenses, middle), repeat
+    )
+    for method in FORECAST_METHODS:
+        results[f"forecast[{method}]"] = measure(
+            lambda method=method: forecast(expenses, until, method), repeat
+        )
+    results["backtest"] = measure(lambda: backtest(expenses, horizon=12), repeat)
+    finc = forecast(incomes, until)
+    fexp = forecast(expenses, until)
+    results["forecast_savings"] = measure(
+        lambda: forecast_savings(savings, finc, fexp, until), repeat
+    )
+    sums = {key: value.sum() for key, value in expenses.items()}
+    results["sankey_data"] = measure(lambda: sankey_data(sums), repeat)
+    results["plot_alluvial"] = measure(lambda: plot_alluvial(sums, show=False), repeat)
+    fsav = forecast_savings(savings, finc, fexp, until)
+    results["plot_margin"] = measure(
+        lambda: plot_margin(finc, fsav, fexp, show=False), repeat
+    )
+    statement = os.path.join(directory, "statement.csv")
+    write_statement(statement, statement_rows, years=years)
+    rules = CompiledRules(
+        statement_rules(), incomes[until].columns, expenses[until].columns
+    )
+    timing = measure(lambda: import_statement(statement, rules), repeat)
+    timing["rows"] = statement_rows
+    timing["rows_per_second"] = statement_rows / timing["best"]
+    results["import_statement"] = timing
+    return results
+
+
+def compare(results: dict, previous: dict) -> list[str]:
+    """Ratios of best timings against previous results
+    ----------
+    Parameters:
+    results : current results
+    previous : results loaded from previous JSON file
+    -------
+    Returns:
+    report lines, ratio > 1 means current run is slower
+    """
+    lines = []
+    for name, timing in results.items():
+        old = previous.get(name)
+        if not old or not old.get("best"):
+            continue
+        ratio = timing["best"] / old["best"]
+        lines.append(
+            f"{name:>28}: {old['best'] * 1000:10.2f} ms -> "
+            f"{timing['best'] * 1000:10.2f} ms ({ratio:5.2f}x)"
+        )
+    return lines
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Run benchmark suite")
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--households", type=int, default=2)
+    parser.add_argument("--channels", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--statement-rows", type=int, default=200_000)
+    parser.add_argument("--output", default="benchmarks/results/latest.json")
+    parser.add_argument("--compare", help="previous JSON results")
+    args = parser.parse_args(argv)
+
+    import numpy
+    import pandas
+
+    with tempfile.TemporaryDirectory() as directory:
+        results = run(
+            directory,
+            args.years,
+            args.households,
+            args.channels,
+            args.repeat,
+            args.statement_rows,
+        )
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "pandas": pandas.__version__,
+            "numpy": numpy.__version__,
+            "years": args.years,
+            "households": args.households,
+            "channels": args.channels,
+            "repeat": args.repeat,
+            "statement_rows": args.statement_rows,
+        },
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    for name, timing in results.items():
+        line = f"{name:>28}: {timing['best'] * 1000:10.2f} ms"
+        if "rows_per_second" in timing:
+            line += f" ({timing['rows_per_second']:,.0f} rows/s)"
+        print(line)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)["results"]
+        print("\n".join(compare(results, previous)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,271 @@
+# Generator of synthetic workbooks in the layout of data/template.xlsx
+#
+# Usage: python -m benchmarks.synthetic output_dir [--years N] [--households N]
+#                                       [--channels N] [--food] [--seed N]
+
+import argparse
+import calendar
+import csv
+import random
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from src.data_wrangling.dict_handler import MONTHS
+from src.data_wrangling.loader import WorkbookSpec
+
+INCOME_CHANNELS = ["Зарплата", "Муж/Жена", "Семья", "Бонусы", "Разное"]
+EXPENSE_GROUPS = {
+    "Связь": ["телефон и интернет"],
+    "еда": ["мясо", "рыба", "сладкое", "Колбасы,\nсыры", "овощи,\nФрукты", "Разное"],
+    "По дому": ["Химия"],
+    "Транспорт": ["маршрутка"],
+    "Красота": ["Косметика", "спортзал"],
+    "Отдых": ["Путешествия", "Еда", "Алкоголь", "Разное"],
+    "Домашние животные": ["Корм", "Медицина", "Разное"],
+    "Разное": ["кредит", "страховка", "разное", "непредвиденное"],
+    "Семья": ["Супруг/Супруга", "Дети", "Родители"],
+    "медицина": ["регулярное", "непредвиденное"],
+    "одежда": ["одежда", "обувь"],
+    "жилье": ["кредит", "аренда, страховка", "ремонт", "комунальные"],
+    "машина": [
+        "кредит",
+        "страховка",
+        "Уход\n(мойка, стоянка)",
+        "Ремонт,\nРасходники",
+        "бензин",
+    ],
+    "Обучение": ["Плата за обучение", "Канцтовары"],
+}
+DAY_ROWS = 31
+FOOD_LABEL = "Потребление в кг:"
+# Merchants of synthetic bank statements: description, expense column, amount range
+MERCHANTS = [
+    ("PYATEROCHKA", ("еда", "Разное"), (50, 3_000)),
+    ("MAGNIT MM", ("еда", "овощи,\nФрукты"), (50, 2_000)),
+    ("MYASNOY DVOR", ("еда", "мясо"), (300, 5_000)),
+    ("LUKOIL AZS", ("машина", "бензин"), (1_000, 4_000)),
+    ("MTS MOBILE", ("Связь", "телефон и интернет"), (300, 900)),
+    ("APTEKA 36.6", ("медицина", "регулярное"), (100, 3_000)),
+    ("WILDBERRIES", ("одежда", "одежда"), (500, 10_000)),
+    ("METRO TRANSPORT", ("Транспорт", "маршрутка"), (40, 70)),
+    ("ZHKU PLATEZH", ("жилье", "комунальные"), (3_000, 9_000)),
+    ("TRANSFER TO CARD", ("Разное", "разное"), (100, 20_000)),
+]
+PAYERS = [("ZARPLATA OOO ROMASHKA", "Зарплата"), ("PEREVOD OT", "Семья")]
+
+
+def expense_groups(channels: int) -> dict[str, list[str]]:
+    """Expense groups of the template extended by synthetic groups
+    ----------
+    Parameters:
+    channels : total number of expense channels, at least as in the template
+    -------
+    Returns:
+    dictionary group -> channel names
+    """
+    groups = {group: list(names) for group, names in EXPENSE_GROUPS.items()}
+    extra = channels - sum(len(names) for names in groups.values())
+    for i in range(0, max(extra, 0), 4):
+        groups[f"Группа {i // 4 + 1}"] = [
+            f"канал {j + 1}" for j in range(min(4, extra - i))
+        ]
+    return groups
+
+
+def _month_rows(
+    month: int, year: int, groups: dict, balance: float, food: bool, rng
+) -> tuple[list[list], float]:
+    channels = [channel for names in groups.values() for channel in names]
+    header = ["дата", "доход"] + [None] * len(INCOME_CHANNELS) + ["общ. расх", balance]
+    for group, names in groups.items():
+        header += [group] + [None] * (len(names) - 1)
+    rows = [
+        header,
+        [None] + INCOME_CHANNELS + ["общ. приход", None, "остаток"] + channels,
+    ]
+    width = len(INCOME_CHANNELS) + 2 + len(channels)
+    totals = [0] * width
+    days = calendar.monthrange(year, month)[1]
+    for day in range(1, DAY_ROWS + 1):
+        if day > days:
+            rows.append([])
+            continue
+        incomes = [
+            rng.choice((0, 0, 0, rng.randint(100, 50_000))) for _ in INCOME_CHANNELS
+        ]
+        expenses = [
+            rng.choice((0, 0, 0, rng.randint(1, 3_000), round(rng.uniform(1, 99), 2)))
+            for _ in channels
+        ]
+        income, expense = sum(incomes), round(sum(expenses), 2)
+        balance = round(balance + income - expense, 2)
+        values = incomes + [income, expense] + expenses
+        totals = [total + value for total, value in zip(totals, values)]
+        rows.append(
+            [datetime(year, month, day)]
+            + incomes
+            + [income, expense, balance]
+            + expenses
+        )
+    split = len(INCOME_CHANNELS) + 2
+    rows.append(["итого"] + totals[:split] + [None] + totals[split:])
+    if food:
+        rows.append(
+            [None] * 9 + [FOOD_LABEL] + [round(rng.uniform(0, 10), 3) for _ in range(5)]
+        )
+    return rows, balance
+
+
+def write_workbook(
+    path: str,
+    year: int,
+    channels: int = 0,
+    food: bool = False,
+    balance: float = 0,
+    seed: int = 0,
+) -> float:
+    """Write one year of random daily records in the template layout,
+    sheets go from December to January as in the template
+    ----------
+    Parameters:
+    path : output .xlsx file
+    year : year of the workbook
+    channels : number of expense channels, template channels if less
+    food : write food consuming row (row 35)
+    balance : savings at the beginning of the year
+    seed : seed of random generator
+    -------
+    Returns:
+    savings at the end of the year
+    """
+    from openpyxl import Workbook
+
+    rng = random.Random(seed)
+    groups = expense_groups(channels)
+    sheets = []
+    for month in range(1, 13):
+        rows, balance = _month_rows(month, year, groups, balance, food, rng)
+        sheets.append((f"{MONTHS[month - 1]}_{year}", rows))
+    book = Workbook(write_only=True)
+    for title, rows in reversed(sheets):
+        sheet = book.create_sheet(title)
+        for row in rows:
+            sheet.append(row)
+    book.save(path)
+    return balance
+
+
+def generate(
+    directory: str,
+    years: int = 1,
+    households: int = 1,
+    channels: int = 0,
+    food: bool = False,
+    first_year: int = 2000,
+    seed: int = 0,
+) -> list[WorkbookSpec]:
+    """Write workbooks of several households for several years
+    ----------
+    Parameters:
+    directory : output directory, created if missing
+    years : number of years (workbooks) per household
+    households : number of households
+    channels : number of expense channels, template channels if less
+    food : write food consuming rows
+    first_year : year of the first workbook
+    seed : seed of random generator
+    -------
+    Returns:
+    list of WorkbookSpec for prepare_many
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    specs = []
+    for household in range(households):
+        name = f"household_{household + 1}"
+        balance = 0
+        for year in range(first_year, first_year + years):
+            path = directory / f"incomes-expenses_{name}_{year}.xlsx"
+            balance = write_workbook(
+                str(path),
+                year,
+                channels,
+                food,
+                balance,
+                seed=seed * 1_000_000 + household * 10_000 + year,
+            )
+            specs.append(WorkbookSpec(str(path), food_consume=food, household=name))
+    return specs
+
+
+def statement_rules() -> list:
+    """Rules of importer.import_statement for statements of write_statement"""
+    from src.data_wrangling.importer import Rule
+
+    rules = [Rule(payer, keywords=(name,)) for name, payer in PAYERS]
+    rules.append(
+        Rule(("жилье", "аренда, страховка"), pattern=r"^ZHKU", min_amount=8_000)
+    )
+    rules += [Rule(column, keywords=(name,)) for name, column, _ in MERCHANTS]
+    return rules
+
+
+def write_statement(
+    path: str, rows: int, first_year: int = 2000, years: int = 1, seed: int = 0
+) -> None:
+    """Write CSV bank statement with random transactions (date, description,
+    amount), debits are negative, descriptions carry random store numbers
+    ----------
+    Parameters:
+    path : output .csv file
+    rows : number of transactions
+    first_year : year of the first transaction
+    years : number of years covered by transactions
+    seed : seed of random generator
+    """
+    rng = random.Random(seed)
+    start = datetime(first_year, 1, 1).toordinal()
+    days = datetime(first_year + years, 1, 1).toordinal() - start
+    step = days / rows
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["date", "description", "amount"])
+        for i in range(rows):
+            date = datetime.fromordinal(start + int(i * step)).date().isoformat()
+            if rng.random() < 0.03:
+                description = f"{rng.choice(PAYERS)[0]} {rng.randint(1, 99)}"
+                amount = rng.randint(1_000, 100_000)
+            else:
+                name, _, (low, high) = rng.choice(MERCHANTS)
+                description = f"{name} {rng.randint(1, 2_000)} MOSCOW RUS"
+                amount = -round(rng.uniform(low, high), 2)
+            writer.writerow([date, description, amount])
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Generate synthetic workbooks")
+    parser.add_argument("directory")
+    parser.add_argument("--years", type=int, default=1)
+    parser.add_argument("--households", type=int, default=1)
+    parser.add_argument("--channels", type=int, default=0)
+    parser.add_argument("--food", action="store_true")
+    parser.add_argument("--first-year", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    specs = generate(
+        args.directory,
+        args.years,
+        args.households,
+        args.channels,
+        args.food,
+        args.first_year,
+        args.seed,
+    )
+    for spec in specs:
+        print(spec.filename)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
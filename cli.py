@@ -0,0 +1,695 @@
+# Command line interface driven by configuration file
+#
+# Usage:
+#   python cli.py config.toml forecast [--household NAME]
+#   python cli.py config.toml plot [--household NAME]
+#   python cli.py config.toml report report.html
+#   python cli.py config.toml watch report.html [--interval 2]
+#   python cli.py config.toml serve [--host 127.0.0.1] [--port 8050]
+#   python cli.py config.toml sync ledger.sqlite
+#   python cli.py config.toml backtest [--horizon 12] [--min-history 12]
+#   python cli.py config.toml daily [--freq week|month|quarter|year]
+#
+# Heavy modules (pandas, plotly) are imported by commands that need them,
+# so "forecast" never imports plotly.
+
+import argparse
+import sys
+
+from src.data_wrangling.config import SECTION_NAMES, Config, load_config
+
+
+def build_households(config: Config, use_cache: bool = True) -> dict:
+    """Load workbooks, combine households with members
+    and cut histories by history_start
+    ----------
+    Parameters:
+    config : configuration from load_config
+    use_cache : use on-disk cache of parsed workbooks
+    -------
+    Returns:
+    dictionary household name -> (incomes, savings, expenses)
+    """
+    from src.data_wrangling.loader import prepare_many
+
+    loaded = prepare_many(scoped_specs(config), use_cache=use_cache)
+    return derive_households(config, loaded)
+
+
+def scoped_specs(config: Config) -> list:
+    """Workbooks of the configuration limited to periods from load_scopes"""
+    scopes = load_scopes(config)
+    return [spec._replace(sections=scopes[spec.household]) for spec in config.workbooks]
+
+
+def derive_households(config: Config, loaded: dict, names: list = None) -> dict:
+    """Combine households with members and cut histories by history_start
+    ----------
+    Parameters:
+    config : configuration from load_config
+    loaded : dictionary household -> sections of its workbooks (prepare_many)
+    names : households to derive, all configured households by default
+    -------
+    Returns:
+    dictionary household name -> (incomes, savings, expenses)
+    """
+    from src.data_wrangling.dict_handler import reduce_dict_by_time
+    from src.data_wrangling.household import combine_sections
+
+    households = {}
+    for name in names or config.households:
+        household = config.households[name]
+        if household.members:
+            sections = combine_sections(
+                {member: loaded[member] for member in household.members},
+                months="intersection",
+            )
+        else:
+            sections = loaded[name][:3]
+        households[name] = tuple(
+            reduce_dict_by_time(section, household.history_start[section_name])
+            if section_name in household.history_start
+            else section
+            for section_name, section in zip(SECTION_NAMES, sections)
+        )
+    return households
+
+
+def load_scopes(config: Config) -> dict:
+    """Periods of sections which have to be loaded for every household
+    with workbooks: the earliest history_start among the household itself
+    and combined households it is a member of
+    ----------
+    Parameters:
+    config : configuration from load_config
+    -------
+    Returns:
+    dictionary household name -> sections argument of prepare_data
+    """
+    from src.data_wrangling.dict_handler import month_ordinal
+
+    scopes = {spec.household: {} for spec in config.workbooks}
+    for household in config.households.values():
+        for member in household.members or [household.name]:
+            scope = scopes[member]
+            for section in SECTION_NAMES:
+                start = household.history_start.get(section)
+                if section in scope:
+                    loaded = scope[section][0]
+                    if start is None or loaded is None:
+                        start = None
+                    elif month_ordinal(loaded) < month_ordinal(start):
+                        start = loaded
+                scope[section] = (start, None)
+    return scopes
+
+
+def forecast_households(config: Config, households: dict, cubes: dict = None) -> dict:
+    """Forecast incomes, expenses and savings of every household
+    ----------
+    Parameters:
+    config : configuration from load_config
+    households : result of build_households
+    cubes : dictionary household name -> (incomes, expenses) CategoryCube,
+            monthly sums are taken from them instead of summing all months
+    -------
+    Returns:
+    dictionary household name -> (incomes, savings, expenses) forecasts
+    cut to the [plot] period
+    """
+    from src.data_wrangling.forecaster import Scenario, SavingsScenario
+    from src.data_wrangling.forecaster import forecast_many, scenario_dicts
+
+    settings = config.forecast
+    method = settings.get("method", "mean")
+    options = dict(settings.get("options", {}))
+    channels = tuple(options.pop("channels", ()))
+    start = config.plot.get("start")
+    end = config.plot.get("end")
+    series, scenarios, savings = {}, [], []
+    for name, (incomes, savings_dict, expenses) in households.items():
+        if cubes:
+            incomes, expenses = (cube.matrix() for cube in cubes[name])
+        for section, data, until in (
+            ("incomes", incomes, settings["incomes_until"]),
+            ("expenses", expenses, settings["expenses_until"]),
+        ):
+            series[f"{name} {section}"] = data
+            scenarios.append(
+                Scenario(
+                    f"{name} {section}",
+                    f"{name} {section}",
+                    until,
+                    method,
+                    channels,
+                    options,
+                )
+            )
+        series[f"{name} savings"] = savings_dict
+        savings.append(
+            SavingsScenario(
+                f"{name} savings",
+                f"{name} savings",
+                f"{name} incomes",
+                f"{name} expenses",
+                settings["expenses_until"],
+            )
+        )
+    results = scenario_dicts(forecast_many(series, scenarios, savings), start, end)
+    return {
+        name: tuple(results[f"{name} {section}"] for section in SECTION_NAMES)
+        for name in households
+    }
+
+
+def _selected(config: Config, household: str | None) -> list:
+    if household is None:
+        return list(config.households)
+    if household not in config.households:
+        raise SystemExit(f"Unknown household {household!r}")
+    return [household]
+
+
+def forecast_table(config: Config, forecasts: dict, names: list):
+    """Forecast of households as a single table
+    ----------
+    Parameters:
+    config : configuration from load_config
+    forecasts : result of forecast_households
+    names : households to include
+    -------
+    Returns:
+    DataFrame indexed by (household, month) with incomes, expenses, savings
+    and flags of their forecasted months: incomes after incomes_until,
+    expenses and savings after expenses_until
+    """
+    import pandas as pd
+    from src.data_wrangling.dict_handler import month_ordinal
+
+    incomes_until = month_ordinal(config.forecast["incomes_until"])
+    expenses_until = month_ordinal(config.forecast["expenses_until"])
+    tables = {}
+    for name in names:
+        finc, fsav, fexp = forecasts[name]
+        months = sorted(set(finc) | set(fsav) | set(fexp), key=month_ordinal)
+        table = pd.DataFrame(
+            {
+                "incomes": pd.Series(finc, dtype="float64"),
+                "expenses": pd.Series(fexp, dtype="float64"),
+                "savings": pd.Series(fsav, dtype="float64"),
+            },
+            index=months,
+        )
+        ordinals = [month_ordinal(key) for key in table.index]
+        table["incomes_forecasted"] = [o > incomes_until for o in ordinals]
+        table["expenses_forecasted"] = [o > expenses_until for o in ordinals]
+        table["savings_forecasted"] = table["expenses_forecasted"]
+        tables[name] = table
+    return pd.concat(tables, names=["household", "month"])
+
+
+def backtest_table(
+    config: Config, households: dict, names: list, horizon: int, min_history: int
+):
+    """Scores of every forecast method on incomes and expenses of households
+    ----------
+    Parameters:
+    config : configuration from load_config, options of [forecast] are used
+    households : result of build_households
+    names : households to include
+    horizon : number of forecasted months after every cutoff
+    min_history : number of recorded months before the first cutoff
+    -------
+    Returns:
+    DataFrame indexed by (household, section, method) with mae, mape and bias
+    """
+    from src.data_wrangling.backtest import backtest_many
+
+    series = {
+        (name, section): households[name][i]
+        for name in names
+        for i, section in ((0, "incomes"), (2, "expenses"))
+    }
+    result = backtest_many(
+        series,
+        horizon=horizon,
+        min_history=min_history,
+        **config.forecast.get("options", {}),
+    )
+    table = result.total
+    table.index.names = ["household", "section", "method"]
+    return table
+
+
+def daily_table(households: dict, names: list, freq: str = "month"):
+    """Incomes, expenses and savings of households by calendar periods
+    from their daily series
+    ----------
+    Parameters:
+    households : result of build_households
+    names : households to include
+    freq : "day", "week", "month", "quarter" or "year"
+    -------
+    Returns:
+    DataFrame indexed by (household, period) with sums of incomes and expenses,
+    savings at the end of the period, the lowest savings with its date
+    and the date of the largest incomes
+    """
+    import pandas as pd
+    from src.data_wrangling.timeseries import low_points, paydays, resample
+    from src.data_wrangling.timeseries import to_daily_sections, totals
+
+    tables = {}
+    for name in names:
+        incomes, savings, expenses = to_daily_sections(households[name])
+        lows = low_points(savings, freq)
+        table = pd.DataFrame(
+            {
+                "incomes": resample(totals(incomes), freq),
+                "expenses": resample(totals(expenses), freq),
+                "savings": resample(savings, freq, how="last"),
+                "low": lows["low"],
+                "low_date": lows["date"].dt.date,
+                "payday": paydays(incomes, freq)["date"].dt.date,
+            }
+        )
+        table.index = table.index.astype(str)
+        tables[name] = table
+    return pd.concat(tables, names=["household", "period"])
+
+
+def build_figures(
+    config: Config,
+    forecasts: dict,
+    households: dict,
+    names: list,
+    cubes: dict = None,
+) -> dict:
+    """Margin chart for every household and alluvial chart from [plot.alluvial]
+    ----------
+    Parameters:
+    config : configuration from load_config
+    forecasts : result of forecast_households
+    households : result of build_households
+    names : households to plot
+    cubes : dictionary household name -> (incomes, expenses) CategoryCube
+    -------
+    Returns:
+    dictionary chart title -> plotly figure
+    """
+    from src.data_wrangling.cube import CategoryCube
+    from src.data_wrangling.plotter import plot_alluvial, plot_margin
+
+    titles = config.plot.get("titles", {})
+    figures = {}
+    for name in names:
+        finc, fsav, fexp = forecasts[name]
+        figures[titles.get(name, name)] = plot_margin(finc, fsav, fexp, show=False)
+    alluvial = config.plot.get("alluvial")
+    if alluvial and alluvial["household"] in names:
+        if cubes:
+            cube = cubes[alluvial["household"]][1]
+        else:
+            cube = CategoryCube(households[alluvial["household"]][2])
+        sums = cube.sums_dict(alluvial.get("start"), alluvial.get("end"))
+        title = alluvial.get("title", f"{alluvial['household']} expenses")
+        figures[title] = plot_alluvial(sums, show=False)
+    return figures
+
+
+def _merge(watchers: list, household: str, keys: set = None) -> tuple:
+    """Sections of a household from its workbooks, later workbooks override
+    months of earlier ones as in prepare_many; only `keys` months if given"""
+    from src.data_wrangling.dict_handler import sort_dict_by_time
+
+    merged = ({}, {}, {}, {})
+    for watcher in watchers:
+        if watcher.spec.household != household:
+            continue
+        for target, section in zip(merged, watcher.sections):
+            if keys is None:
+                target.update(section)
+            else:
+                target.update((key, section[key]) for key in keys if key in section)
+    return tuple(sort_dict_by_time(section) for section in merged)
+
+
+def build_cubes(households: dict) -> dict:
+    """CategoryCube of incomes and expenses of every household"""
+    from src.data_wrangling.cube import CategoryCube
+
+    return {
+        name: (CategoryCube(incomes), CategoryCube(expenses))
+        for name, (incomes, _, expenses) in households.items()
+    }
+
+
+def update_households(
+    config: Config, households: dict, cubes: dict, watchers: list, changed: dict
+) -> set:
+    """Recompute changed months of households and their cubes in place
+    ----------
+    Parameters:
+    config : configuration from load_config
+    households : result of build_households
+    cubes : result of build_cubes
+    watchers : WorkbookWatcher of every configured workbook
+    changed : dictionary household with workbooks -> changed month keys
+    -------
+    Returns:
+    names of updated households
+    """
+    from src.data_wrangling.dict_handler import sort_dict_by_time
+
+    updated = set()
+    for name, household in config.households.items():
+        members = household.members or [name]
+        keys = set().union(*(changed.get(member, ()) for member in members))
+        if not keys:
+            continue
+        loaded = {member: _merge(watchers, member, keys) for member in members}
+        derived = derive_households(config, loaded, [name])[name]
+        sections = []
+        for section, update in zip(households[name], derived):
+            section = {key: value for key, value in section.items() if key not in keys}
+            section.update(update)
+            sections.append(sort_dict_by_time(section))
+        households[name] = tuple(sections)
+        incomes, _, expenses = sections
+        cubes[name] = tuple(
+            _updated_cube(cube, section, keys)
+            for cube, section in zip(cubes[name], (incomes, expenses))
+        )
+        updated.add(name)
+    return updated
+
+
+def _updated_cube(cube, section: dict, keys: set):
+    from src.data_wrangling.cube import CategoryCube
+
+    if set(cube.months) - section.keys():
+        return CategoryCube(section)
+    cube.update({key: section[key] for key in keys if key in section})
+    return cube
+
+
+def watch(
+    config: Config,
+    names: list,
+    path: str,
+    interval: float = 2.0,
+    use_cache: bool = True,
+) -> None:
+    """Write report, then poll workbooks and rewrite the report when they change;
+    only changed sheets are parsed again and only affected households
+    are forecasted and plotted again
+    ----------
+    Parameters:
+    config : configuration from load_config
+    names : households to plot
+    path : output HTML file
+    interval : seconds between polls
+    use_cache : use on-disk cache of parsed workbooks for the first load
+    """
+    import time
+
+    from src.data_wrangling.loader import prepare_many
+    from src.data_wrangling.report import write_report
+    from src.data_wrangling.watch import WorkbookWatcher
+
+    specs = scoped_specs(config)
+    if use_cache:
+        prepare_many(specs)
+    watchers = [WorkbookWatcher(spec, use_cache) for spec in specs]
+    loaded = {spec.household: _merge(watchers, spec.household) for spec in specs}
+    households = derive_households(config, loaded)
+    cubes = build_cubes(households)
+    forecasts = forecast_households(config, households, cubes)
+    figures = build_figures(config, forecasts, households, names, cubes)
+    write_report(figures, path)
+    print(f"Written {path}, watching {len(watchers)} workbooks", file=sys.stderr)
+    while True:
+        time.sleep(interval)
+        started = time.perf_counter()
+        changed = {}
+        for watcher in watchers:
+            try:
+                keys = watcher.poll()
+            except Exception as error:
+                print(f"{watcher.spec.filename}: {error}, retrying", file=sys.stderr)
+                continue
+            if keys:
+                changed.setdefault(watcher.spec.household, set()).update(keys)
+        if not changed:
+            continue
+        updated = update_households(config, households, cubes, watchers, changed)
+        forecasts.update(
+            forecast_households(
+                config, {name: households[name] for name in updated}, cubes
+            )
+        )
+        figures.update(
+            build_figures(
+                config,
+                forecasts,
+                households,
+                [name for name in names if name in updated],
+                cubes,
+            )
+        )
+        write_report(figures, path)
+        months = sorted(set().union(*changed.values()))
+        print(
+            f"{', '.join(months)} changed, updated {', '.join(sorted(updated))} "
+            f"in {time.perf_counter() - started:.2f} s",
+            file=sys.stderr,
+        )
+
+
+def dashboard_chart(
+    config: Config,
+    households: dict,
+    cubes: dict,
+    chart: str,
+    household: str = None,
+    start: str = None,
+    end: str = None,
+    method: str = None,
+) -> str:
+    """Figure JSON of a chart for the dashboard
+    ----------
+    Parameters:
+    config : configuration from load_config
+    households : result of build_households
+    cubes : result of build_cubes
+    chart : "margin" or "alluvial"
+    household : household name
+    start : first month of the chart, [plot] start by default
+    end : last month of the chart, [plot] end by default
+    method : forecast method, [forecast] method by default
+    -------
+    Returns:
+    figure JSON, InvalidQuery is raised for unknown household, method or month
+    """
+    from src.data_wrangling.dict_handler import month_ordinal
+    from src.data_wrangling.forecaster import FORECAST_METHODS
+    from src.data_wrangling.plotter import plot_alluvial, plot_margin
+    from src.data_wrangling.server import InvalidQuery
+
+    if household not in households:
+        raise InvalidQuery(f"Unknown household {household!r}")
+    if method and method not in FORECAST_METHODS:
+        raise InvalidQuery(
+            f"Unknown forecast method {method!r}, "
+            f"available: {', '.join(FORECAST_METHODS)}"
+        )
+    start = start or config.plot.get("start")
+    end = end or config.plot.get("end")
+    for key in (start, end):
+        if key is not None:
+            try:
+                month_ordinal(key)
+            except ValueError as error:
+                raise InvalidQuery(str(error)) from None
+    if chart == "alluvial":
+        sums = cubes[household][1].sums_dict(start, end)
+        return plot_alluvial(sums, show=False).to_json()
+    forecast = dict(config.forecast)
+    if method:
+        forecast["method"] = method
+    config = config._replace(
+        forecast=forecast, plot={**config.plot, "start": start, "end": end}
+    )
+    forecasts = forecast_households(config, {household: households[household]}, cubes)
+    return plot_margin(*forecasts[household], show=False).to_json()
+
+
+def serve(
+    config: Config,
+    host: str = "127.0.0.1",
+    port: int = 8050,
+    use_cache: bool = True,
+    cache_size: int = 64,
+) -> None:
+    """Serve dashboard page and chart JSON on a local HTTP server;
+    households are loaded again when fingerprints of workbooks change
+    ----------
+    Parameters:
+    config : configuration from load_config
+    host : interface to listen on
+    port : port to listen on, 0 picks a free one
+    use_cache : use on-disk cache of parsed workbooks
+    cache_size : number of cached charts
+    """
+    from src.data_wrangling.forecaster import FORECAST_METHODS
+    from src.data_wrangling.server import DashboardServer, SingleFlightCache
+    from src.data_wrangling.server import SourceFingerprints
+
+    loads = SingleFlightCache(maxsize=1)
+
+    def load() -> tuple:
+        households = build_households(config, use_cache)
+        return households, build_cubes(households)
+
+    def chart(name: str, params: dict, fingerprints: tuple) -> str:
+        households, cubes = loads.get(fingerprints, load)
+        return dashboard_chart(config, households, cubes, name, **params)
+
+    options = {
+        "households": list(config.households),
+        "methods": list(FORECAST_METHODS),
+        "method": config.forecast.get("method", "mean"),
+        "start": config.plot.get("start"),
+        "end": config.plot.get("end"),
+    }
+    fingerprints = SourceFingerprints([spec.filename for spec in config.workbooks])
+    server = DashboardServer((host, port), chart, fingerprints, options, cache_size)
+    print(f"Serving on http://{host}:{server.server_port}/", file=sys.stderr)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Home finance analysis")
+    parser.add_argument("config", help="path to .toml or .json configuration")
+    parser.add_argument("--household", help="process only this household")
+    parser.add_argument("--no-cache", action="store_true", help="bypass workbook cache")
+    parser.add_argument(
+        "--profile", action="store_true", help="print stage timings to stderr"
+    )
+    parser.add_argument("--trace", help="write JSON trace of stages, implies --profile")
+    parser.add_argument(
+        "--profile-memory", action="store_true", help="track peak memory of stages"
+    )
+    parser.add_argument(
+        "--profile-stage", help="capture the stage with cProfile (<trace>.<stage>.prof)"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("forecast", help="print forecast table")
+    commands.add_parser("plot", help="open charts in browser")
+    daily = commands.add_parser(
+        "daily", help="print incomes, expenses and savings by calendar periods"
+    )
+    daily.add_argument(
+        "--freq",
+        default="month",
+        choices=["day", "week", "month", "quarter", "year"],
+        help="length of periods",
+    )
+    report = commands.add_parser("report", help="write charts into HTML file")
+    report.add_argument("path", help="output HTML file")
+    watching = commands.add_parser(
+        "watch", help="rewrite HTML report whenever workbooks change"
+    )
+    watching.add_argument("path", help="output HTML file")
+    watching.add_argument(
+        "--interval", type=float, default=2.0, help="seconds between polls"
+    )
+    serving = commands.add_parser("serve", help="serve dashboard on local HTTP server")
+    serving.add_argument("--host", default="127.0.0.1")
+    serving.add_argument("--port", type=int, default=8050)
+    serving.add_argument(
+        "--cache-size", type=int, default=64, help="number of cached charts"
+    )
+    syncing = commands.add_parser("sync", help="store workbooks in SQLite ledger")
+    syncing.add_argument("database", help="SQLite database file")
+    backtesting = commands.add_parser(
+        "backtest", help="score forecast methods on recorded months"
+    )
+    backtesting.add_argument(
+        "--horizon", type=int, default=12, help="months forecasted after every cutoff"
+    )
+    backtesting.add_argument(
+        "--min-history", type=int, default=12, help="months before the first cutoff"
+    )
+    args = parser.parse_args(argv)
+
+    if args.profile or args.trace or args.profile_memory or args.profile_stage:
+        from src.data_wrangling import profiling
+
+        profiling.enable(memory=args.profile_memory, cprofile_stage=args.profile_stage)
+        try:
+            return _run(args)
+        finally:
+            print(profiling.summary(), file=sys.stderr)
+            if args.trace:
+                profiling.write_trace(args.trace)
+    return _run(args)
+
+
+def _run(args: argparse.Namespace) -> int:
+    config = load_config(args.config)
+    names = _selected(config, args.household)
+    if args.command == "watch":
+        try:
+            watch(config, names, args.path, args.interval, not args.no_cache)
+        except KeyboardInterrupt:
+            pass
+        return 0
+    if args.command == "serve":
+        try:
+            serve(config, args.host, args.port, not args.no_cache, args.cache_size)
+        except KeyboardInterrupt:
+            pass
+        return 0
+    if args.command == "sync":
+        from src.data_wrangling.ledger_db import connect, sync
+
+        connection = connect(args.database)
+        try:
+            status = sync(connection, config.workbooks, use_cache=not args.no_cache)
+        finally:
+            connection.close()
+        for filename, state in status.items():
+            print(f"{state:>9} {filename}")
+        return 0
+    households = build_households(config, use_cache=not args.no_cache)
+    if args.command == "backtest":
+        table = backtest_table(
+            config, households, names, args.horizon, args.min_history
+        )
+        print(table.to_string())
+        return 0
+    if args.command == "daily":
+        print(daily_table(households, names, args.freq).to_string())
+        return 0
+    forecasts = forecast_households(config, households)
+    if args.command == "forecast":
+        table = forecast_table(config, forecasts, names)
+        print(table.to_string())
+        return 0
+    figures = build_figures(config, forecasts, households, names)
+    if args.command == "report":
+        from src.data_wrangling.report import write_report
+
+        write_report(figures, args.path)
+        return 0
+    for figure in figures.values():
+        figure.show()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
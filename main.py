@@ -1,182 +1,119 @@
+import sys
+
+from src.data_wrangling.cube import CategoryCube
 from src.data_wrangling.dict_handler import reduce_dict_by_time
-from src.data_wrangling.forecaster import forecast, forecast_savings
-from src.data_wrangling.loader import prepare_data
+from src.data_wrangling.forecaster import Scenario, SavingsScenario
+from src.data_wrangling.forecaster import forecast_many, scenario_dicts
+from src.data_wrangling.household import combine_sections
+from src.data_wrangling.loader import WorkbookSpec, prepare_many
 from src.data_wrangling.plotter import plot_alluvial, plot_margin
+from src.data_wrangling.report import write_report
 
 
-def main() -> int:
-    my_2012 = "./data/incomes-expenses_2012.xlsx"
-    my_2013 = "./data/incomes-expenses_2013.xlsx"
-    my_2014 = "./data/incomes-expenses_2014.xlsx"
-    my_2015 = "./data/incomes-expenses_2015.xlsx"
-    my_2016 = "./data/incomes-expenses_2016.xlsx"
-    my_2017 = "./data/incomes-expenses_2017.xlsx"
-    my_2018 = "./data/incomes-expenses_2018.xlsx"
-    my_2019 = "./data/incomes-expenses_2019.xlsx"
-    my_2020 = "./data/incomes-expenses_2020.xlsx"
-    my_2021 = "./data/incomes-expenses_2021.xlsx"
-    my_2022 = "./data/incomes-expenses_2022.xlsx"
-    my_2023 = "./data/incomes-expenses_2023.xlsx"
-    my_2024 = "./data/incomes-expenses_2024.xlsx"
-    my_2025 = "./data/incomes-expenses_2025.xlsx"
-    my_2026 = "./data/incomes-expenses_2026.xlsx"
-    lil_2021 = "./data/incomes-expenses_LL_2021.xlsx"
-    lil_2022 = "./data/incomes-expenses_LL_2022.xlsx"
-    lil_2023 = "./data/incomes-expenses_LL_2023.xlsx"
-    lil_2024 = "./data/incomes-expenses_LL_2024.xlsx"
-    lil_2025 = "./data/incomes-expenses_LL_2025.xlsx"
-    lil_2026 = "./data/incomes-expenses_LL_2026.xlsx"
-    inc12, sav12, exp12, _ = prepare_data(
-        my_2012,
-        drop=["Декабрь_2011", "Октябрь_2011", "Ноябрь_2011"],
-        food_consume=False,
-    )
-    inc13, sav13, exp13, _ = prepare_data(
-        my_2013, drop=["Декабрь_2012"], food_consume=False
-    )
-    inc14, sav14, exp14, _ = prepare_data(
-        my_2014, drop=["Декабрь_2013"], food_consume=False
-    )
-    inc15, sav15, exp15, _ = prepare_data(
-        my_2015, drop=["Декабрь_2014"], food_consume=False
-    )
-    inc16, sav16, exp16, _ = prepare_data(my_2016, food_consume=False)
-    inc17, sav17, exp17, _ = prepare_data(
-        my_2017, drop=["Декабрь_2016"], food_consume=False
-    )
-    inc18, sav18, exp18, _ = prepare_data(
-        my_2018, drop=["Декабрь_2017"], food_consume=False
-    )
-    inc19, sav19, exp19, _ = prepare_data(
-        my_2019, drop=["Декабрь_2018"], food_consume=False
-    )
-    inc20, sav20, exp20, _ = prepare_data(
-        my_2020, drop=["Декабрь_2019"], food_consume=False
-    )
-    inc21, sav21, exp21, _ = prepare_data(
-        my_2021, drop=["Декабрь_2020", "Отчет"], food_consume=False
-    )
-    inc22, sav22, exp22, _ = prepare_data(
-        my_2022, drop=["Декабрь_2021", "Отчет"], food_consume=False
-    )
-    inc23, sav23, exp23, food_cons23 = prepare_data(
-        my_2023, drop=["Декабрь_2022"], food_consume=True
-    )
-    inc24, sav24, exp24, food_cons24 = prepare_data(
-        my_2024, drop=["Декабрь_2023"], food_consume=True
-    )
-    inc25, sav25, exp25, food_cons25 = prepare_data(
-        my_2025, drop=["Декабрь_2024"], food_consume=True
-    )
-    inc26, sav26, exp26, food_cons26 = prepare_data(
-        my_2026, drop=["Декабрь_2025"], food_consume=True
-    )
-    lil_inc21, lil_sav21, lil_exp21, _ = prepare_data(
-        lil_2021, drop=["Отчет"], food_consume=False
-    )
-    lil_inc22, lil_sav22, lil_exp22, _ = prepare_data(
-        lil_2022, drop=["Декабрь_2021", "Отчет"], food_consume=False
-    )
-    lil_inc23, lil_sav23, lil_exp23, food_cons23 = prepare_data(
-        lil_2023, drop=["Декабрь_2022"], food_consume=True
-    )
-    lil_inc24, lil_sav24, lil_exp24, food_cons24 = prepare_data(
-        lil_2024, drop=["Декабрь_2023"], food_consume=True
-    )
-    lil_inc25, lil_sav25, lil_exp25, food_cons25 = prepare_data(
-        lil_2025, drop=["Декабрь_2024"], food_consume=True
-    )
-    lil_inc26, lil_sav26, lil_exp26, food_cons26 = prepare_data(
-        lil_2026, drop=["Декабрь_2025"], food_consume=True
-    )
-    # Прибыль за год
-    incomes = {
-        # **inc12,
-        # **inc13,
-        # **inc14,
-        # **inc15,
-        # **inc16,
-        # **inc17,
-        # **inc18,
-        # **inc19,
-        # **inc20,
-        # **inc21,
-        # **inc22,
-        # **inc23,
-        **inc24,
-        **inc25,
-        **inc26,
-    }
-    savings = {
-        **sav12,
-        **sav13,
-        **sav14,
-        **sav15,
-        **sav16,
-        **sav17,
-        **sav18,
-        **sav19,
-        **sav20,
-        **sav21,
-        **sav22,
-        **sav23,
-        **sav24,
-        **sav25,
-        **sav26,
-    }
-    expenses = {
-        # **exp12,
-        # **exp13,
-        # **exp14,
-        # **exp15,
-        # **exp16,
-        # **exp17,
-        # **exp18,
-        # **exp19,
-        # **exp20,
-        **exp21,
-        **exp22,
-        **exp23,
-        **exp24,
-        **exp25,
-        **exp26,
-    }
-    incomes_lil = {
-        # **lil_inc21,
-        # **lil_inc22,
-        # **lil_inc23,
-        # **lil_inc24,
-        **lil_inc25,
-        **lil_inc26,
-    }
-    savings_lil = {
-        **lil_sav21,
-        **lil_sav22,
-        **lil_sav23,
-        **lil_sav24,
-        **lil_sav25,
-        **lil_sav26,
+def main(report: str = None) -> int:
+    show = report is None
+    personal = "personal"
+    lil = "lil"
+    specs = [
+        WorkbookSpec(
+            "./data/incomes-expenses_2012.xlsx",
+            drop=["Декабрь_2011", "Октябрь_2011", "Ноябрь_2011"],
+            household=personal,
+        ),
+        WorkbookSpec(
+            "./data/incomes-expenses_2013.xlsx", ["Декабрь_2012"], household=personal
+        ),
+        WorkbookSpec(
+            "./data/incomes-expenses_2014.xlsx", ["Декабрь_2013"], household=personal
+        ),
+        WorkbookSpec(
+            "./data/incomes-expenses_2015.xlsx", ["Декабрь_2014"], household=personal
+        ),
+        WorkbookSpec("./data/incomes-expenses_2016.xlsx", household=personal),
+        WorkbookSpec(
+            "./data/incomes-expenses_2017.xlsx", ["Декабрь_2016"], household=personal
+        ),
+        WorkbookSpec(
+            "./data/incomes-expenses_2018.xlsx", ["Декабрь_2017"], household=personal
+        ),
+        WorkbookSpec(
+            "./data/incomes-expenses_2019.xlsx", ["Декабрь_2018"], household=personal
+        ),
+        WorkbookSpec(
+            "./data/incomes-expenses_2020.xlsx", ["Декабрь_2019"], household=personal
+        ),
+        WorkbookSpec(
+            "./data/incomes-expenses_2021.xlsx",
+            ["Декабрь_2020", "Отчет"],
+            household=personal,
+        ),
+        WorkbookSpec(
+            "./data/incomes-expenses_2022.xlsx",
+            ["Декабрь_2021", "Отчет"],
+            household=personal,
+        ),
+        WorkbookSpec(
+            "./data/incomes-expenses_2023.xlsx", ["Декабрь_2022"], True, personal
+        ),
+        WorkbookSpec(
+            "./data/incomes-expenses_2024.xlsx", ["Декабрь_2023"], True, personal
+        ),
+        WorkbookSpec(
+            "./data/incomes-expenses_2025.xlsx", ["Декабрь_2024"], True, personal
+        ),
+        WorkbookSpec(
+            "./data/incomes-expenses_2026.xlsx", ["Декабрь_2025"], True, personal
+        ),
+        WorkbookSpec("./data/incomes-expenses_LL_2021.xlsx", ["Отчет"], household=lil),
+        WorkbookSpec(
+            "./data/incomes-expenses_LL_2022.xlsx",
+            ["Декабрь_2021", "Отчет"],
+            household=lil,
+        ),
+        WorkbookSpec(
+            "./data/incomes-expenses_LL_2023.xlsx", ["Декабрь_2022"], True, lil
+        ),
+        WorkbookSpec(
+            "./data/incomes-expenses_LL_2024.xlsx", ["Декабрь_2023"], True, lil
+        ),
+        WorkbookSpec(
+            "./data/incomes-expenses_LL_2025.xlsx", ["Декабрь_2024"], True, lil
+        ),
+        WorkbookSpec(
+            "./data/incomes-expenses_LL_2026.xlsx", ["Декабрь_2025"], True, lil
+        ),
+    ]
+    # Only savings need the whole history
+    scopes = {
+        personal: {
+            "incomes": ("Январь_2024", None),
+            "savings": (None, None),
+            "expenses": ("Январь_2021", None),
+        },
+        lil: {
+            "incomes": ("Январь_2025", None),
+            "savings": (None, None),
+            "expenses": (None, None),
+        },
     }
-    expenses_lil = {
-        **lil_exp21,
-        **lil_exp22,
-        **lil_exp23,
-        **lil_exp24,
-        **lil_exp25,
-        **lil_exp26,
-    }
-    incomes_marital = {}
-    savings_marital = {}
-    expenses_marital = {}
-    import pandas as pd
-
-    for key in incomes_lil.keys():
-        incomes_marital[key] = pd.DataFrame()
-        savings_marital[key] = pd.DataFrame()
-        expenses_marital[key] = pd.DataFrame()
-        incomes_marital[key] = incomes[key] + incomes_lil[key]
-        savings_marital[key] = savings[key] + savings_lil[key]
-        expenses_marital[key] = expenses[key] + expenses_lil[key]
+    specs = [spec._replace(sections=scopes[spec.household]) for spec in specs]
+    households = prepare_many(specs)
+    incomes, savings, expenses, _ = households[personal]
+    incomes_lil, savings_lil, expenses_lil, _ = households[lil]
+    # Прибыль за год
+    incomes = reduce_dict_by_time(incomes, "Январь_2024")
+    expenses = reduce_dict_by_time(expenses, "Январь_2021")
+    incomes_lil = reduce_dict_by_time(incomes_lil, "Январь_2025")
+    incomes_marital, savings_marital, expenses_marital = (
+        reduce_dict_by_time(section, "Январь_2025")
+        for section in combine_sections(
+            {
+                personal: (incomes, savings, expenses),
+                lil: (incomes_lil, savings_lil, expenses_lil),
+            },
+            months="intersection",
+        )
+    )
     incomes = reduce_dict_by_time(incomes, "Сентябрь_2025")
 
     # Forecast section
@@ -194,41 +131,74 @@ def main() -> int:
     # fsavings = reduce_dict_by_time(fsavings, start_month="Январь_2023")
     #
     # plot_margin(finc, fsavings, fexpenses)
-    finc = forecast(incomes, until="Декабрь_2026")
-    fexp = forecast(expenses, until="Февраль_2026")
-    fsav = forecast_savings(savings, finc, fexp, until="Февраль_2026")
-    finc_lil = forecast(incomes_lil, until="Декабрь_2026")
-    fexp_lil = forecast(expenses_lil, until="Февраль_2026")
-    fsav_lil = forecast_savings(savings_lil, finc_lil, fexp_lil, until="Февраль_2026")
-    finc_marital = forecast(incomes_marital, until="Декабрь_2026")
-
     # expenses_marital = reduce_dict_by_time(expenses_marital, start_month="Январь_2024", end_month="Декабрь_2024")
-    fexp_marital = forecast(
-        expenses_marital,
-        until="Февраль_2026",
-        # method="drop_channels",
-        # channels=[("Отдых"), ("Путешествия")],
-    )
-
-    fsav_marital = forecast_savings(
-        savings_marital, finc_marital, fexp_marital, until="Февраль_2026"
+    expenses_cube = CategoryCube(expenses_marital)
+    series = {
+        "incomes": incomes,
+        "savings": savings,
+        "expenses": expenses,
+        "incomes_lil": incomes_lil,
+        "savings_lil": savings_lil,
+        "expenses_lil": expenses_lil,
+        "incomes_marital": incomes_marital,
+        "savings_marital": savings_marital,
+        "expenses_marital": expenses_cube.matrix(),
+    }
+    scenarios = [
+        Scenario("finc", "incomes", "Декабрь_2026"),
+        Scenario("fexp", "expenses", "Февраль_2026"),
+        Scenario("finc_lil", "incomes_lil", "Декабрь_2026"),
+        Scenario("fexp_lil", "expenses_lil", "Февраль_2026"),
+        Scenario("finc_marital", "incomes_marital", "Декабрь_2026"),
+        Scenario(
+            "fexp_marital",
+            "expenses_marital",
+            "Февраль_2026",
+            # "drop_channels",
+            # (("Отдых"), ("Путешествия")),
+        ),
+    ]
+    savings_scenarios = [
+        SavingsScenario("fsav", "savings", "finc", "fexp", "Февраль_2026"),
+        SavingsScenario(
+            "fsav_lil", "savings_lil", "finc_lil", "fexp_lil", "Февраль_2026"
+        ),
+        SavingsScenario(
+            "fsav_marital",
+            "savings_marital",
+            "finc_marital",
+            "fexp_marital",
+            "Февраль_2026",
+        ),
+    ]
+    # months of the report are selected once for all forecasts
+    forecasts = scenario_dicts(
+        forecast_many(series, scenarios, savings_scenarios),
+        start_month="Январь_2026",
+        end_month="Декабрь_2026",
+    )
+    rincomes, rexpenses, rsavings = (
+        forecasts[name] for name in ("finc", "fexp", "fsav")
+    )
+    rincomes_lil, rexpenses_lil, rsavings_lil = (
+        forecasts[f"{name}_lil"] for name in ("finc", "fexp", "fsav")
+    )
+    rincomes_marital, rexpenses_marital, rsavings_marital = (
+        forecasts[f"{name}_marital"] for name in ("finc", "fexp", "fsav")
+    )
+    figures = {}
+    figures["Личный бюджет"] = plot_margin(rincomes, rsavings, rexpenses, show=show)
+    figures["Бюджет LL"] = plot_margin(
+        rincomes_lil, rsavings_lil, rexpenses_lil, show=show
+    )
+    figures["Семейный бюджет"] = plot_margin(
+        rincomes_marital, rsavings_marital, rexpenses_marital, show=show
     )
-    rincomes = reduce_dict_by_time(finc, start_month="Январь_2026", end_month="Декабрь_2026")
-    rexpenses = reduce_dict_by_time(fexp, start_month="Январь_2026", end_month="Декабрь_2026")
-    rsavings = reduce_dict_by_time(fsav, start_month="Январь_2026", end_month="Декабрь_2026")
-    rincomes_lil = reduce_dict_by_time(finc_lil, start_month="Январь_2026", end_month="Декабрь_2026")
-    rexpenses_lil = reduce_dict_by_time(fexp_lil, start_month="Январь_2026", end_month="Декабрь_2026")
-    rsavings_lil = reduce_dict_by_time(fsav_lil, start_month="Январь_2026", end_month="Декабрь_2026")
-    rincomes_marital = reduce_dict_by_time(finc_marital, start_month="Январь_2026", end_month="Декабрь_2026")
-    rexpenses_marital = reduce_dict_by_time(fexp_marital, start_month="Январь_2026", end_month="Декабрь_2026")
-    rsavings_marital = reduce_dict_by_time(fsav_marital, start_month="Январь_2026", end_month="Декабрь_2026")
-    plot_margin(rincomes, rsavings, rexpenses)
-    plot_margin(rincomes_lil, rsavings_lil, rexpenses_lil)
-    plot_margin(rincomes_marital, rsavings_marital, rexpenses_marital)
     # %%
-    exp_sum_dict = {key: value.sum() for (key, value) in expenses_marital.items()}
-    exp_sum_dict = reduce_dict_by_time(exp_sum_dict, start_month="Январь_2025", end_month="Февраль_2026")
-    plot_alluvial(exp_sum_dict)
+    exp_sum_dict = expenses_cube.sums_dict(start="Январь_2025", end="Февраль_2026")
+    figures["Семейные расходы"] = plot_alluvial(exp_sum_dict, show=show)
+    if report:
+        write_report(figures, report)
     # %%
     # # Доход за год по группам
     #     inc_sum_dict = {key: value.sum() for (key, value) in incomes.items()}
@@ -266,4 +236,4 @@ def main() -> int:
 
 
 if __name__ == "__main__":
-    exit(main())
+    exit(main(*sys.argv[1:2]))
@@ -0,0 +1,328 @@
+# Rolling-origin backtesting of forecast methods against recorded months
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, NamedTuple
+
+import numpy as np
+import pandas as pd
+from src.data_wrangling.forecaster import FORECAST_METHODS, MonthlyMatrix
+from src.data_wrangling.forecaster import channel_mask, monthly_matrix
+from src.data_wrangling.profiling import profiled
+
+SCORES = ("mae", "mape", "bias", "count")
+
+
+class BacktestResult(NamedTuple):
+    """Accuracy of forecast methods over all cutoffs
+    ----------
+    Attributes:
+    forecasts : DataFrame with columns method, cutoff (last recorded month),
+                month, step (months after cutoff), forecast and actual totals
+    channels : DataFrame (method, channel) x (mae, mape, bias, count)
+    total : DataFrame method x (mae, mape, bias, count) of monthly totals
+    """
+
+    forecasts: pd.DataFrame
+    channels: pd.DataFrame
+    total: pd.DataFrame
+
+
+def _levels(cumulative: np.ndarray, cutoffs: np.ndarray) -> np.ndarray:
+    return cumulative[cutoffs] / cutoffs[:, np.newaxis]
+
+
+def _mean(values, ordinals, cutoffs, targets, **kwargs) -> np.ndarray:
+    cumulative = np.vstack([np.zeros(values.shape[1]), np.cumsum(values, axis=0)])
+    return _levels(cumulative, cutoffs)[:, np.newaxis, :]
+
+
+def _trailing_mean(values, ordinals, cutoffs, targets, window=12, **kwargs):
+    cumulative = np.vstack([np.zeros(values.shape[1]), np.cumsum(values, axis=0)])
+    lengths = np.minimum(cutoffs, window)
+    levels = (cumulative[cutoffs] - cumulative[cutoffs - lengths]) / lengths[:, None]
+    return levels[:, np.newaxis, :]
+
+
+def _ewm(values, ordinals, cutoffs, targets, alpha=0.3, **kwargs) -> np.ndarray:
+    sums = np.zeros((len(values) + 1, values.shape[1]))
+    weights = np.zeros(len(values) + 1)
+    for i, row in enumerate(values):
+        sums[i + 1] = (1 - alpha) * sums[i] + row
+        weights[i + 1] = (1 - alpha) * weights[i] + 1
+    return (sums[cutoffs] / weights[cutoffs, np.newaxis])[:, np.newaxis, :]
+
+
+def _seasonal_naive(values, ordinals, cutoffs, targets, **kwargs) -> np.ndarray:
+    month_of_year = ordinals % 12
+    seen = np.full((12, len(values) + 1), -1)
+    seen[month_of_year, np.arange(1, len(values) + 1)] = np.arange(len(values))
+    last_seen = np.maximum.accumulate(seen, axis=1)
+    source = last_seen[month_of_year[targets], cutoffs[:, np.newaxis]]
+    fallback = _mean(values, ordinals, cutoffs, targets)
+    return np.where(
+        (source >= 0)[..., np.newaxis], values[np.maximum(source, 0)], fallback
+    )
+
+
+def _linear_trend(values, ordinals, cutoffs, targets, **kwargs) -> np.ndarray:
+    x = (ordinals - ordinals[0]).astype(np.float64)
+
+    def cumulative(array):
+        return np.concatenate([np.zeros((1,) + array.shape[1:]), np.cumsum(array, 0)])
+
+    n = cutoffs[:, np.newaxis].astype(np.float64)
+    sum_x = cumulative(x)[cutoffs][:, np.newaxis]
+    sum_xx = cumulative(x * x)[cutoffs][:, np.newaxis]
+    sum_y = cumulative(values)[cutoffs]
+    sum_xy = cumulative(x[:, np.newaxis] * values)[cutoffs]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = (n * sum_xy - sum_x * sum_y) / (n * sum_xx - sum_x**2)
+    slope = np.where(n >= 2, slope, 0)
+    intercept = (sum_y - slope * sum_x) / n
+    return intercept[:, np.newaxis, :] + x[targets][..., np.newaxis] * slope[:, None, :]
+
+
+# Forecasts of all cutoffs at once, the same as registered methods compute
+# for every cutoff; other registered methods are called for every cutoff
+VECTORIZED_METHODS: dict[Callable, Callable] = {
+    FORECAST_METHODS["mean"]: _mean,
+    FORECAST_METHODS["trailing_mean"]: _trailing_mean,
+    FORECAST_METHODS["ewm"]: _ewm,
+    FORECAST_METHODS["seasonal_naive"]: _seasonal_naive,
+    FORECAST_METHODS["linear_trend"]: _linear_trend,
+}
+
+
+def _loop(method, values, ordinals, cutoffs, targets, **kwargs) -> np.ndarray:
+    forecasts = np.full(targets.shape + values.shape[1:], np.nan)
+    for i, cutoff in enumerate(cutoffs):
+        horizon = min(targets.shape[1], len(values) - cutoff)
+        months = ordinals[: cutoff + horizon]
+        forecasts[i, :horizon] = method(values[:cutoff], months, horizon, **kwargs)
+    return forecasts
+
+
+def method_forecasts(
+    matrix: MonthlyMatrix,
+    method: str,
+    cutoffs: np.ndarray,
+    horizon: int,
+    **kwargs,
+) -> np.ndarray:
+    """Forecasts of the method made at every cutoff
+    ----------
+    Parameters:
+    matrix : monthly sums per channel
+    method : name of registered forecast method
+    cutoffs : numbers of recorded months (rows of the matrix) known at cutoffs
+    horizon : number of forecasted months after every cutoff
+    **kwargs : keyword arguments of the method
+    -------
+    Returns:
+    array cutoff x step x channel, NaN for months after the end of the matrix
+    """
+    if method not in FORECAST_METHODS:
+        raise ValueError(
+            f"Unknown forecast method {method!r}, "
+            f"available: {', '.join(FORECAST_METHODS)}"
+        )
+    values = np.asarray(matrix.values, dtype=np.float64) / matrix.unit
+    cutoffs = np.asarray(cutoffs, dtype=np.int64)
+    targets = cutoffs[:, np.newaxis] + np.arange(horizon)
+    valid = targets < len(values)
+    targets = np.minimum(targets, len(values) - 1)
+    function = FORECAST_METHODS[method]
+    vectorized = VECTORIZED_METHODS.get(function)
+    if vectorized is None:
+        return _loop(function, values, matrix.ordinals, cutoffs, targets, **kwargs)
+    forecasts = vectorized(values, matrix.ordinals, cutoffs, targets, **kwargs)
+    forecasts = np.broadcast_to(forecasts, targets.shape + values.shape[1:])
+    return np.where(valid[..., np.newaxis], forecasts, np.nan)
+
+
+def _scores(errors: np.ndarray, actuals: np.ndarray, axis) -> dict:
+    valid = ~np.isnan(errors)
+    count = valid.sum(axis=axis)
+    nonzero = valid & (actuals != 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        percents = np.abs(errors) / np.abs(np.where(nonzero, actuals, 1)) * 100
+        return {
+            "mae": np.nansum(np.abs(errors), axis=axis) / count,
+            "mape": np.where(nonzero, percents, 0).sum(axis=axis)
+            / nonzero.sum(axis=axis),
+            "bias": np.nansum(errors, axis=axis) / count,
+            "count": count,
+        }
+
+
+def score(forecasts: pd.DataFrame, by: list[str]) -> pd.DataFrame:
+    """Mean absolute error, mean absolute percentage error (months with
+    zero actual value are skipped) and bias (mean of forecast - actual)
+    ----------
+    Parameters:
+    forecasts : forecasts of BacktestResult
+    by : columns to group by, e.g. ["method", "step"]
+    -------
+    Returns:
+    DataFrame indexed by `by` columns with mae, mape, bias and count
+    """
+    errors = forecasts["forecast"] - forecasts["actual"]
+    nonzero = forecasts["actual"] != 0
+    table = pd.DataFrame(
+        {
+            "absolute": errors.abs(),
+            "percent": (errors.abs() / forecasts["actual"].abs() * 100).where(nonzero),
+            "error": errors,
+        }
+    )
+    for column in by:
+        table[column] = forecasts[column]
+    grouped = table.groupby(by, observed=True, sort=False)
+    return pd.DataFrame(
+        {
+            "mae": grouped["absolute"].mean(),
+            "mape": grouped["percent"].mean(),
+            "bias": grouped["error"].mean(),
+            "count": grouped["error"].count(),
+        }
+    )
+
+
+def _unique_methods() -> dict:
+    # the outer decorator registers the main name last, e.g. mean after drop_channels
+    return {method: name for name, method in FORECAST_METHODS.items()}
+
+
+@profiled(rows=lambda result: len(result.forecasts))
+def backtest(
+    source_dict: dict,
+    horizon: int = 12,
+    methods: list[str] = None,
+    min_history: int = 12,
+    channels: list = None,
+    **kwargs,
+) -> BacktestResult:
+    """Rolling-origin backtest: at every cutoff month forecast the next
+    months with every method and compare forecasts with recorded months
+    ----------
+    Parameters:
+    source_dict : dictionary with incomes-expenses data or MonthlyMatrix
+    horizon : number of forecasted months after every cutoff
+    methods : names of forecast methods, all registered methods by default
+              (an alias, e.g. drop_channels for mean, is backtested once)
+    min_history : number of recorded months before the first cutoff
+    channels : list with column names to drop from calculations
+    **kwargs : keyword arguments of forecast methods, e.g. window, alpha
+    -------
+    Returns:
+    BacktestResult with forecasts of totals and scores per channel and total
+    """
+    if isinstance(source_dict, MonthlyMatrix):
+        matrix = source_dict
+    else:
+        matrix = monthly_matrix(source_dict)
+    if methods is None:
+        methods = list(_unique_methods().values())
+    if not methods:
+        raise ValueError("No forecast methods to backtest")
+    columns = matrix.columns
+    values = np.asarray(matrix.values, dtype=np.float64) / matrix.unit
+    matrix = matrix._replace(values=values, unit=1)
+    if channels:
+        mask = channel_mask(columns, channels)
+        columns, values = columns[mask], values[:, mask]
+        matrix = matrix._replace(columns=columns, values=values)
+    cutoffs = np.arange(max(min_history, 1), len(matrix.months))
+    targets = cutoffs[:, np.newaxis] + np.arange(horizon)
+    valid = targets < len(values)
+    targets = np.minimum(targets, len(values) - 1)
+    actuals = np.where(valid[..., np.newaxis], values[targets], np.nan)
+    months = np.array(matrix.months, dtype=object)
+
+    computed = {}
+    forecasts, channel_scores = [], []
+    for method in methods:
+        key = FORECAST_METHODS.get(method)
+        if key not in computed:
+            computed[key] = method_forecasts(matrix, method, cutoffs, horizon, **kwargs)
+        predicted = computed[key]
+        channel_scores.append(_scores(predicted - actuals, actuals, axis=(0, 1)))
+        total = predicted.sum(axis=2)
+        rows, steps = np.nonzero(valid)
+        forecasts.append(
+            pd.DataFrame(
+                {
+                    "method": method,
+                    "cutoff": months[cutoffs[rows] - 1],
+                    "month": months[targets[valid]],
+                    "step": steps + 1,
+                    "forecast": total[valid],
+                    "actual": np.nansum(actuals, axis=2)[valid],
+                }
+            )
+        )
+    index = pd.MultiIndex.from_tuples(
+        [(method, column) for method in methods for column in columns],
+        names=["method", "channel"],
+    )
+    forecasts = pd.concat(forecasts, ignore_index=True)
+    return BacktestResult(
+        forecasts=forecasts,
+        channels=pd.DataFrame(
+            {
+                name: np.concatenate([scores[name] for scores in channel_scores])
+                for name in SCORES
+            },
+            index=index,
+        ),
+        total=score(forecasts, ["method"]),
+    )
+
+
+def _backtest_series(args: tuple) -> BacktestResult:
+    source_dict, kwargs = args
+    return backtest(source_dict, **kwargs)
+
+
+@profiled()
+def backtest_many(
+    series: dict[str, dict], workers: int | None = 1, **kwargs
+) -> BacktestResult:
+    """Backtest many series (e.g. incomes and expenses of every household)
+    ----------
+    Parameters:
+    series : dictionary name -> dictionary with incomes-expenses data
+             or MonthlyMatrix, names may be tuples, e.g. (household, section)
+    workers : number of worker processes, None for all CPUs,
+              1 backtests series in the current process
+    **kwargs : arguments of backtest
+    -------
+    Returns:
+    BacktestResult with names of series as the first levels of indexes
+    and the first column of forecasts
+    """
+    names = list(series)
+    tasks = [(series[name], kwargs) for name in names]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) < 2:
+        results = [_backtest_series(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            results = list(executor.map(_backtest_series, tasks))
+    forecasts = pd.concat([result.forecasts for result in results], ignore_index=True)
+    keys = [name for name, result in zip(names, results) for _ in result.forecasts.index]
+    forecasts.insert(0, "series", keys)
+    return BacktestResult(
+        forecasts=forecasts,
+        channels=_concat([result.channels for result in results], names),
+        total=_concat([result.total for result in results], names),
+    )
+
+
+def _concat(frames: list[pd.DataFrame], names: list) -> pd.DataFrame:
+    result = pd.concat(frames, keys=names)
+    levels = result.index.nlevels - frames[0].index.nlevels
+    series = ["series"] if levels == 1 else [None] * levels
+    result.index.names = series + list(frames[0].index.names)
+    return result
@@ -0,0 +1,268 @@
+# On-disk cache of parsed workbooks
+
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+CACHE_VERSION = 1
+CACHE_DIR_ENV = "HFA_CACHE_DIR"
+CACHE_DISABLE_ENV = "HFA_NO_CACHE"
+CACHE_MAX_BYTES_ENV = "HFA_CACHE_MAX_BYTES"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+SECTIONS = ("incomes", "savings", "expenses", "food_consuming")
+
+
+class _Unsupported(Exception):
+    """Raised when parsed data can not be stored without pickling"""
+
+
+def cache_dir() -> Path:
+    """Directory with cached workbooks
+    ----------
+    Returns:
+    path from HFA_CACHE_DIR or ~/.cache/home_finance_analysis
+    """
+    if os.environ.get(CACHE_DIR_ENV):
+        return Path(os.environ[CACHE_DIR_ENV])
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "home_finance_analysis"
+
+
+def cache_enabled() -> bool:
+    """Is cache allowed by environment (HFA_NO_CACHE is not set)"""
+    return os.environ.get(CACHE_DISABLE_ENV, "") in ("", "0")
+
+
+def max_cache_bytes() -> int:
+    """Cache size limit from HFA_CACHE_MAX_BYTES or default 256 MiB"""
+    return int(os.environ.get(CACHE_MAX_BYTES_ENV, DEFAULT_MAX_BYTES))
+
+
+def file_fingerprint(filename: str) -> str:
+    """Fingerprint of the file: size, modification time and content hash
+    ----------
+    Parameters:
+    filename : path to the file
+    -------
+    Returns:
+    hex digest
+    """
+    stat = os.stat(filename)
+    digest = hashlib.sha256()
+    digest.update(f"{stat.st_size}:{stat.st_mtime_ns}:".encode())
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _entry_prefix(filename: str, params: dict) -> str:
+    source = json.dumps(
+        [CACHE_VERSION, os.path.abspath(filename), params],
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha1(source.encode()).hexdigest()[:16]
+
+
+def cache_entry(filename: str, **params) -> Path:
+    """Path of the cache entry for the workbook in its current state
+    ----------
+    Parameters:
+    filename : filename of the excel file
+    **params : arguments used for parsing (drop, food_consume, ...)
+    -------
+    Returns:
+    path to the entry, it may not exist yet
+    """
+    prefix = _entry_prefix(filename, params)
+    return cache_dir() / f"{prefix}-{file_fingerprint(filename)[:32]}.npz"
+
+
+def _encode_name(name):
+    if isinstance(name, tuple):
+        return {"tuple": [_encode_name(n) for n in name]}
+    if isinstance(name, np.generic):
+        name = name.item()
+    if name is None or isinstance(name, (str, bool, int, float)):
+        return name
+    raise _Unsupported(f"label {name!r}")
+
+
+def _decode_name(name):
+    if isinstance(name, dict):
+        return tuple(_decode_name(n) for n in name["tuple"])
+    return name
+
+
+def _encode_values(values, key: str, arrays: dict) -> dict:
+    if values.dtype.kind in "biufcmM":
+        arrays[key] = np.asarray(values)
+        return {"array": key}
+    dtype = str(values.dtype)
+    values = np.asarray(values, dtype=object)
+    return {"list": [_encode_name(v) for v in values], "dtype": dtype}
+
+
+def _decode_values(meta: dict, arrays):
+    if "array" in meta:
+        return arrays[meta["array"]]
+    values = np.empty(len(meta["list"]), dtype=object)
+    values[:] = [_decode_name(v) for v in meta["list"]]
+    return pd.array(values, dtype=meta["dtype"])
+
+
+def _encode_index(index: pd.Index, key: str, arrays: dict) -> dict:
+    if isinstance(index, pd.MultiIndex):
+        for i, codes in enumerate(index.codes):
+            arrays[f"{key}/codes{i}"] = np.asarray(codes)
+        return {
+            "levels": [
+                _encode_index(level, f"{key}/level{i}", arrays)
+                for i, level in enumerate(index.levels)
+            ],
+            "codes": [f"{key}/codes{i}" for i in range(index.nlevels)],
+            "names": [_encode_name(n) for n in index.names],
+        }
+    meta = _encode_values(index.array, key, arrays)
+    meta["name"] = _encode_name(index.name)
+    return meta
+
+
+def _decode_index(meta: dict, arrays) -> pd.Index:
+    if "levels" in meta:
+        return pd.MultiIndex(
+            levels=[_decode_index(level, arrays) for level in meta["levels"]],
+            codes=[arrays[codes] for codes in meta["codes"]],
+            names=[_decode_name(n) for n in meta["names"]],
+            verify_integrity=False,
+        )
+    values = _decode_values(meta, arrays)
+    return pd.Index(values, dtype=values.dtype, name=_decode_name(meta["name"]))
+
+
+def _encode_object(obj, key: str, arrays: dict) -> dict:
+    meta = {"index": _encode_index(obj.index, f"{key}/i", arrays)}
+    if isinstance(obj, pd.Series):
+        meta["name"] = _encode_name(obj.name)
+        meta["values"] = _encode_values(obj.array, f"{key}/v", arrays)
+        return meta
+    meta["columns"] = _encode_index(obj.columns, f"{key}/c", arrays)
+    meta["values"] = [
+        _encode_values(obj.iloc[:, j].array, f"{key}/v{j}", arrays)
+        for j in range(obj.shape[1])
+    ]
+    return meta
+
+
+def _decode_object(meta: dict, arrays):
+    index = _decode_index(meta["index"], arrays)
+    if "columns" not in meta:
+        values = _decode_values(meta["values"], arrays)
+        return pd.Series(values, index=index, name=_decode_name(meta["name"]))
+    columns = _decode_index(meta["columns"], arrays)
+    data = {j: _decode_values(v, arrays) for j, v in enumerate(meta["values"])}
+    frame = pd.DataFrame(data, index=index)
+    frame.columns = columns
+    return frame
+
+
+def load_cached(path: Path) -> tuple | None:
+    """Load parsed workbook from cache
+    ----------
+    Parameters:
+    path : cache entry from cache_entry()
+    -------
+    Returns:
+    tuple of dictionaries as returned by prepare_data or None on cache miss
+    """
+    if not path.exists():
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as arrays:
+            manifest = json.loads(str(arrays["manifest"]))
+            result = tuple(
+                {
+                    _decode_name(key): _decode_object(meta, arrays)
+                    for key, meta in manifest[section]
+                }
+                for section in SECTIONS
+            )
+    except Exception:
+        path.unlink(missing_ok=True)
+        return None
+    os.utime(path)
+    return result
+
+
+def store_cached(path: Path, sections: tuple) -> bool:
+    """Store parsed workbook in cache, drop outdated entries of the same file
+    ----------
+    Parameters:
+    path : cache entry from cache_entry()
+    sections : tuple of dictionaries as returned by prepare_data
+    -------
+    Returns:
+    True if data was stored
+    """
+    arrays = {}
+    manifest = {}
+    try:
+        for section, section_dict in zip(SECTIONS, sections):
+            manifest[section] = [
+                (_encode_name(key), _encode_object(value, f"{section}/{i}", arrays))
+                for i, (key, value) in enumerate(section_dict.items())
+            ]
+    except _Unsupported:
+        return False
+    arrays["manifest"] = np.array(json.dumps(manifest, ensure_ascii=False))
+
+    directory = path.parent
+    directory.mkdir(parents=True, exist_ok=True)
+    for outdated in directory.glob(f"{path.name.split('-')[0]}-*.npz"):
+        outdated.unlink(missing_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_name, path)
+    except OSError:
+        Path(tmp_name).unlink(missing_ok=True)
+        return False
+    evict(max_cache_bytes())
+    return True
+
+
+def evict(max_bytes: int) -> None:
+    """Remove least recently used cache entries until cache fits into the limit
+    ----------
+    Parameters:
+    max_bytes : cache size limit
+    """
+    directory = cache_dir()
+    if not directory.exists():
+        return
+    entries = []
+    for path in directory.glob("*.npz"):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+
+
+def clear_cache() -> None:
+    """Remove all cached workbooks"""
+    evict(0)
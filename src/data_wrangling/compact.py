@@ -0,0 +1,362 @@
+# Compact archive of households: shared channel dictionary, kopecks, month ordinals
+
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+from src.data_wrangling.dict_handler import MonthDict, month_key, month_ordinal
+from src.data_wrangling.dict_handler import sort_dict_by_time
+from src.data_wrangling.forecaster import MonthlyMatrix
+from src.data_wrangling.household import combine_households
+from src.data_wrangling.profiling import profiled
+
+SECTIONS = ("incomes", "savings", "expenses")
+MINOR_UNITS = 100
+
+
+class Layout(NamedTuple):
+    """Names needed to rebuild frames of a section
+    ----------
+    Attributes:
+    index_name : name of the date index
+    column_names : names of the column levels, None for Series
+    series_name : name of the Series (savings)
+    unit : datetime unit of the index, e.g. "us"
+    """
+
+    index_name: object
+    column_names: tuple | None
+    series_name: object
+    unit: str
+
+
+class CompactSection(NamedTuple):
+    """One section of all households, every month frame is a slice of flat arrays
+    ----------
+    Attributes:
+    households : household number of every frame
+    months : month ordinal of every frame
+    day_offsets : frame i has days[day_offsets[i]:day_offsets[i + 1]]
+    days : dates as number of days since 1970-01-01
+    column_offsets : frame i has columns[column_offsets[i]:column_offsets[i + 1]]
+    columns : channel numbers in the shared dictionary
+    entry_offsets : frame i has cells[entry_offsets[i]:entry_offsets[i + 1]]
+    cells : position of non-zero record in the frame (row * columns + column),
+            int16 if all frames are small enough
+    amounts : non-zero records in kopecks, int32 if they fit
+    layout : names of index and columns
+    """
+
+    households: np.ndarray
+    months: np.ndarray
+    day_offsets: np.ndarray
+    days: np.ndarray
+    column_offsets: np.ndarray
+    columns: np.ndarray
+    entry_offsets: np.ndarray
+    cells: np.ndarray
+    amounts: np.ndarray
+    layout: Layout
+
+    @property
+    def nbytes(self) -> int:
+        return sum(
+            getattr(self, field).nbytes
+            for field in self._fields
+            if field != "layout"
+        )
+
+
+class CompactArchive:
+    """Incomes, savings and expenses of many households in contiguous arrays,
+    dictionaries Month_Year -> DataFrame are rebuilt on demand
+    ----------
+    Attributes:
+    households : names of households
+    channels : shared dictionary of channel labels, position is the channel number
+    sections : dictionary section name -> CompactSection
+    """
+
+    def __init__(self):
+        self.households = []
+        self.channels = []
+        self._codes = {}
+        self.sections = {}
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the arrays in bytes (channel labels are not counted)"""
+        return sum(section.nbytes for section in self.sections.values())
+
+    @profiled("compact_add")
+    def add(self, household: str, sections: tuple) -> None:
+        """Add data of a household, amounts are rounded to kopecks
+        ----------
+        Parameters:
+        household : household name
+        sections : (incomes, savings, expenses[, food_consuming]) from prepare_data
+        """
+        if household in self.households:
+            raise ValueError(f"Household {household!r} is already added")
+        number = len(self.households)
+        self.households.append(household)
+        for name, source_dict in zip(SECTIONS, sections):
+            section = self._encode(number, source_dict)
+            if section is None:
+                continue
+            if name in self.sections:
+                section = _concat(self.sections[name], section)
+            self.sections[name] = section
+
+    def _code(self, label) -> int:
+        code = self._codes.get(label)
+        if code is None:
+            code = self._codes[label] = len(self.channels)
+            self.channels.append(label)
+        return code
+
+    def _encode(self, number: int, source_dict: dict) -> CompactSection | None:
+        source_dict = sort_dict_by_time(source_dict)
+        if not source_dict:
+            return None
+        months, days, columns, cells, amounts = [], [], [], [], []
+        for key, frame in source_dict.items():
+            if isinstance(frame, pd.Series):
+                labels = [frame.name]
+                values = frame.to_numpy(dtype="float64")
+            else:
+                labels = frame.columns.tolist()
+                values = frame.to_numpy(dtype="float64").ravel()
+            kopecks = np.rint(np.nan_to_num(values) * MINOR_UNITS).astype(np.int64)
+            nonzero = np.flatnonzero(kopecks)
+            months.append(month_ordinal(key))
+            days.append(frame.index.to_numpy().astype("datetime64[D]").astype(np.int32))
+            columns.append(np.array([self._code(label) for label in labels], np.int32))
+            cells.append(nonzero.astype(np.int32))
+            amounts.append(kopecks[nonzero])
+        frame = next(iter(source_dict.values()))
+        series = isinstance(frame, pd.Series)
+        layout = Layout(
+            frame.index.name,
+            None if series else tuple(frame.columns.names),
+            frame.name if series else None,
+            np.datetime_data(frame.index.dtype)[0],
+        )
+        return CompactSection(
+            np.full(len(months), number, dtype=np.int16),
+            np.array(months, dtype=np.int32),
+            _offsets(days),
+            np.concatenate(days),
+            _offsets(columns),
+            np.concatenate(columns),
+            _offsets(cells),
+            _downcast(np.concatenate(cells), np.int16),
+            _downcast(np.concatenate(amounts), np.int32),
+            layout,
+        )
+
+    def _frames(self, section: CompactSection, household) -> np.ndarray:
+        if household is None:
+            return np.arange(len(section.months))
+        names = [household] if isinstance(household, str) else list(household)
+        unknown = [name for name in names if name not in self.households]
+        if unknown:
+            raise KeyError(f"Unknown households: {', '.join(unknown)}")
+        numbers = [self.households.index(name) for name in names]
+        return np.flatnonzero(np.isin(section.households, numbers))
+
+    def months(self, section: str = "expenses", household=None) -> list[str]:
+        """Recorded months of a section
+        ----------
+        Parameters:
+        section : "incomes", "savings" or "expenses"
+        household : household name, list of names or None for all households
+        -------
+        Returns:
+        keys in format Month_Year in ascending order
+        """
+        data = self._section(section)
+        ordinals = np.unique(data.months[self._frames(data, household)])
+        return [month_key(int(ordinal)) for ordinal in ordinals]
+
+    def _section(self, name: str) -> CompactSection:
+        if name not in SECTIONS:
+            raise ValueError(
+                f"Unknown section {name!r}, available: {', '.join(SECTIONS)}"
+            )
+        if name not in self.sections:
+            return CompactSection(
+                *(np.zeros(n, dtype=np.int32) for n in (0, 0, 1, 0, 1, 0, 1, 0, 0)),
+                Layout(None, None, None, "us"),
+            )
+        return self.sections[name]
+
+    @profiled("compact_expand", rows=len)
+    def to_dict(self, section: str = "expenses", household=None) -> MonthDict:
+        """Rebuild dictionary of a section in the format of prepare_data,
+        incomes and expenses of several households are summed on the union
+        of their days and channels with exact integer arithmetic, savings
+        are combined by combine_households with balances, so a household
+        absent in a month adds its last balance
+        ----------
+        Parameters:
+        section : "incomes", "savings" or "expenses"
+        household : household name, list of names or None for all households
+        -------
+        Returns:
+        sorted dictionary Month_Year -> DataFrame (Series for savings)
+        """
+        data = self._section(section)
+        frames = self._frames(data, household)
+        result = MonthDict(ascending=True)
+        if not len(frames):
+            return result
+        numbers = np.unique(data.households[frames])
+        if section == "savings" and len(numbers) > 1:
+            names = [self.households[number] for number in numbers]
+            return combine_households(
+                {name: self.to_dict(section, name) for name in names}, balances=True
+            )
+        order = frames[np.argsort(data.months[frames], kind="stable")]
+        bounds = np.flatnonzero(np.diff(data.months[order])) + 1
+        for group in np.split(order, bounds):
+            key = month_key(int(data.months[group[0]]))
+            result[key] = self._rebuild(data, group)
+        return result
+
+    def to_dicts(self, household=None) -> tuple:
+        """Rebuild (incomes, savings, expenses) dictionaries
+        ----------
+        Parameters:
+        household : household name, list of names or None for all households
+        -------
+        Returns:
+        tuple of three dictionaries in the format of prepare_data
+        """
+        return tuple(self.to_dict(section, household) for section in SECTIONS)
+
+    def _rebuild(self, data: CompactSection, frames: np.ndarray):
+        day_slices = [_part(data.days, data.day_offsets, i) for i in frames]
+        column_slices = [_part(data.columns, data.column_offsets, i) for i in frames]
+        if len(frames) == 1:
+            days, columns = day_slices[0], column_slices[0]
+        else:
+            days = np.unique(np.concatenate(day_slices))
+            columns = pd.unique(np.concatenate(column_slices))
+        values = np.zeros((len(days), len(columns)), dtype=np.int64)
+        for i, frame_days, frame_columns in zip(frames, day_slices, column_slices):
+            cells = _part(data.cells, data.entry_offsets, i)
+            rows, cols = np.divmod(cells, len(frame_columns))
+            if len(frames) > 1:
+                rows = np.searchsorted(days, frame_days)[rows]
+                cols = pd.Index(columns).get_indexer(frame_columns)[cols]
+            np.add.at(values, (rows, cols), _part(data.amounts, data.entry_offsets, i))
+        layout = data.layout
+        index = pd.DatetimeIndex(
+            days.astype("datetime64[D]").astype(f"datetime64[{layout.unit}]"),
+            name=layout.index_name,
+        )
+        values = values / MINOR_UNITS
+        if layout.column_names is None:
+            return pd.Series(values[:, 0], index=index, name=layout.series_name)
+        return pd.DataFrame(
+            values, index=index, columns=self._labels(columns, layout.column_names)
+        )
+
+    def _labels(self, codes: np.ndarray, names: tuple) -> pd.Index:
+        labels = [self.channels[code] for code in codes]
+        if len(names) > 1:
+            return pd.MultiIndex.from_tuples(labels, names=names)
+        return pd.Index(labels, name=names[0])
+
+    @profiled("compact_matrix", rows=lambda matrix: len(matrix.months))
+    def matrix(
+        self, section: str = "expenses", household=None, kopecks: bool = False
+    ) -> MonthlyMatrix:
+        """Monthly sums per channel for forecast(), summed exactly in kopecks
+        ----------
+        Parameters:
+        section : "incomes" or "expenses"
+        household : household name, list of names or None for all households
+        kopecks : keep values as integer kopecks (unit of the matrix is 100),
+                  forecast() sums recorded months exactly and returns rubles
+        -------
+        Returns:
+        MonthlyMatrix
+        """
+        data = self._section(section)
+        frames = self._frames(data, household)
+        ordinals = np.unique(data.months[frames]).astype(np.int64)
+        months = [month_key(int(ordinal)) for ordinal in ordinals]
+        counts = np.diff(data.entry_offsets)[frames]
+        widths = np.diff(data.column_offsets)[frames]
+        entries = np.concatenate(
+            [np.arange(*data.entry_offsets[i : i + 2]) for i in frames]
+            or [np.zeros(0, dtype=np.int64)]
+        )
+        columns = data.columns[
+            np.repeat(data.column_offsets[frames], counts)
+            + data.cells[entries] % np.repeat(widths, counts)
+        ]
+        used = np.unique(
+            np.concatenate(
+                [_part(data.columns, data.column_offsets, i) for i in frames]
+                or [np.zeros(0, dtype=np.int32)]
+            )
+        )
+        rows = np.repeat(np.searchsorted(ordinals, data.months[frames]), counts)
+        values = np.zeros((len(months), len(used)), dtype=np.int64)
+        np.add.at(values, (rows, np.searchsorted(used, columns)), data.amounts[entries])
+        names = data.layout.column_names or (None,)
+        return MonthlyMatrix(
+            months,
+            ordinals,
+            self._labels(used, names),
+            values if kopecks else values / MINOR_UNITS,
+            MINOR_UNITS if kopecks else 1,
+        )
+
+
+def _offsets(arrays: list[np.ndarray]) -> np.ndarray:
+    offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+    np.cumsum([len(array) for array in arrays], out=offsets[1:])
+    return offsets
+
+
+def _downcast(array: np.ndarray, dtype) -> np.ndarray:
+    limits = np.iinfo(dtype)
+    if len(array) and (array.min() < limits.min or array.max() > limits.max):
+        return array
+    return array.astype(dtype)
+
+
+def _part(array: np.ndarray, offsets: np.ndarray, i: int) -> np.ndarray:
+    return array[offsets[i] : offsets[i + 1]]
+
+
+def _concat(first: CompactSection, second: CompactSection) -> CompactSection:
+    joined = {}
+    for field in ("households", "months", "days", "columns", "cells", "amounts"):
+        joined[field] = np.concatenate([getattr(first, field), getattr(second, field)])
+    for field in ("day_offsets", "column_offsets", "entry_offsets"):
+        offsets = getattr(first, field)
+        later = getattr(second, field)[1:] + offsets[-1]
+        joined[field] = np.concatenate([offsets, later])
+    return CompactSection(**joined, layout=first.layout)
+
+
+@profiled("compact_build")
+def compact(prepared: dict[str, tuple]) -> CompactArchive:
+    """Convert loaded households into CompactArchive
+    ----------
+    Parameters:
+    prepared : dictionary household -> (incomes, savings, expenses[, food_consuming]),
+               e.g. result of prepare_many
+    -------
+    Returns:
+    CompactArchive
+    """
+    archive = CompactArchive()
+    for household, sections in prepared.items():
+        archive.add(household, sections)
+    return archive
@@ -0,0 +1,98 @@
+# Configuration of households, workbooks and periods (TOML or JSON)
+
+import json
+import tomllib
+from pathlib import Path
+from typing import NamedTuple
+
+SECTION_NAMES = ("incomes", "savings", "expenses")
+
+
+class WorkbookSpec(NamedTuple):
+    """Arguments of prepare_data for one workbook and household it belongs to"""
+
+    filename: str
+    drop: list[str] = []
+    food_consume: bool = False
+    household: str = "default"
+    start: str | None = None
+    end: str | None = None
+    sections: list[str] | dict | None = None
+
+
+class HouseholdConfig(NamedTuple):
+    name: str
+    members: list = []
+    history_start: dict = {}
+
+
+class Config(NamedTuple):
+    workbooks: list
+    households: dict
+    forecast: dict
+    plot: dict
+
+
+def _read(path: Path) -> dict:
+    if path.suffix == ".json":
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    with open(path, "rb") as f:
+        return tomllib.load(f)
+
+
+def load_config(path: str) -> Config:
+    """Read configuration file
+    ----------
+    Parameters:
+    path : path to .toml or .json file, see config.example.toml
+    -------
+    Returns:
+    Config with workbook specs, households, forecast and plot settings
+    """
+    path = Path(path)
+    raw = _read(path)
+    base = path.parent
+    workbooks = []
+    for item in raw.get("workbooks", []):
+        if "path" not in item or "household" not in item:
+            raise ValueError(f"Workbook {item!r} requires 'path' and 'household'")
+        filename = Path(item["path"])
+        if not filename.is_absolute():
+            filename = base / filename
+        workbooks.append(
+            WorkbookSpec(
+                str(filename),
+                drop=list(item.get("drop", [])),
+                food_consume=bool(item.get("food_consume", False)),
+                household=item["household"],
+            )
+        )
+    loaded = {spec.household for spec in workbooks}
+    households = {name: HouseholdConfig(name) for name in sorted(loaded)}
+    for name, item in raw.get("households", {}).items():
+        members = list(item.get("members", []))
+        unknown = [member for member in members if member not in loaded]
+        if unknown:
+            raise ValueError(f"Household {name!r} has unknown members: {unknown}")
+        if not members and name not in loaded:
+            raise ValueError(f"Household {name!r} has neither workbooks nor members")
+        history_start = dict(item.get("history_start", {}))
+        wrong = set(history_start) - set(SECTION_NAMES)
+        if wrong:
+            raise ValueError(f"Unknown sections in {name!r} history_start: {wrong}")
+        households[name] = HouseholdConfig(name, members, history_start)
+    forecast = dict(raw.get("forecast", {}))
+    options = dict(forecast.get("options", {}))
+    if "channels" in options:
+        options["channels"] = [
+            tuple(channel) if isinstance(channel, list) else channel
+            for channel in options["channels"]
+        ]
+    forecast["options"] = options
+    return Config(
+        workbooks=workbooks,
+        households=households,
+        forecast=forecast,
+        plot=dict(raw.get("plot", {})),
+    )
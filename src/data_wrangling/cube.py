@@ -0,0 +1,262 @@
+# Precomputed monthly sums per (group, channel) with totals at every level
+
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+import pandas as pd
+from src.data_wrangling.dict_handler import MonthDict, month_ordinal
+from src.data_wrangling.dict_handler import sort_dict_by_time
+from src.data_wrangling.forecaster import MonthlyMatrix, monthly_matrix
+from src.data_wrangling.profiling import profiled
+
+LEVELS = ("channel", "group")
+
+
+class CategoryCube:
+    """Monthly sums of expenses (or incomes) per channel, per group and in total,
+    duplicated (group, channel) columns are summed up into one channel
+    ----------
+    Attributes:
+    months : keys in format Month_Year in ascending order
+    ordinals : month ordinal numbers of the keys
+    channels : MultiIndex (group, channel) of all channels
+    groups : Index of all groups
+    values : matrix month x channel
+    group_values : matrix month x group
+    month_totals : total of every month
+    """
+
+    @profiled("cube_build")
+    def __init__(self, source_dict: dict = None):
+        self.months = []
+        self.ordinals = np.zeros(0, dtype=np.int64)
+        self.channels = pd.MultiIndex.from_tuples([], names=["group", "channel"])
+        self.values = np.zeros((0, 0))
+        if source_dict:
+            matrix = monthly_matrix(source_dict)
+            self.months = list(matrix.months)
+            self.ordinals = matrix.ordinals
+            self.channels = _channel_index(matrix.columns)
+            self.values = matrix.values.astype("float64")
+            if not self.channels.is_unique:
+                self.channels, self.values = _merge_duplicates(
+                    self.channels, self.values
+                )
+        self._rebuild_groups()
+
+    def _rebuild_groups(self) -> None:
+        codes, groups = pd.factorize(self.channels.get_level_values("group"))
+        self.groups = pd.Index(groups, dtype=object, name="group")
+        self.group_codes = codes
+        onehot = np.zeros((len(self.channels), len(groups)))
+        onehot[np.arange(len(codes)), codes] = 1
+        self.group_values = self.values @ onehot
+        self.month_totals = self.values.sum(axis=1)
+
+    @profiled("cube_update")
+    def update(self, source_dict: dict) -> None:
+        """Add new months or replace recorded ones, only their rows are recomputed;
+        duplicated channels of a frame are summed up as in the constructor
+        ----------
+        Parameters:
+        source_dict : dictionary Month_Year -> DataFrame with daily records
+        """
+        for key, frame in sort_dict_by_time(source_dict).items():
+            columns = _channel_index(frame.columns)
+            new = columns[~columns.isin(self.channels)].unique()
+            if len(new):
+                self.channels = self.channels.append(new)
+                self.values = np.hstack(
+                    [self.values, np.zeros((len(self.months), len(new)))]
+                )
+            row = np.zeros(len(self.channels))
+            np.add.at(
+                row,
+                self.channels.get_indexer(columns),
+                frame.to_numpy(dtype="float64").sum(axis=0),
+            )
+            ordinal = month_ordinal(key)
+            i = bisect_left(self.ordinals, ordinal)
+            if i < len(self.months) and self.ordinals[i] == ordinal:
+                self.months[i] = key
+                self.values[i] = row
+            else:
+                self.months.insert(i, key)
+                self.ordinals = np.insert(self.ordinals, i, ordinal)
+                self.values = np.insert(self.values, i, row, axis=0)
+            if len(new):
+                self._rebuild_groups()
+            else:
+                self._update_row(i)
+
+    def _update_row(self, i: int) -> None:
+        row = np.bincount(
+            self.group_codes, weights=self.values[i], minlength=len(self.groups)
+        )
+        if len(self.group_values) < len(self.months):
+            self.group_values = np.insert(self.group_values, i, row, axis=0)
+            self.month_totals = np.insert(self.month_totals, i, row.sum())
+        else:
+            self.group_values[i] = row
+            self.month_totals[i] = row.sum()
+
+    def _bounds(self, start: str | None, end: str | None) -> slice:
+        first, last = 0, len(self.months)
+        if start is not None:
+            first = bisect_left(self.ordinals, month_ordinal(start))
+        if end is not None:
+            last = bisect_right(self.ordinals, month_ordinal(end))
+        return slice(first, last)
+
+    def _last(self, months: int | None, start: str | None, end: str | None) -> slice:
+        bounds = self._bounds(start, end)
+        if months is None:
+            return bounds
+        return slice(max(bounds.start, bounds.stop - months), bounds.stop)
+
+    def series(
+        self,
+        group: str = None,
+        channel: str = None,
+        start: str = None,
+        end: str = None,
+    ) -> pd.Series:
+        """Monthly sums of a group, a channel of the group or of everything
+        ----------
+        Parameters:
+        group : group name, None for totals of all groups
+        channel : channel name inside the group, None for the whole group
+        start : first month (inclusively), None from the beginning
+        end : last month (inclusively), None until the end
+        -------
+        Returns:
+        Series indexed by Month_Year keys
+        """
+        rows = self._bounds(start, end)
+        if group is None:
+            values = self.month_totals[rows]
+        elif channel is None:
+            values = self.group_values[rows, self.groups.get_loc(group)]
+        else:
+            values = self.values[rows, self.channels.get_loc((group, channel))]
+        return pd.Series(values, index=self.months[rows], name=channel or group)
+
+    def total(
+        self,
+        level: str = "channel",
+        start: str = None,
+        end: str = None,
+        months: int = None,
+    ) -> pd.Series:
+        """Sums over a period per channel or per group
+        ----------
+        Parameters:
+        level : "channel" or "group"
+        start : first month (inclusively)
+        end : last month (inclusively)
+        months : use only last N months of the period
+        -------
+        Returns:
+        Series indexed by (group, channel) or group
+        """
+        rows = self._last(months, start, end)
+        if level == "channel":
+            return pd.Series(self.values[rows].sum(axis=0), index=self.channels)
+        if level == "group":
+            return pd.Series(self.group_values[rows].sum(axis=0), index=self.groups)
+        raise ValueError(f"Unknown level {level!r}, available: {', '.join(LEVELS)}")
+
+    def top(
+        self,
+        n: int = 5,
+        level: str = "channel",
+        start: str = None,
+        end: str = None,
+        months: int = None,
+    ) -> pd.Series:
+        """The largest channels or groups of a period
+        ----------
+        Parameters:
+        n : number of channels or groups
+        level : "channel" or "group"
+        start : first month (inclusively)
+        end : last month (inclusively)
+        months : use only last N months of the period, e.g. 12
+        -------
+        Returns:
+        Series sorted in descending order
+        """
+        totals = self.total(level, start, end, months)
+        order = np.argsort(-totals.to_numpy(), kind="stable")[:n]
+        return totals.iloc[order]
+
+    def month(self, key: str, level: str = "channel") -> pd.Series:
+        """Sums of one month per channel or per group
+        ----------
+        Parameters:
+        key : month in format Month_Year
+        level : "channel" or "group"
+        -------
+        Returns:
+        Series indexed by (group, channel) or group
+        """
+        return self.total(level, key, key)
+
+    def sums_dict(
+        self, start: str = None, end: str = None, level: str = "channel"
+    ) -> dict:
+        """Monthly sums in the format of {key: frame.sum()} used by plot_alluvial
+        ----------
+        Parameters:
+        start : first month (inclusively)
+        end : last month (inclusively)
+        level : "channel" or "group"
+        -------
+        Returns:
+        dictionary Month_Year -> Series
+        """
+        rows = self._bounds(start, end)
+        values, index = (
+            (self.values, self.channels)
+            if level == "channel"
+            else (self.group_values, self.groups)
+        )
+        return MonthDict(
+            (
+                (key, pd.Series(row, index=index))
+                for key, row in zip(self.months[rows], values[rows])
+            ),
+            ascending=True,
+        )
+
+    def matrix(self, start: str = None, end: str = None) -> MonthlyMatrix:
+        """Monthly sums per channel for forecast()
+        ----------
+        Parameters:
+        start : first month (inclusively)
+        end : last month (inclusively)
+        -------
+        Returns:
+        MonthlyMatrix
+        """
+        rows = self._bounds(start, end)
+        return MonthlyMatrix(
+            self.months[rows], self.ordinals[rows], self.channels, self.values[rows]
+        )
+
+
+def _channel_index(columns: pd.Index) -> pd.MultiIndex:
+    if isinstance(columns, pd.MultiIndex):
+        return columns.set_names(["group", "channel"])
+    labels = list(columns)
+    return pd.MultiIndex.from_arrays(
+        [pd.Index(labels, dtype=object), pd.Index(labels, dtype=object)],
+        names=["group", "channel"],
+    )
+
+
+def _merge_duplicates(channels: pd.MultiIndex, values: np.ndarray) -> tuple:
+    unique = channels.unique()
+    merged = np.zeros((len(values), len(unique)))
+    np.add.at(merged, (slice(None), unique.get_indexer(channels)), values)
+    return unique, merged
@@ -1,8 +1,115 @@
 # Intermediate data representation handler
 
-from datetime import datetime
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
 
+from src.data_wrangling.profiling import profiled
 
+MONTHS = (
+    "Январь",
+    "Февраль",
+    "Март",
+    "Апрель",
+    "Май",
+    "Июнь",
+    "Июль",
+    "Август",
+    "Сентябрь",
+    "Октябрь",
+    "Ноябрь",
+    "Декабрь",
+)
+ENG_MONTHS = (
+    "January",
+    "February",
+    "March",
+    "April",
+    "May",
+    "June",
+    "July",
+    "August",
+    "September",
+    "October",
+    "November",
+    "December",
+)
+_MONTH_NUMBERS = {
+    **{month.lower(): i for i, month in enumerate(MONTHS)},
+    **{month.lower(): i for i, month in enumerate(ENG_MONTHS)},
+}
+
+
+@lru_cache(maxsize=None)
+def month_ordinal(key: str) -> int:
+    """Convert key to month ordinal number (year * 12 + month index)
+    ----------
+    Parameters:
+    key : key in format Month_Year, e.g. "Январь_2024"
+    -------
+    Returns:
+    month ordinal, e.g. 24288 for "Январь_2024"
+    """
+    month, _, year = key.partition("_")
+    month_number = _MONTH_NUMBERS.get(month.lower())
+    if month_number is None or not year.isdigit():
+        raise ValueError(f"time data {key!r} does not match format 'Month_Year'")
+    return int(year) * 12 + month_number
+
+
+def month_key(ordinal: int) -> str:
+    """Convert month ordinal number back to key in format Month_Year
+    ----------
+    Parameters:
+    ordinal : month ordinal number (year * 12 + month index)
+    -------
+    Returns:
+    key, e.g. "Январь_2024" for 24288
+    """
+    return f"{MONTHS[ordinal % 12]}_{ordinal // 12}"
+
+
+class MonthDict(dict):
+    """Dictionary with keys in format Month_Year, which remembers whether
+    it is sorted by time, so sorting it again costs only a shallow copy
+    ----------
+    Attributes:
+    ascending : sort order of keys, None if order is unknown
+    """
+
+    ascending = None
+
+    def __init__(self, *args, ascending: bool | None = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.ascending = ascending
+
+    def __setitem__(self, key, value):
+        if self.ascending is not None and self and key not in self:
+            try:
+                last = month_ordinal(next(reversed(self.keys())))
+                if (month_ordinal(key) > last) != self.ascending:
+                    self.ascending = None
+            except (TypeError, ValueError):
+                self.ascending = None
+        super().__setitem__(key, value)
+
+    def update(self, *args, **kwargs):
+        self.ascending = None
+        super().update(*args, **kwargs)
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def copy(self) -> "MonthDict":
+        return MonthDict(self, ascending=self.ascending)
+
+
+@profiled(rows=len)
 def sort_dict_by_time(source_dict: dict, ascending: bool = True) -> dict:
     """Sort dictionary by key by time
     ----------
@@ -13,37 +120,85 @@ def sort_dict_by_time(source_dict: dict, ascending: bool = True) -> dict:
     Returns:
     sorted dictionary
     """
-    ru_to_eng_months = {
-        "Январь": "January",
-        "Февраль": "February",
-        "Март": "March",
-        "Апрель": "April",
-        "Май": "May",
-        "Июнь": "June",
-        "Июль": "July",
-        "Август": "August",
-        "Сентябрь": "September",
-        "Октябрь": "October",
-        "Ноябрь": "November",
-        "Декабрь": "December",
-    }
-    keys = []
-    for key in source_dict.keys():
-        for ru_month, eng_month in ru_to_eng_months.items():
-            key = key.lower().capitalize()
-            key = key.replace(ru_month, eng_month)
-        key = datetime.strptime(key, "%B_%Y")
-        keys.append(key)
-    time_dict = dict(zip(keys, list(source_dict.values())))
-    sorted_time_dict = dict(sorted(time_dict.items(), reverse=(not ascending)))
-    keys = []
-    for key in sorted_time_dict.keys():
-        key = key.strftime("%B_%Y")
-        for ru_month, eng_month in ru_to_eng_months.items():
-            key = key.replace(eng_month, ru_month)
-        keys.append(key)
-    sorted_dict = dict(zip(keys, list(sorted_time_dict.values())))
-    return sorted_dict
+    if isinstance(source_dict, MonthDict) and source_dict.ascending == ascending:
+        return source_dict.copy()
+    ordinals = {key: month_ordinal(key) for key in source_dict.keys()}
+    keys = sorted(ordinals, key=ordinals.get, reverse=(not ascending))
+    return MonthDict(
+        ((month_key(ordinals[key]), source_dict[key]) for key in keys),
+        ascending=ascending,
+    )
+
+
+class MonthIndex:
+    """Sorted index of keys in format Month_Year for range lookups by bisection
+    ----------
+    Attributes:
+    keys : keys in ascending order
+    ordinals : month ordinal numbers of the keys
+    """
+
+    def __init__(self, source_dict: dict):
+        source_dict = sort_dict_by_time(source_dict)
+        self.keys = list(source_dict.keys())
+        self.ordinals = [month_ordinal(key) for key in self.keys]
+
+    def bounds(self, start_month: str = None, end_month: str = None) -> slice:
+        """Positions of keys in the period, boundary months may be absent
+        ----------
+        Parameters:
+        start_month : first month of the period (inclusivly), None for open start
+        end_month : last month of the period (inclusivly), None for open end
+        -------
+        Returns:
+        slice of positions in keys
+        """
+        start = 0
+        end = len(self.ordinals)
+        if start_month:
+            start = bisect_left(self.ordinals, month_ordinal(start_month))
+        if end_month:
+            end = bisect_right(self.ordinals, month_ordinal(end_month))
+        return slice(start, max(start, end))
+
+
+@profiled(rows=len)
+def select_months(
+    source_dict: dict, start_month: str = None, end_month: str = None
+) -> dict:
+    """Select period of an interest from dictionary without copying values
+    ----------
+    Parameters:
+    source_dict : dictionary with keys in format Month_Year
+    start_month : first month of the period (inclusivly), None for open start
+    end_month : last month of the period (inclusivly), None for open end
+    -------
+    Returns:
+    sorted dictionary with months of the period
+    """
+    return select_ranges(source_dict, [(start_month, end_month)])[0]
+
+
+@profiled()
+def select_ranges(source_dict: dict, ranges: list[tuple]) -> list[dict]:
+    """Select several periods from dictionary sorting its keys only once
+    ----------
+    Parameters:
+    source_dict : dictionary with keys in format Month_Year
+    ranges : list of (start_month, end_month) pairs, None for open boundary
+    -------
+    Returns:
+    list of sorted dictionaries, one per period
+    """
+    source_dict = sort_dict_by_time(source_dict)
+    index = MonthIndex(source_dict)
+    return [
+        MonthDict(
+            ((key, source_dict[key]) for key in index.keys[index.bounds(*period)]),
+            ascending=True,
+        )
+        for period in ranges
+    ]
 
 
 def reduce_dict_by_time(
@@ -57,21 +212,7 @@ def reduce_dict_by_time(
     end_month : dictionary key until which final dictionary ends
     -------
     Returns:
-    reduced dictionary
+    reduced dictionary, boundary months absent in the dictionary
+    are handled as the nearest months inside the period
     """
-
-    def del_items(sdict: dict, keys: list, month: str):
-        for key in keys:
-            if key == month:
-                break
-            del sdict[key]
-        return sdict
-
-    source_dict = sort_dict_by_time(source_dict)
-    start_keys = list(source_dict.keys())
-    source_dict = del_items(source_dict, start_keys, start_month)
-    if end_month:
-        end_keys = list(source_dict.keys())
-        end_keys.reverse()
-        source_dict = del_items(source_dict, end_keys, end_month)
-    return source_dict
+    return select_months(source_dict, start_month, end_month or None)
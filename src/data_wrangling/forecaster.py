@@ -1,78 +1,443 @@
+from bisect import bisect_right
+from typing import Callable, NamedTuple
+
+import numpy as np
+import pandas as pd
+from src.data_wrangling.dict_handler import MonthDict, month_key, month_ordinal
 from src.data_wrangling.dict_handler import reduce_dict_by_time
 from src.data_wrangling.dict_handler import sort_dict_by_time
+from src.data_wrangling.profiling import profiled
+
+FORECAST_METHODS: dict[str, Callable] = {}
+
+
+class MonthlyMatrix(NamedTuple):
+    """Monthly sums of incomes or expenses per channel
+    ----------
+    Attributes:
+    months : keys in format Month_Year in ascending order
+    ordinals : month ordinal numbers of the keys
+    columns : channels (columns of the source DataFrames)
+    values : matrix month x channel
+    unit : values per one ruble, e.g. 100 for integer kopecks
+    """
+
+    months: list[str]
+    ordinals: np.ndarray
+    columns: pd.Index
+    values: np.ndarray
+    unit: int = 1
+
+
+@profiled(rows=lambda matrix: len(matrix.months))
+def monthly_matrix(source_dict: dict) -> MonthlyMatrix:
+    """Sum daily records of every month per channel
+    ----------
+    Parameters:
+    source_dict : dictionary with incomes-expenses data
+    -------
+    Returns:
+    MonthlyMatrix, channels absent in some months are filled with 0
+    """
+    source_dict = sort_dict_by_time(source_dict)
+    months = list(source_dict.keys())
+    ordinals = np.array([month_ordinal(key) for key in months], dtype=np.int64)
+    if not months:
+        return MonthlyMatrix(months, ordinals, pd.Index([]), np.zeros((0, 0)))
+    frames = list(source_dict.values())
+    sums = [frame.to_numpy().sum(axis=0) for frame in frames]
+    columns = frames[0].columns
+    labels = columns.tolist()
+    if all(frame.columns.tolist() == labels for frame in frames[1:]):
+        return MonthlyMatrix(months, ordinals, columns, np.stack(sums))
+    columns = columns.append([frame.columns for frame in frames[1:]]).unique()
+    values = np.zeros((len(frames), len(columns)), dtype=np.result_type(*sums))
+    for i, (frame, frame_sums) in enumerate(zip(frames, sums)):
+        np.add.at(values[i], columns.get_indexer(frame.columns), frame_sums)
+    return MonthlyMatrix(months, ordinals, columns, values)
+
+
+def channel_mask(columns: pd.Index, channels: list) -> np.ndarray:
+    """Mask of columns which are not dropped
+    ----------
+    Parameters:
+    columns : channels of MonthlyMatrix
+    channels : column names to drop, a group name drops all its channels
+    -------
+    Returns:
+    boolean array, False for dropped columns
+    """
+    mask = np.ones(len(columns), dtype=bool)
+    prefixes = [
+        channel if isinstance(channel, tuple) else (channel,) for channel in channels
+    ]
+    for i, column in enumerate(columns):
+        column = column if isinstance(column, tuple) else (column,)
+        mask[i] = not any(column[: len(prefix)] == prefix for prefix in prefixes)
+    return mask
+
+
+def register_method(name: str) -> Callable:
+    """Register forecast method under the name
+    ----------
+    Parameters:
+    name : name used as `method` argument of forecast
+    -------
+    Returns:
+    decorator for function (history, months, horizon, **kwargs) -> np.ndarray,
+    where history is matrix month x channel of recorded data,
+    months are month ordinals of recorded and forecasted months
+    and result is matrix horizon x channel of forecasted data
+    """
+
+    def decorator(method: Callable) -> Callable:
+        FORECAST_METHODS[name] = method
+        return method
+
+    return decorator
+
+
+@register_method("mean")
+@register_method("drop_channels")
+def mean(history: np.ndarray, months: np.ndarray, horizon: int, **kwargs):
+    """Forecast by mean values of previous periods"""
+    return np.repeat(history.mean(axis=0, keepdims=True), horizon, axis=0)
+
+
+@register_method("trailing_mean")
+def trailing_mean(
+    history: np.ndarray, months: np.ndarray, horizon: int, window: int = 12, **kwargs
+):
+    """Forecast by mean values of last `window` periods"""
+    return mean(history[-window:], months, horizon)
+
+
+@register_method("ewm")
+def exponentially_weighted(
+    history: np.ndarray, months: np.ndarray, horizon: int, alpha: float = 0.3, **kwargs
+):
+    """Forecast by exponentially weighted mean, recent periods weight more"""
+    weights = (1 - alpha) ** np.arange(len(history))[::-1]
+    level = weights @ history / weights.sum()
+    return np.repeat(level[np.newaxis, :], horizon, axis=0)
+
+
+@register_method("seasonal_naive")
+def seasonal_naive(history: np.ndarray, months: np.ndarray, horizon: int, **kwargs):
+    """Forecast by the last recorded value of the same month of the year,
+    mean value is used for months of the year which were never recorded
+    """
+    n = len(history)
+    last_seen = np.full(12, -1)
+    last_seen[months[:n] % 12] = np.arange(n)
+    source = last_seen[months[n:] % 12]
+    forecast = np.where(
+        (source >= 0)[:, np.newaxis], history[source], history.mean(axis=0)
+    )
+    return forecast
+
+
+@register_method("linear_trend")
+def linear_trend(history: np.ndarray, months: np.ndarray, horizon: int, **kwargs):
+    """Forecast by linear trend fitted by least squares for every channel"""
+    if len(history) < 2:
+        return mean(history, months, horizon)
+    x = months[: len(history)] - months[0]
+    slope, intercept = np.polyfit(x, history, 1)
+    future = months[len(history) :] - months[0]
+    return intercept + np.outer(future, slope)
 
 
 def forecast(source_dict: dict, until: str, method: str = "mean", **kwargs) -> dict:
     """Forecast future incomes or expenses
     ----------
     Parameters:
-    source_dict : dictionary with incomes-expenses data
+    source_dict : dictionary with incomes-expenses data or precomputed
+                  MonthlyMatrix (e.g. CategoryCube.matrix())
     until : date until which data was recorded (inclusivly)
-    method : method used for forcast, "mean" by default
-    **kwargs : keyword arguments to pass for inner method functions
+    method : method used for forcast, "mean" by default,
+             see FORECAST_METHODS for available methods
+    **kwargs : keyword arguments to pass for inner method functions,
+               `channels` - list with column names to drop from calculations
     -------
     Returns:
     dictionary with forcasted data
     """
+    if isinstance(source_dict, MonthlyMatrix):
+        matrix = source_dict
+    else:
+        matrix = monthly_matrix(source_dict)
+    return MonthDict(
+        zip(matrix.months, forecast_matrix(matrix, until, method, **kwargs)),
+        ascending=True,
+    )
 
-    def mean(source_dict: dict, until: str, **kwargs) -> dict:
-        """Forecast by mean values of previous periods
-        ----------
-        Parameters:
-        source_dict : dictionary with incomes-expenses data
-        until : date until which data was recorded (inclusivly)
-        **kwargs : just for compatability
-        -------
-        Returns:
-        dictionary with forcasted data
-        """
-        forecasted_dict = {}
-        stop_summirize = False
-        mean = 0
-        for i, (key, value) in enumerate(source_dict.items()):
-            if not stop_summirize:
-                forecasted_dict[key] = value.values.sum()
-                if key == until:
-                    sum = 0
-                    for summand in forecasted_dict.values():
-                        sum += summand
-                    mean = sum / (i + 1)
-                    mean = round(mean)
-                    stop_summirize = True
-            else:
-                forecasted_dict[key] = mean
-        return forecasted_dict
-
-    def drop_channels(source_dict: dict, until: str, channels: list, **kwargs) -> dict:
-        """Forecast by mean values of previous periods but drop some income or expense channels
-        ----------
-        Parameters:
-        source_dict : dictionary with incomes-expenses data
-        until : date until which data was recorded (inclusivly)
-        channels : list with column names to drop from calculations of the mean
-        **kwargs : just for compatability
-        -------
-        Returns:
-        dictionary with forcasted data
-        """
-        edited_dict = source_dict.copy()
-        for key in source_dict.keys():
-            for channel in channels:
-                if channel in source_dict[key].columns:
-                    edited_dict[key] = edited_dict[key].drop(channel, axis="columns")
-        forecasted_dict = mean(edited_dict, until)
-        return forecasted_dict
 
-    source_dict = sort_dict_by_time(source_dict)
-    forecasted_dict = eval(f"{method}(source_dict, until, **kwargs)")
-    return forecasted_dict
+@profiled(rows=len)
+def forecast_matrix(
+    matrix: MonthlyMatrix, until: str, method: str = "mean", **kwargs
+) -> list:
+    """Forecast monthly totals from precomputed MonthlyMatrix
+    ----------
+    Parameters:
+    matrix : monthly sums per channel
+    until : date until which data was recorded (inclusivly)
+    method : method used for forcast, "mean" by default
+    **kwargs : keyword arguments to pass for inner method functions,
+               `channels` - list with column names to drop from calculations
+    -------
+    Returns:
+    list of recorded and forecasted totals for every month of the matrix
+    """
+    if method not in FORECAST_METHODS:
+        raise ValueError(
+            f"Unknown forecast method {method!r}, "
+            f"available: {', '.join(FORECAST_METHODS)}"
+        )
+    values = matrix.values
+    channels = kwargs.pop("channels", None)
+    if channels:
+        values = values[:, channel_mask(matrix.columns, channels)]
+    n = bisect_right(matrix.ordinals, month_ordinal(until))
+    if n == 0:
+        raise ValueError(f"No data recorded until {until}")
+    totals = values[:n].sum(axis=1)
+    history = values[:n]
+    if matrix.unit != 1:
+        totals, history = totals / matrix.unit, history / matrix.unit
+    totals = list(totals)
+    horizon = len(matrix.months) - n
+    if horizon:
+        forecasted = FORECAST_METHODS[method](
+            history, matrix.ordinals, horizon, **kwargs
+        )
+        totals += [round(value) for value in forecasted.sum(axis=1)]
+    return totals
+
+
+class Scenario(NamedTuple):
+    """Forecast of one series with its own cutoff, method and dropped channels"""
+
+    name: str
+    series: str
+    until: str
+    method: str = "mean"
+    channels: tuple = ()
+    kwargs: dict | None = None
+
+
+class SavingsScenario(NamedTuple):
+    """Savings projected from a savings series with incomes and expenses
+    forecasted by two scenarios, see forecast_savings"""
 
+    name: str
+    series: str
+    incomes: str
+    expenses: str
+    until: str
+    fill: str = "truncate"
 
+
+@profiled(rows=len)
+def forecast_many(
+    series: dict[str, dict], scenarios: list, savings: list = ()
+) -> pd.DataFrame:
+    """Forecast many series and scenarios in one call, every series is
+    sorted and summed up only once and shared by all its scenarios;
+    savings projected from the same series and months are computed
+    as one matrix
+    ----------
+    Parameters:
+    series : dictionary name -> dictionary with incomes-expenses data
+             (or MonthlyMatrix) or with savings data,
+             e.g. incomes, savings and expenses of every household
+    scenarios : list of Scenario or tuples
+                (name, series, until[, method, channels, kwargs])
+    savings : list of SavingsScenario or tuples
+              (name, series, incomes scenario, expenses scenario, until[, fill])
+    -------
+    Returns:
+    DataFrame with columns scenario, series, month, value and forecasted
+    """
+    scenarios = [Scenario(*scenario) for scenario in scenarios]
+    matrices = {}
+    for scenario in scenarios:
+        if scenario.series not in matrices:
+            source = series[scenario.series]
+            if not isinstance(source, MonthlyMatrix):
+                source = monthly_matrix(source)
+            matrices[scenario.series] = source
+    names, series_names, months, values, forecasted = [], [], [], [], []
+    results = {}
+    for scenario in scenarios:
+        matrix = matrices[scenario.series]
+        totals = forecast_matrix(
+            matrix,
+            scenario.until,
+            scenario.method,
+            channels=scenario.channels,
+            **(scenario.kwargs or {}),
+        )
+        results[scenario.name] = (scenario.series, dict(zip(matrix.months, totals)))
+        names += [scenario.name] * len(totals)
+        series_names += [scenario.series] * len(totals)
+        months += matrix.months
+        values += totals
+        forecasted.append(matrix.ordinals > month_ordinal(scenario.until))
+    groups = {}
+    for scenario in savings:
+        scenario = SavingsScenario(*scenario)
+        _check_fill(scenario.fill)
+        key = (
+            scenario.series,
+            results[scenario.incomes][0],
+            results[scenario.expenses][0],
+            scenario.until,
+            scenario.fill,
+        )
+        groups.setdefault(key, []).append(scenario)
+    for (name, _, _, until, fill), group in groups.items():
+        source_dict = sort_dict_by_time(series[name])
+        recorded = _recorded_savings(source_dict, until)
+        incomes = [results[scenario.incomes][1] for scenario in group]
+        expenses = [results[scenario.expenses][1] for scenario in group]
+        future = _future_months(source_dict, incomes[0], expenses[0], until, fill)
+        projected = savings_trajectories(
+            next(reversed(recorded.values())),
+            np.column_stack([_align(d, future, fill) for d in incomes]),
+            np.column_stack([_align(d, future, fill) for d in expenses]),
+        )
+        size = len(recorded) + len(future)
+        for column, scenario in zip(projected.T, group):
+            names += [scenario.name] * size
+            series_names += [name] * size
+            months += list(recorded) + future
+            values += list(recorded.values()) + column.tolist()
+            forecasted.append(np.arange(size) >= len(recorded))
+    return pd.DataFrame(
+        {
+            "scenario": pd.Categorical(names),
+            "series": pd.Categorical(series_names),
+            "month": months,
+            "value": np.array(values, dtype="float64"),
+            "forecasted": np.concatenate(forecasted) if forecasted else [],
+        }
+    )
+
+
+def scenario_dicts(
+    table: pd.DataFrame, start_month: str = None, end_month: str = None
+) -> dict[str, dict]:
+    """Split result of forecast_many into dictionaries like forecast returns,
+    months of the period are selected once for all scenarios
+    ----------
+    Parameters:
+    table : result of forecast_many
+    start_month : first month of the period (inclusivly), None for open start
+    end_month : last month of the period (inclusivly), None for open end
+    -------
+    Returns:
+    dictionary scenario -> dictionary with forcasted data
+    """
+    if start_month or end_month:
+        ordinals = np.array([month_ordinal(month) for month in table["month"]])
+        selected = np.ones(len(table), dtype=bool)
+        if start_month:
+            selected &= ordinals >= month_ordinal(start_month)
+        if end_month:
+            selected &= ordinals <= month_ordinal(end_month)
+        table = table[selected]
+    return {
+        str(name): MonthDict(zip(rows["month"], rows["value"]), ascending=True)
+        for name, rows in table.groupby("scenario", observed=True, sort=False)
+    }
+
+
+SAVINGS_FILL_POLICIES = ("truncate", "zero", "ffill", "raise")
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def savings_trajectories(
+    start_balance, incomes: np.ndarray, expenses: np.ndarray
+) -> np.ndarray:
+    """Project savings as cumulative sum of monthly margins
+    ----------
+    Parameters:
+    start_balance : savings at the end of the last recorded month,
+                    scalar or array with value per scenario
+    incomes : incomes per month, array (months,) or matrix (months, scenarios)
+    expenses : expenses per month, the same shape as incomes
+    -------
+    Returns:
+    savings at the end of every month, the same shape as incomes
+    """
+    return np.asarray(start_balance) + np.cumsum(
+        np.asarray(incomes) - np.asarray(expenses), axis=0
+    )
+
+
+def _align(source_dict: dict, months: list[str], fill: str) -> np.ndarray:
+    values = np.array([source_dict.get(month, np.nan) for month in months], dtype=float)
+    missing = np.isnan(values)
+    if not missing.any():
+        return values
+    if fill == "raise":
+        absent = [month for month, gap in zip(months, missing) if gap]
+        raise KeyError(f"No forecast for months: {', '.join(absent)}")
+    if fill == "ffill":
+        positions = np.where(missing, 0, np.arange(len(values)))
+        np.maximum.accumulate(positions, out=positions)
+        values = values[positions]
+        missing = np.isnan(values)
+    values[missing] = 0
+    return values
+
+
+def _check_fill(fill: str) -> None:
+    if fill not in SAVINGS_FILL_POLICIES:
+        raise ValueError(
+            f"Unknown fill policy {fill!r}, "
+            f"available: {', '.join(SAVINGS_FILL_POLICIES)}"
+        )
+
+
+def _recorded_savings(source_dict: dict, until: str) -> MonthDict:
+    until_ordinal = month_ordinal(until)
+    recorded = MonthDict(ascending=True)
+    for key, value in source_dict.items():
+        if month_ordinal(key) > until_ordinal:
+            break
+        recorded[key] = value.iat[-1]
+    if not recorded:
+        raise ValueError(f"No savings recorded until {until}")
+    return recorded
+
+
+def _future_months(
+    source_dict: dict, incomes_dict: dict, expenses_dict: dict, until: str, fill: str
+) -> list[str]:
+    until_ordinal = month_ordinal(until)
+    future = {
+        month_ordinal(key)
+        for source in (source_dict, incomes_dict, expenses_dict)
+        for key in source.keys()
+    }
+    months = [month_key(ordinal) for ordinal in sorted(future) if ordinal > until_ordinal]
+    if fill == "truncate":
+        available = [
+            month in incomes_dict and month in expenses_dict for month in months
+        ]
+        months = months[: available.index(False) if False in available else None]
+    return months
+
+
+@profiled(rows=len)
 def forecast_savings(
     source_dict: dict,
     incomes_dict: dict,
     expenses_dict: dict,
     until: str,
+    fill: str = "truncate",
 ) -> dict:
     """Forecast future savings
     ----------
@@ -81,23 +446,141 @@ def forecast_savings(
     incomes_dict : dictionary with incomes data
     expenses_dict : dictionary with expenses data
     until : date until which data was recorded (inclusivly)
+    fill : how to handle months without incomes or expenses forecast:
+           "truncate" - stop projection at the first such month,
+           "zero" - count missing incomes or expenses as 0,
+           "ffill" - repeat the last available forecast,
+           "raise" - raise KeyError
     -------
     Returns:
     dictionary with forcasted data
     """
+    _check_fill(fill)
     source_dict = sort_dict_by_time(source_dict)
     incomes_dict = sort_dict_by_time(incomes_dict)
     expenses_dict = sort_dict_by_time(expenses_dict)
-    forecasted_dict = {}
-    start_sum_savings = False
-    save_value = 0
-    for key, value in source_dict.items():
-        if not start_sum_savings:
-            forecasted_dict[key] = source_dict[key].iat[-1]
-            if key == until:
-                save_value = value.iat[-1]
-                start_sum_savings = True
-        else:
-            forecasted_dict[key] = incomes_dict[key] - expenses_dict[key] + save_value
-            save_value = forecasted_dict[key]
+    forecasted_dict = _recorded_savings(source_dict, until)
+    save_value = next(reversed(forecasted_dict.values()))
+    months = _future_months(source_dict, incomes_dict, expenses_dict, until, fill)
+    incomes = _align(incomes_dict, months, fill)
+    expenses = _align(expenses_dict, months, fill)
+    projected = savings_trajectories(save_value, incomes, expenses)
+    if isinstance(save_value, (int, np.integer)) and np.all(projected % 1 == 0):
+        projected = projected.astype(np.int64)
+    forecasted_dict.update(zip(months, projected.tolist()))
+    forecasted_dict.ascending = True
     return forecasted_dict
+
+
+class SimulationResult(NamedTuple):
+    """Percentile bands of simulated trajectories
+    ----------
+    Attributes:
+    incomes : DataFrame month x percentile of monthly incomes
+    expenses : DataFrame month x percentile of monthly expenses
+    savings : DataFrame month x percentile of savings at the end of month
+    shortfall : Series with probability of savings below zero per month
+    """
+
+    incomes: pd.DataFrame
+    expenses: pd.DataFrame
+    savings: pd.DataFrame
+    shortfall: pd.Series
+
+
+def _recorded_rows(source_dict: dict, until: str, channels: list) -> tuple:
+    matrix = monthly_matrix(source_dict)
+    values = matrix.values
+    if channels:
+        values = values[:, channel_mask(matrix.columns, channels)]
+    n = bisect_right(matrix.ordinals, month_ordinal(until))
+    if n == 0:
+        raise ValueError(f"No data recorded until {until}")
+    return values[:n].astype(np.float64), matrix.ordinals[:n]
+
+
+def _bootstrap(
+    ordinals: np.ndarray,
+    future: np.ndarray,
+    n_paths: int,
+    seasonal: bool,
+    rng: np.random.Generator,
+) -> np.ndarray:
+    if not seasonal:
+        return rng.integers(0, len(ordinals), size=(len(future), n_paths))
+    picks = np.empty((len(future), n_paths), dtype=np.int64)
+    for j, month in enumerate(future):
+        pool = np.flatnonzero(ordinals % 12 == month % 12)
+        if not len(pool):
+            pool = np.arange(len(ordinals))
+        picks[j] = pool[rng.integers(0, len(pool), size=n_paths)]
+    return picks
+
+
+@profiled()
+def simulate(
+    incomes_dict: dict,
+    expenses_dict: dict,
+    savings_dict: dict,
+    until: str,
+    horizon: int = 12,
+    n_paths: int = 10000,
+    seasonal: bool = False,
+    seed: int = None,
+    percentiles: tuple = DEFAULT_PERCENTILES,
+    channels: list = None,
+) -> SimulationResult:
+    """Monte Carlo forecast: bootstrap recorded months into many
+    trajectories of incomes, expenses and resulting savings; every step
+    of a path draws one month recorded in both incomes and expenses and takes
+    all its channels of both sections, so links between channels and between
+    incomes and expenses of a month are kept (sums of the channels are used)
+    ----------
+    Parameters:
+    incomes_dict : dictionary with incomes data
+    expenses_dict : dictionary with expenses data
+    savings_dict : dictionary with savings data
+    until : date until which data was recorded (inclusivly)
+    horizon : number of months to simulate after `until`
+    n_paths : number of simulated trajectories
+    seasonal : sample only recorded months of the same month of the year
+    seed : seed of random generator for reproducible results
+    percentiles : percentiles reported for every month
+    channels : list with column names to drop from calculations
+    -------
+    Returns:
+    SimulationResult with percentile bands and probability of shortfall
+    """
+    rng = np.random.default_rng(seed)
+    until_ordinal = month_ordinal(until)
+    future = np.arange(until_ordinal + 1, until_ordinal + 1 + horizon)
+    months = [month_key(ordinal) for ordinal in future]
+    income_rows, income_months = _recorded_rows(incomes_dict, until, channels)
+    expense_rows, expense_months = _recorded_rows(expenses_dict, until, channels)
+    ordinals, income_idx, expense_idx = np.intersect1d(
+        income_months, expense_months, return_indices=True
+    )
+    if not len(ordinals):
+        raise ValueError(f"No month with both incomes and expenses until {until}")
+    picks = _bootstrap(ordinals, future, n_paths, seasonal, rng)
+    incomes = income_rows[income_idx].sum(axis=1)[picks]
+    expenses = expense_rows[expense_idx].sum(axis=1)[picks]
+    savings_dict = reduce_dict_by_time(savings_dict, None, until)
+    if not savings_dict:
+        raise ValueError(f"No savings recorded until {until}")
+    start_balance = float(next(reversed(savings_dict.values())).iat[-1])
+    savings = savings_trajectories(start_balance, incomes, expenses)
+
+    def bands(paths: np.ndarray) -> pd.DataFrame:
+        return pd.DataFrame(
+            np.percentile(paths, percentiles, axis=1).T,
+            index=months,
+            columns=[f"p{percentile}" for percentile in percentiles],
+        )
+
+    return SimulationResult(
+        bands(incomes),
+        bands(expenses),
+        bands(savings),
+        pd.Series((savings < 0).mean(axis=1), index=months, name="shortfall"),
+    )
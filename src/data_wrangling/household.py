@@ -0,0 +1,129 @@
+# Aggregation of incomes, savings and expenses of several households
+
+import pandas as pd
+from src.data_wrangling.dict_handler import MonthDict, month_key, month_ordinal
+
+MONTH_POLICIES = ("union", "intersection")
+
+
+def combine_households(
+    households: dict[str, dict],
+    months: str = "union",
+    fill_value: float = 0,
+    keep_household: bool = False,
+    balances: bool = False,
+) -> dict:
+    """Combine the same section (incomes, savings or expenses) of many
+    households on the union of their months, days and channels
+    ----------
+    Parameters:
+    households : dictionary household name -> dictionary with section data
+    months : "union" - keep months recorded by any household,
+             "intersection" - keep only months recorded by all households
+    fill_value : value for channels or days absent in a household,
+                 None keeps them missing
+    keep_household : do not sum households, keep them as the first level
+                     of the index for drill-down
+    balances : data are balances (savings), with "union" months a household
+               has not recorded after its first month repeat its last balance
+    -------
+    Returns:
+    sorted dictionary Month_Year -> DataFrame (Series for savings)
+    indexed by date, or by (household, date) if keep_household
+    """
+    if months not in MONTH_POLICIES:
+        raise ValueError(
+            f"Unknown months policy {months!r}, available: {', '.join(MONTH_POLICIES)}"
+        )
+    households = {name: data for name, data in households.items() if data}
+    if not households:
+        return MonthDict(ascending=True)
+    ordinals = {
+        name: [month_ordinal(key) for key in data.keys()]
+        for name, data in households.items()
+    }
+    if balances and months == "union":
+        households, ordinals = _carry_balances(households, ordinals)
+    if months == "intersection":
+        common = set.intersection(*(set(values) for values in ordinals.values()))
+    names, frames = [], []
+    for name, data in households.items():
+        selected = [
+            (ordinal, frame)
+            for ordinal, frame in zip(ordinals[name], data.values())
+            if months == "union" or ordinal in common
+        ]
+        if selected:
+            names.append(name)
+            frames.append(
+                pd.concat([frame for _, frame in selected], keys=[o for o, _ in selected])
+            )
+    if not frames:
+        return MonthDict(ascending=True)
+    combined = pd.concat(frames, keys=names)
+    date_level = combined.index.names[-1]
+    combined.index = combined.index.set_names(["household", "month", date_level])
+    if fill_value is not None:
+        combined = combined.fillna(fill_value)
+    if keep_household:
+        grouped = combined.reorder_levels(["month", "household", date_level])
+    else:
+        grouped = combined.groupby(level=["month", date_level], sort=True).sum(
+            min_count=1
+        )
+    result = MonthDict(ascending=True)
+    for ordinal, frame in grouped.groupby(level="month", sort=True):
+        frame = frame.droplevel("month")
+        result[month_key(ordinal)] = frame
+    return result
+
+
+def _carry_balances(households: dict, ordinals: dict) -> tuple:
+    dates = {}
+    for name, data in households.items():
+        for ordinal, series in zip(ordinals[name], data.values()):
+            dates.setdefault(ordinal, series.index)
+    carried, carried_ordinals = {}, {}
+    for name, data in households.items():
+        recorded = dict(zip(ordinals[name], data.values()))
+        last = None
+        for ordinal in sorted(dates):
+            if ordinal in recorded:
+                last = recorded[ordinal]
+            elif last is not None:
+                recorded[ordinal] = pd.Series(
+                    last.iloc[-1], index=dates[ordinal], name=last.name
+                )
+        carried[name] = {month_key(ordinal): recorded[ordinal] for ordinal in recorded}
+        carried_ordinals[name] = list(recorded)
+    return carried, carried_ordinals
+
+
+def combine_sections(
+    households: dict[str, tuple],
+    months: str = "union",
+    fill_value: float = 0,
+    keep_household: bool = False,
+) -> tuple:
+    """Combine incomes, savings and expenses of many households
+    ----------
+    Parameters:
+    households : dictionary household name -> (incomes, savings, expenses, ...)
+                 as returned by prepare_data or prepare_many
+    months : "union" or "intersection" of household months
+    fill_value : value for channels, days or months absent in a household
+    keep_household : keep household as the first level of the index
+    -------
+    Returns:
+    tuple of combined incomes, savings and expenses dictionaries
+    """
+    return tuple(
+        combine_households(
+            {name: sections[i] for name, sections in households.items()},
+            months=months,
+            fill_value=fill_value,
+            keep_household=keep_household,
+            balances=i == 1,
+        )
+        for i in range(3)
+    )
@@ -0,0 +1,317 @@
+# Streaming import of CSV bank statements into dictionaries of prepare_data format
+
+import re
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+from src.data_wrangling.dict_handler import month_key, sort_dict_by_time
+from src.data_wrangling.profiling import profiled, stage
+
+DATE_NAME = ("дата", "дата")
+SAVINGS_NAME = "остаток"
+DEFAULT_INCOME = "Разное"
+DEFAULT_EXPENSE = ("Разное", "разное")
+
+
+class Rule(NamedTuple):
+    """Categorization rule of transactions, the first matching rule wins
+    ----------
+    Attributes:
+    column : channel of incomes (matches credits, positive amounts)
+             or (group, channel) of expenses (matches debits, negative amounts)
+    pattern : regular expression searched in description (case-insensitive)
+    keywords : substrings of description (case-insensitive), any of them matches
+    min_amount : the least absolute amount (inclusively), None - unbounded
+    max_amount : the largest absolute amount (inclusively), None - unbounded
+    """
+
+    column: str | tuple
+    pattern: str | None = None
+    keywords: tuple = ()
+    min_amount: float | None = None
+    max_amount: float | None = None
+
+
+class StatementFormat(NamedTuple):
+    """Columns and number format of a CSV statement, amounts of debits are negative"""
+
+    date: str = "date"
+    description: str = "description"
+    amount: str = "amount"
+    date_format: str | None = None
+    dayfirst: bool = False
+    sep: str = ","
+    decimal: str = "."
+    thousands: str | None = None
+    encoding: str = "utf-8"
+
+
+class CompiledRules:
+    """Rules compiled once: description patterns and keywords of every rule
+    are joined into one regular expression, amount bounds and columns into arrays
+    ----------
+    Attributes:
+    incomes : columns of incomes
+    expenses : (group, channel) columns of expenses
+    """
+
+    def __init__(
+        self,
+        rules: list,
+        incomes: pd.Index = None,
+        expenses: pd.MultiIndex = None,
+        default_income: str = DEFAULT_INCOME,
+        default_expense: tuple = DEFAULT_EXPENSE,
+    ):
+        rules = [rule if isinstance(rule, Rule) else _rule(rule) for rule in rules]
+        income_labels = [rule.column for rule in rules if not _is_expense(rule.column)]
+        expense_labels = [rule.column for rule in rules if _is_expense(rule.column)]
+        if incomes is None:
+            incomes = pd.Index(
+                list(dict.fromkeys([*income_labels, default_income])), dtype=object
+            )
+        if expenses is None:
+            expenses = pd.MultiIndex.from_tuples(
+                list(dict.fromkeys([*expense_labels, tuple(default_expense)]))
+            )
+        self.incomes = pd.Index(list(incomes), dtype=object, name=1)
+        self.expenses = pd.MultiIndex.from_tuples(list(expenses), names=[0, 1])
+        self.defaults = (
+            self._code(default_income, False),
+            self._code(tuple(default_expense), True),
+        )
+        self.expense = np.array([_is_expense(rule.column) for rule in rules], dtype=bool)
+        self.codes = np.array(
+            [self._code(rule.column, _is_expense(rule.column)) for rule in rules],
+            dtype=np.int64,
+        )
+        self.low = np.array(
+            [-np.inf if rule.min_amount is None else rule.min_amount for rule in rules]
+        )
+        self.high = np.array(
+            [np.inf if rule.max_amount is None else rule.max_amount for rule in rules]
+        )
+        self.patterns = [_compile(rule) for rule in rules]
+
+    def _code(self, column, expense: bool) -> int:
+        columns = self.expenses if expense else self.incomes
+        if column not in columns:
+            section = "expenses" if expense else "incomes"
+            raise ValueError(f"Column {column!r} is absent in {section} columns")
+        return columns.get_loc(column)
+
+    @profiled("categorize", rows=lambda result: len(result[0]))
+    def categorize(self, descriptions: pd.Series, amounts: np.ndarray) -> tuple:
+        """Columns of transactions, descriptions are matched once per
+        distinct description and only for transactions not matched yet
+        ----------
+        Parameters:
+        descriptions : descriptions of transactions
+        amounts : signed amounts of transactions
+        -------
+        Returns:
+        tuple of boolean array (True for expenses) and column codes
+        in incomes or expenses columns
+        """
+        amounts = np.asarray(amounts, dtype=np.float64)
+        expense = amounts < 0
+        sizes = np.abs(amounts)
+        codes = np.where(expense, self.defaults[1], self.defaults[0])
+        inverse, uniques = pd.factorize(descriptions.fillna("").astype(str))
+        uniques = np.asarray(uniques, dtype=object)
+        pending = np.ones(len(amounts), dtype=bool)
+        for i, pattern in enumerate(self.patterns):
+            selected = pending & (expense == self.expense[i])
+            selected &= (sizes >= self.low[i]) & (sizes <= self.high[i])
+            if pattern is not None and selected.any():
+                found = np.zeros(len(uniques), dtype=bool)
+                found[inverse[selected]] = True
+                candidates = np.flatnonzero(found)
+                texts = pd.Series(uniques[candidates], dtype=object)
+                found[candidates] = texts.str.contains(pattern, regex=True)
+                selected &= found[inverse]
+            codes[selected] = self.codes[i]
+            pending &= ~selected
+            if not pending.any():
+                break
+        return expense, codes
+
+
+def _is_expense(column) -> bool:
+    return isinstance(column, tuple)
+
+
+def _rule(item) -> Rule:
+    if isinstance(item, dict):
+        item = dict(item)
+        if isinstance(item.get("column"), list):
+            item["column"] = tuple(item["column"])
+        return Rule(**item)
+    return Rule(*item)
+
+
+def _compile(rule: Rule) -> re.Pattern | None:
+    alternatives = [re.escape(keyword) for keyword in rule.keywords]
+    if rule.pattern is not None:
+        alternatives.insert(0, f"(?:{rule.pattern})")
+    if not alternatives:
+        return None
+    return re.compile("|".join(alternatives), re.IGNORECASE)
+
+
+def template_columns(filename: str, drop: list[str] = []) -> tuple:
+    """Columns of incomes and expenses of the latest sheet of a workbook
+    ----------
+    Parameters:
+    filename : workbook in the layout of template.xlsx
+    drop : names of sheets to skip
+    -------
+    Returns:
+    tuple of incomes columns and (group, channel) expenses columns
+    """
+    from src.data_wrangling.loader import prepare_data
+
+    incomes, _, expenses, _ = prepare_data(
+        filename, drop, use_cache=False, sections=["incomes", "expenses"]
+    )
+    incomes, expenses = sort_dict_by_time(incomes), sort_dict_by_time(expenses)
+    return (
+        next(reversed(incomes.values())).columns,
+        next(reversed(expenses.values())).columns,
+    )
+
+
+class _DailySums:
+    def __init__(self, width: int):
+        self.width = width
+        self.rows = {}
+
+    def add(self, days: np.ndarray, codes: np.ndarray, amounts: np.ndarray) -> None:
+        day_codes, unique_days = pd.factorize(days)
+        sums = np.bincount(
+            day_codes * self.width + codes,
+            weights=amounts,
+            minlength=len(unique_days) * self.width,
+        ).reshape(len(unique_days), self.width)
+        for day, row in zip(unique_days.tolist(), sums):
+            known = self.rows.get(day)
+            if known is None:
+                self.rows[day] = row
+            else:
+                known += row
+
+    def dense(self, first: int, last: int) -> np.ndarray:
+        values = np.zeros((last - first + 1, self.width))
+        for day, row in self.rows.items():
+            values[day - first] = row
+        return values
+
+
+@profiled(rows=lambda result: len(result[0]))
+def import_statement(
+    filename: str,
+    rules,
+    statement: StatementFormat = StatementFormat(),
+    opening_balance: float = 0.0,
+    chunk_rows: int = 100_000,
+) -> tuple[dict, dict, dict, dict]:
+    """Read a CSV bank statement in chunks and sum transactions per day
+    into columns of the template, memory depends on the number of days
+    and columns but not on the number of transactions
+    ----------
+    Parameters:
+    filename : CSV file (or file object) of the statement
+    rules : CompiledRules or list of Rule, transactions matched by no rule
+            go to "Разное" columns
+    statement : columns and number format of the statement
+    opening_balance : savings before the first transaction
+    chunk_rows : number of rows read at once
+    -------
+    Returns:
+    tuple of incomes, savings, expenses and (empty) food consuming dictionaries
+    in the format of prepare_data, every month has all its days, savings are
+    opening_balance plus incomes minus expenses at the end of every day;
+    ValueError is raised for rows without date or amount
+    """
+    if not isinstance(rules, CompiledRules):
+        rules = CompiledRules(rules)
+    incomes = _DailySums(len(rules.incomes))
+    expenses = _DailySums(len(rules.expenses))
+    reader = pd.read_csv(
+        filename,
+        usecols=[statement.date, statement.description, statement.amount],
+        dtype={statement.description: object},
+        sep=statement.sep,
+        decimal=statement.decimal,
+        thousands=statement.thousands,
+        encoding=statement.encoding,
+        chunksize=chunk_rows,
+    )
+    rows = 0
+    with reader:
+        for chunk in reader:
+            with stage("import_chunk", rows=len(chunk)):
+                days = pd.to_datetime(
+                    chunk[statement.date],
+                    format=statement.date_format,
+                    dayfirst=statement.dayfirst,
+                )
+                amounts = pd.to_numeric(chunk[statement.amount]).to_numpy(np.float64)
+                invalid = ~np.isfinite(amounts) | days.isna().to_numpy()
+                if invalid.any():
+                    numbers = (chunk.index[invalid] + 1).tolist()
+                    raise ValueError(
+                        "Missing date or amount in rows of the statement: "
+                        + ", ".join(map(str, numbers[:10]))
+                        + (", ..." if len(numbers) > 10 else "")
+                    )
+                days = days.to_numpy().astype("datetime64[D]").astype(np.int64)
+                expense, codes = rules.categorize(chunk[statement.description], amounts)
+                income = ~expense & (amounts != 0)
+                incomes.add(days[income], codes[income], amounts[income])
+                expenses.add(days[expense], codes[expense], -amounts[expense])
+                rows += len(chunk)
+    if not rows:
+        return {}, {}, {}, {}
+    days = incomes.rows.keys() | expenses.rows.keys()
+    return _month_dicts(rules, incomes, expenses, min(days), max(days), opening_balance)
+
+
+def _month_dicts(rules, incomes, expenses, first, last, opening_balance) -> tuple:
+    month = np.datetime64(first, "D").astype("datetime64[M]")
+    first = month.astype("datetime64[D]").astype(np.int64)
+    month = np.datetime64(last, "D").astype("datetime64[M]")
+    last = (month + 1).astype("datetime64[D]").astype(np.int64) - 1
+    income_values = incomes.dense(first, last)
+    expense_values = expenses.dense(first, last)
+    balance = opening_balance + np.cumsum(
+        income_values.sum(axis=1) - expense_values.sum(axis=1)
+    )
+    dates = pd.DatetimeIndex(
+        np.arange(first, last + 1).astype("datetime64[D]").astype("datetime64[us]"),
+        name=DATE_NAME,
+    )
+    months = dates.year * 12 + dates.month - 1
+    bounds = np.flatnonzero(np.diff(months)) + 1
+    starts = np.concatenate([[0], bounds])
+    ends = np.concatenate([bounds, [len(dates)]])
+    income_dict, savings_dict, expense_dict = {}, {}, {}
+    for start, end in zip(starts, ends):
+        key = month_key(months[start])
+        index = dates[start:end]
+        income_dict[key] = pd.DataFrame(
+            income_values[start:end], index=index, columns=rules.incomes
+        )
+        expense_dict[key] = pd.DataFrame(
+            expense_values[start:end], index=index, columns=rules.expenses
+        )
+        savings_dict[key] = pd.Series(
+            balance[start:end], index=index, name=SAVINGS_NAME
+        )
+    return (
+        sort_dict_by_time(income_dict),
+        sort_dict_by_time(savings_dict),
+        sort_dict_by_time(expense_dict),
+        {},
+    )
@@ -0,0 +1,243 @@
+# Long-format ledger: one row per (household, date, section, group, channel)
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+from src.data_wrangling.dict_handler import MonthDict, month_key, month_ordinal
+
+LEDGER_COLUMNS = ["household", "month", "date", "section", "group", "channel", "amount"]
+CATEGORICAL_COLUMNS = ["household", "section", "group", "channel"]
+INCOMES = "incomes"
+SAVINGS = "savings"
+EXPENSES = "expenses"
+INCOMES_GROUP = "доход"
+SAVINGS_GROUP = "остаток"
+DATE_NAME = ("дата", "дата")
+
+
+def _month_period(ordinal: int) -> pd.Period:
+    return pd.Period(year=ordinal // 12, month=ordinal % 12 + 1, freq="M")
+
+
+def _section_ledger(source_dict: dict, section: str, household: str) -> pd.DataFrame:
+    keys = list(source_dict.keys())
+    if not keys:
+        return pd.DataFrame(columns=LEDGER_COLUMNS)
+    wide = pd.concat([source_dict[key] for key in keys], keys=range(len(keys)))
+    if isinstance(wide, pd.Series):
+        wide = wide.to_frame(SAVINGS_GROUP)
+    month_codes = wide.index.get_level_values(0).to_numpy()
+    dates = wide.index.get_level_values(1)
+    columns = wide.columns
+    if isinstance(columns, pd.MultiIndex):
+        groups = columns.get_level_values(0)
+        channels = columns.get_level_values(1)
+    elif section == INCOMES:
+        groups = pd.Index([INCOMES_GROUP] * len(columns))
+        channels = columns
+    else:
+        groups = pd.Index([SAVINGS_GROUP] * len(columns))
+        channels = columns
+
+    if any(dtype == object for dtype in wide.dtypes):
+        wide = wide.apply(pd.to_numeric, errors="coerce")
+    rows, width = wide.shape
+    amounts = wide.to_numpy(dtype="float64").ravel()
+    present = ~np.isnan(amounts)
+    row_idx = np.repeat(np.arange(rows), width)[present]
+    col_idx = np.tile(np.arange(width), rows)[present]
+    periods = pd.Index([_month_period(month_ordinal(key)) for key in keys])
+    return pd.DataFrame(
+        {
+            "household": pd.Categorical([household]).repeat(len(row_idx)),
+            "month": periods.take(month_codes[row_idx]),
+            "date": dates.take(row_idx),
+            "section": pd.Categorical([section]).repeat(len(row_idx)),
+            "group": pd.Categorical(
+                groups.take(col_idx), categories=groups.dropna().unique()
+            ),
+            "channel": pd.Categorical(
+                channels.take(col_idx), categories=channels.dropna().unique()
+            ),
+            "amount": amounts[present],
+        }
+    )
+
+
+def to_ledger(
+    incomes: dict = None,
+    savings: dict = None,
+    expenses: dict = None,
+    household: str = "default",
+) -> pd.DataFrame:
+    """Convert dictionaries returned by prepare_data into long-format ledger
+    ----------
+    Parameters:
+    incomes : dictionary with incomes data
+    savings : dictionary with savings data
+    expenses : dictionary with expenses data
+    household : name of the household
+    -------
+    Returns:
+    DataFrame with columns household, month (period), date, section,
+    group, channel (categoricals) and amount
+    """
+    ledgers = [
+        _section_ledger(source_dict, section, household)
+        for section, source_dict in (
+            (INCOMES, incomes),
+            (SAVINGS, savings),
+            (EXPENSES, expenses),
+        )
+        if source_dict
+    ]
+    return concat_ledgers(ledgers)
+
+
+def concat_ledgers(ledgers: list[pd.DataFrame]) -> pd.DataFrame:
+    """Concatenate ledgers keeping categorical columns categorical
+    ----------
+    Parameters:
+    ledgers : list of ledgers, e.g. of different households
+    -------
+    Returns:
+    single ledger
+    """
+    ledgers = [ledger for ledger in ledgers if len(ledger)]
+    if not ledgers:
+        return pd.DataFrame(columns=LEDGER_COLUMNS)
+    columns = {
+        column: _union_categoricals([ledger[column] for ledger in ledgers])
+        for column in CATEGORICAL_COLUMNS
+    }
+    ledger = pd.concat(
+        [ledger.drop(columns=CATEGORICAL_COLUMNS) for ledger in ledgers],
+        ignore_index=True,
+    )
+    for column, values in columns.items():
+        ledger[column] = values
+    return ledger[LEDGER_COLUMNS]
+
+
+def _union_categoricals(values: list) -> pd.Categorical:
+    categoricals = [pd.Categorical(value) for value in values]
+    if len({categorical.categories.dtype for categorical in categoricals}) > 1:
+        # e.g. labels read from cache as object and labels inferred as str
+        categoricals = [
+            categorical.rename_categories(categorical.categories.astype(object))
+            for categorical in categoricals
+        ]
+    return union_categoricals(categoricals)
+
+
+def _select(ledger: pd.DataFrame, section: str, household: str = None):
+    mask = ledger["section"] == section
+    if household is not None:
+        mask &= ledger["household"] == household
+    return ledger[mask]
+
+
+def from_ledger(ledger: pd.DataFrame, section: str, household: str = None) -> dict:
+    """Convert ledger back into dictionary in prepare_data format
+    ----------
+    Parameters:
+    ledger : long-format ledger
+    section : "incomes", "savings" or "expenses"
+    household : name of the household, None sums up all households
+    -------
+    Returns:
+    dictionary Month_Year -> DataFrame (Series for savings) indexed by date
+    """
+    rows = _select(ledger, section, household)
+    columns = ["group", "channel"] if section == EXPENSES else ["channel"]
+    wide = rows.pivot_table(
+        index=["month", "date"],
+        columns=columns,
+        values="amount",
+        aggfunc="sum",
+        observed=True,
+        sort=False,
+    )
+    wide = wide.sort_index(level=["month", "date"], sort_remaining=False)
+    if section == EXPENSES:
+        wide.columns = pd.MultiIndex.from_tuples(list(wide.columns), names=[0, 1])
+    else:
+        wide.columns = pd.Index(list(wide.columns), dtype=object, name=1)
+    result = MonthDict(ascending=True)
+    for month, frame in wide.groupby(level="month", sort=False):
+        frame = frame.droplevel("month").dropna(axis="columns", how="all")
+        frame.index.name = DATE_NAME
+        if section == SAVINGS:
+            frame = frame.iloc[:, 0].rename(SAVINGS_GROUP)
+        result[month_key(month.year * 12 + month.month - 1)] = frame
+    return result
+
+
+def ledger_sums(ledger: pd.DataFrame, section: str, by: list[str]) -> pd.Series:
+    """Sum amounts of the section by any set of ledger columns
+    ----------
+    Parameters:
+    ledger : long-format ledger
+    section : "incomes" or "expenses"
+    by : ledger columns to group by, e.g. ["month", "household"]
+    -------
+    Returns:
+    Series with sums indexed by `by` columns
+    """
+    rows = _select(ledger, section)
+    return rows.groupby(by, observed=True, sort=True)["amount"].sum()
+
+
+def monthly_totals(ledger: pd.DataFrame, section: str) -> pd.DataFrame:
+    """Monthly totals of the section per household
+    ----------
+    Parameters:
+    ledger : long-format ledger
+    section : "incomes" or "expenses"
+    -------
+    Returns:
+    DataFrame month x household
+    """
+    sums = ledger_sums(ledger, section, ["month", "household"])
+    return sums.unstack("household", fill_value=0)
+
+
+def channel_sums(ledger: pd.DataFrame, section: str) -> pd.DataFrame:
+    """Monthly sums of the section per channel of all households
+    ----------
+    Parameters:
+    ledger : long-format ledger
+    section : "incomes" or "expenses"
+    -------
+    Returns:
+    DataFrame month x (group, channel)
+    """
+    sums = ledger_sums(ledger, section, ["month", "group", "channel"])
+    return sums.unstack(["group", "channel"], fill_value=0)
+
+
+def household_sums(ledger: pd.DataFrame, section: str) -> pd.Series:
+    """Monthly totals of the section summed across households
+    ----------
+    Parameters:
+    ledger : long-format ledger
+    section : "incomes" or "expenses"
+    -------
+    Returns:
+    Series indexed by month
+    """
+    return ledger_sums(ledger, section, ["month"])
+
+
+def month_end_savings(ledger: pd.DataFrame) -> pd.DataFrame:
+    """Savings at the last recorded day of every month per household
+    ----------
+    Parameters:
+    ledger : long-format ledger
+    -------
+    Returns:
+    DataFrame month x household
+    """
+    rows = _select(ledger, SAVINGS).sort_values("date", kind="stable")
+    last = rows.groupby(["month", "household"], observed=True)["amount"].last()
+    return last.unstack("household")
@@ -0,0 +1,424 @@
+# SQLite store of the long-format ledger with incremental sync and range queries
+
+import json
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from src.data_wrangling.cache import file_fingerprint
+from src.data_wrangling.dict_handler import month_ordinal
+from src.data_wrangling.ledger import EXPENSES, INCOMES, LEDGER_COLUMNS, SAVINGS
+from src.data_wrangling.ledger import from_ledger, to_ledger
+from src.data_wrangling.loader import WorkbookLoadError, WorkbookSpec, prepare_data
+from src.data_wrangling.profiling import enabled as profiling_enabled
+from src.data_wrangling.profiling import profiled
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS households (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS channels (
+    id INTEGER PRIMARY KEY,
+    section TEXT NOT NULL,
+    grp TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    UNIQUE (section, grp, channel)
+);
+CREATE TABLE IF NOT EXISTS workbooks (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    household_id INTEGER NOT NULL REFERENCES households (id),
+    position INTEGER NOT NULL,
+    fingerprint TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sheets (
+    id INTEGER PRIMARY KEY,
+    workbook_id INTEGER NOT NULL REFERENCES workbooks (id) ON DELETE CASCADE,
+    household_id INTEGER NOT NULL REFERENCES households (id),
+    section TEXT NOT NULL,
+    month INTEGER NOT NULL,
+    active INTEGER NOT NULL DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS entries (
+    sheet_id INTEGER NOT NULL REFERENCES sheets (id) ON DELETE CASCADE,
+    household_id INTEGER NOT NULL REFERENCES households (id),
+    month INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    channel_id INTEGER NOT NULL REFERENCES channels (id),
+    amount REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_household_month ON entries (household_id, month);
+CREATE INDEX IF NOT EXISTS entries_channel_month ON entries (channel_id, month);
+CREATE INDEX IF NOT EXISTS entries_sheet ON entries (sheet_id);
+CREATE INDEX IF NOT EXISTS sheets_household_section_month
+    ON sheets (household_id, section, month);
+CREATE INDEX IF NOT EXISTS sheets_workbook ON sheets (workbook_id);
+CREATE VIEW IF NOT EXISTS ledger AS
+SELECT
+    households.name AS household,
+    entries.month AS month,
+    entries.date AS date,
+    sheets.section AS section,
+    channels.grp AS "group",
+    channels.channel AS channel,
+    entries.amount AS amount
+FROM entries
+JOIN sheets ON sheets.id = entries.sheet_id AND sheets.active
+JOIN households ON households.id = entries.household_id
+JOIN channels ON channels.id = entries.channel_id;
+"""
+# A month of a household is taken from the last workbook which has it,
+# the same way as later workbooks override months in prepare_many
+UPDATE_ACTIVE = """
+UPDATE sheets SET active = (
+    SELECT workbooks.position = (
+        SELECT MAX(other.position)
+        FROM sheets AS same
+        JOIN workbooks AS other ON other.id = same.workbook_id
+        WHERE same.household_id = sheets.household_id
+        AND same.section = sheets.section
+        AND same.month = sheets.month
+    )
+    FROM workbooks WHERE workbooks.id = sheets.workbook_id
+)
+"""
+SELECT_LEDGER = """
+SELECT households.name, entries.month, entries.date, sheets.section,
+       channels.grp, channels.channel, entries.amount
+FROM entries
+JOIN sheets ON sheets.id = entries.sheet_id AND sheets.active
+JOIN households ON households.id = entries.household_id
+JOIN channels ON channels.id = entries.channel_id
+"""
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """Open the ledger database, create tables and indexes if missing
+    ----------
+    Parameters:
+    path : database file, ":memory:" for in-memory database
+    -------
+    Returns:
+    connection
+    """
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA foreign_keys = ON")
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def workbook_fingerprint(spec: WorkbookSpec) -> str:
+    """Fingerprint of the workbook content, of arguments it is loaded with
+    and of the household it belongs to"""
+    params = json.dumps(
+        [spec.household, sorted(spec.drop), spec.start, spec.end, spec.sections],
+        ensure_ascii=False,
+        default=str,
+    )
+    return f"{file_fingerprint(spec.filename)}:{params}"
+
+
+@profiled("ledger_sync", rows=len)
+def sync(
+    connection: sqlite3.Connection,
+    specs: list,
+    use_cache: bool = True,
+    workers: int | None = None,
+) -> dict[str, str]:
+    """Store workbooks in the database, only workbooks whose fingerprint
+    changed are parsed and replaced, all changes are written in one transaction
+    ----------
+    Parameters:
+    connection : connection from connect()
+    specs : list of WorkbookSpec or tuples as for prepare_many, later
+            workbooks of a household override months of earlier ones
+    use_cache : reuse parsed data of unchanged files from on-disk cache
+    workers : number of worker processes parsing changed workbooks
+    -------
+    Returns:
+    dictionary filename -> "added", "updated", "unchanged" or "removed"
+    (stored workbooks missing in specs are deleted)
+    """
+    specs = [WorkbookSpec(*spec) for spec in specs]
+    stored = dict(connection.execute("SELECT path, fingerprint FROM workbooks"))
+    paths = [os.path.abspath(spec.filename) for spec in specs]
+    fingerprints = [workbook_fingerprint(spec) for spec in specs]
+    changed = [
+        i for i, path in enumerate(paths) if stored.get(path) != fingerprints[i]
+    ]
+    parsed = _spec_ledgers([specs[i] for i in changed], workers, use_cache)
+    ledgers = dict(zip(changed, parsed))
+
+    status = {spec.filename: "unchanged" for spec in specs}
+    removed = [path for path in stored if path not in paths]
+    status.update(dict.fromkeys(removed, "removed"))
+    with connection:
+        connection.executemany(
+            "DELETE FROM workbooks WHERE path = ?", [(path,) for path in removed]
+        )
+        channels = {
+            (section, grp, channel): id
+            for id, section, grp, channel in connection.execute(
+                "SELECT id, section, grp, channel FROM channels"
+            )
+        }
+        connection.executemany(
+            "UPDATE workbooks SET position = ? WHERE path = ?", enumerate(paths)
+        )
+        for i, ledger in ledgers.items():
+            status[specs[i].filename] = "updated" if paths[i] in stored else "added"
+            connection.execute("DELETE FROM workbooks WHERE path = ?", (paths[i],))
+            household = _household_id(connection, specs[i].household)
+            workbook = connection.execute(
+                "INSERT INTO workbooks (path, household_id, position, fingerprint)"
+                " VALUES (?, ?, ?, ?)",
+                (paths[i], household, i, fingerprints[i]),
+            ).lastrowid
+            _insert_ledger(connection, channels, workbook, household, ledger)
+        connection.execute(UPDATE_ACTIVE)
+    return status
+
+
+def _spec_ledgers(specs: list, workers: int | None, use_cache: bool) -> list:
+    workers = 1 if profiling_enabled() else workers or os.cpu_count() or 1
+    results = [None] * len(specs)
+    errors = {}
+    if workers == 1 or len(specs) < 2:
+        for i, spec in enumerate(specs):
+            try:
+                results[i] = _spec_ledger(spec, use_cache)
+            except Exception as error:
+                errors[spec.filename] = error
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(specs))) as executor:
+            futures = [executor.submit(_spec_ledger, spec, use_cache) for spec in specs]
+            for i, (spec, future) in enumerate(zip(specs, futures)):
+                try:
+                    results[i] = future.result()
+                except Exception as error:
+                    errors[spec.filename] = error
+    if errors:
+        raise WorkbookLoadError(errors)
+    return results
+
+
+def _spec_ledger(spec: WorkbookSpec, use_cache: bool) -> pd.DataFrame:
+    sections = prepare_data(
+        spec.filename,
+        spec.drop,
+        spec.food_consume,
+        use_cache,
+        start=spec.start,
+        end=spec.end,
+        sections=spec.sections,
+    )
+    return to_ledger(*sections[:3], household=spec.household)
+
+
+def _household_id(connection: sqlite3.Connection, name: str) -> int:
+    connection.execute("INSERT OR IGNORE INTO households (name) VALUES (?)", (name,))
+    return connection.execute(
+        "SELECT id FROM households WHERE name = ?", (name,)
+    ).fetchone()[0]
+
+
+def _insert_ledger(
+    connection: sqlite3.Connection,
+    channels: dict,
+    workbook: int,
+    household: int,
+    ledger: pd.DataFrame,
+) -> None:
+    if not len(ledger):
+        return
+    months = ledger["month"].array.asi8 + 1970 * 12
+    sections = ledger["section"].astype(str).to_numpy()
+    sheet_keys, sheet_codes = np.unique(
+        np.rec.fromarrays([sections, months]), return_inverse=True
+    )
+    sheet_ids = np.array(
+        [
+            connection.execute(
+                "INSERT INTO sheets (workbook_id, household_id, section, month)"
+                " VALUES (?, ?, ?, ?)",
+                (workbook, household, str(section), int(month)),
+            ).lastrowid
+            for section, month in sheet_keys
+        ],
+        dtype=np.int64,
+    )
+    labels = pd.MultiIndex.from_arrays(
+        [sections, ledger["group"].astype(str), ledger["channel"].astype(str)]
+    )
+    channel_codes, unique_labels = labels.factorize()
+    channel_ids = np.array(
+        [_channel_id(connection, channels, label) for label in unique_labels],
+        dtype=np.int64,
+    )
+    dates = ledger["date"].to_numpy().astype("datetime64[D]").astype(str)
+    connection.executemany(
+        "INSERT INTO entries (sheet_id, household_id, month, date, channel_id, amount)"
+        " VALUES (?, ?, ?, ?, ?, ?)",
+        zip(
+            sheet_ids[sheet_codes.ravel()].tolist(),
+            [household] * len(ledger),
+            months.tolist(),
+            dates.tolist(),
+            channel_ids[channel_codes].tolist(),
+            ledger["amount"].to_numpy(dtype="float64").tolist(),
+        ),
+    )
+
+
+def _channel_id(connection: sqlite3.Connection, channels: dict, label: tuple) -> int:
+    if label not in channels:
+        channels[label] = connection.execute(
+            "INSERT INTO channels (section, grp, channel) VALUES (?, ?, ?)", label
+        ).lastrowid
+    return channels[label]
+
+
+@profiled("ledger_query", rows=len)
+def query_ledger(
+    connection: sqlite3.Connection,
+    household: str = None,
+    section: str = None,
+    start: str = None,
+    end: str = None,
+    group: str = None,
+    channel: str = None,
+) -> pd.DataFrame:
+    """Rows of the stored ledger selected by indexed range query
+    ----------
+    Parameters:
+    connection : connection from connect()
+    household : household name, None for all households
+    section : "incomes", "savings" or "expenses", None for all sections
+    start : first month (inclusively), None from the beginning
+    end : last month (inclusively), None until the end
+    group : group of channels, e.g. "еда"
+    channel : channel name
+    -------
+    Returns:
+    long-format ledger as to_ledger returns, usable by from_ledger,
+    ledger_sums, monthly_totals, month_end_savings...
+    """
+    conditions, params = _conditions(household, section, start, end, group, channel)
+    query = SELECT_LEDGER
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    rows = connection.execute(query + " ORDER BY entries.rowid", params).fetchall()
+    columns = list(zip(*rows)) if rows else [[] for _ in LEDGER_COLUMNS]
+    months = np.array(columns[1], dtype=np.int64)
+    ledger = pd.DataFrame(
+        {
+            "household": _categorical(columns[0]),
+            "month": pd.PeriodIndex(
+                pd.to_datetime({"year": months // 12, "month": months % 12 + 1, "day": 1}),
+                freq="M",
+            ),
+            "date": pd.to_datetime(pd.Series(columns[2], dtype=object)).to_numpy(
+                "datetime64[us]"
+            ),
+            "section": _categorical(columns[3]),
+            "group": _categorical(columns[4]),
+            "channel": _categorical(columns[5]),
+            "amount": np.array(columns[6], dtype="float64"),
+        }
+    )
+    return ledger[LEDGER_COLUMNS]
+
+
+def _categorical(values) -> pd.Categorical:
+    values = pd.Index(values)
+    return pd.Categorical(values, categories=values.unique())
+
+
+def _conditions(household, section, start, end, group, channel) -> tuple:
+    conditions, params = [], []
+    if household is not None:
+        conditions.append(
+            "entries.household_id = (SELECT id FROM households WHERE name = ?)"
+        )
+        params.append(household)
+    if start is not None:
+        conditions.append("entries.month >= ?")
+        params.append(month_ordinal(start))
+    if end is not None:
+        conditions.append("entries.month <= ?")
+        params.append(month_ordinal(end))
+    if section is not None:
+        conditions.append("sheets.section = ?")
+        params.append(section)
+    if group is not None or channel is not None:
+        selected = []
+        for column, value in (("section", section), ("grp", group), ("channel", channel)):
+            if value is not None:
+                selected.append(f"{column} = ?")
+                params.append(value)
+        conditions.append(
+            "entries.channel_id IN (SELECT id FROM channels WHERE "
+            + " AND ".join(selected)
+            + ")"
+        )
+    return conditions, params
+
+
+def load_sections(
+    connection: sqlite3.Connection,
+    household: str = None,
+    start: str = None,
+    end: str = None,
+) -> tuple:
+    """Rebuild dictionaries in the format of prepare_many from the database
+    ----------
+    Parameters:
+    connection : connection from connect()
+    household : household name, None sums up all households
+    start : first month (inclusively), None from the beginning
+    end : last month (inclusively), None until the end
+    -------
+    Returns:
+    tuple of incomes, savings and expenses dictionaries
+    """
+    ledger = query_ledger(connection, household, start=start, end=end)
+    return tuple(
+        from_ledger(ledger, section, household)
+        for section in (INCOMES, SAVINGS, EXPENSES)
+    )
+
+
+def total(
+    connection: sqlite3.Connection,
+    section: str = EXPENSES,
+    household: str = None,
+    start: str = None,
+    end: str = None,
+    group: str = None,
+    channel: str = None,
+) -> float:
+    """Sum of amounts computed by the database, e.g. spend on "еда" in 2019-2023
+    ----------
+    Parameters:
+    connection : connection from connect()
+    section : "incomes" or "expenses"
+    household : household name, None for all households
+    start : first month (inclusively)
+    end : last month (inclusively)
+    group : group of channels
+    channel : channel name
+    -------
+    Returns:
+    sum of amounts
+    """
+    conditions, params = _conditions(household, section, start, end, group, channel)
+    query = (
+        "SELECT TOTAL(entries.amount) FROM entries"
+        " JOIN sheets ON sheets.id = entries.sheet_id AND sheets.active"
+    )
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    return connection.execute(query, params).fetchone()[0]
@@ -1,8 +1,60 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 import pandas as pd
+from src.data_wrangling.cache import SECTIONS, cache_enabled, cache_entry
+from src.data_wrangling.cache import load_cached, store_cached
+from src.data_wrangling.config import WorkbookSpec
+from src.data_wrangling.dict_handler import month_ordinal, sort_dict_by_time
+from src.data_wrangling.profiling import enabled as profiling_enabled
+from src.data_wrangling.profiling import profiled, stage
+
+# Rows read by pd.read_excel for header, daily records and food consuming row
+HEADER_ROWS_NEEDED = 3
+BODY_ROWS_NEEDED = 34
+FOOD_ROWS_NEEDED = 36
+FOOD_COLUMNS = list(range(9, 15))  # J:O
+# openpyxl.cell.cell.TYPE_ERROR and TYPE_NUMERIC: openpyxl is imported
+# only when a workbook is actually read, not on cache hits
+TYPE_ERROR = "e"
+TYPE_NUMERIC = "n"
+# Text recognized as missing value, the default na_values of pd.read_excel
+NA_VALUES = frozenset(
+    ["", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND"]
+    + ["1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null"]
+)
+
+
+def _count_rows(sections: tuple) -> int:
+    return sum(len(frame) for section in sections for frame in section.values())
+
+
+class WorkbookLoadError(Exception):
+    """Raised when some of the workbooks could not be loaded
+    ----------
+    Attributes:
+    errors : dictionary filename -> exception raised while loading it
+    """
+
+    def __init__(self, errors: dict[str, Exception]):
+        self.errors = errors
+        details = "; ".join(
+            f"{filename}: {type(error).__name__}: {error}"
+            for filename, error in errors.items()
+        )
+        super().__init__(f"Failed to load {len(errors)} workbook(s): {details}")
 
 
+@profiled(rows=_count_rows)
 def prepare_data(
-    filename: str, drop: list[str] = [], food_consume: bool = False
+    filename: str,
+    drop: list[str] = [],
+    food_consume: bool = False,
+    use_cache: bool = True,
+    start: str | None = None,
+    end: str | None = None,
+    sections: list[str] | dict | None = None,
 ) -> pd.DataFrame:
     """Load sheets from excel file
     ----------
@@ -10,82 +62,339 @@ def prepare_data(
     filename : filename of the excel file (str)
     drop : names of sheets to drop
     food_consume : does this file contains food consuming info
+    use_cache : reuse parsed data of unchanged file from on-disk cache,
+                set HFA_NO_CACHE=1 to bypass the cache globally
+    start : first month to load, e.g. "Январь_2024", None loads from the beginning
+    end : last month to load (inclusively), None loads until the end
+    sections : sections to load ("incomes", "savings", "expenses", "food_consuming"),
+               list uses start-end period for all of them, dict maps section
+               to its own (start, end) period; None loads all sections
     -------
     Returns:
     pd_sheets : pandas DataFrames
     """
-    workbook = pd.read_excel(
-        filename,
-        sheet_name=None,
-        nrows=31,
-        skiprows=2,
-        header=None,
-    )
-    workbook_columns = pd.read_excel(
-        filename,
-        sheet_name=None,
-        nrows=2,
-        header=None,
-    )
-    workbook = dict((k.capitalize().replace(" ", "_"), v) for k, v in workbook.items())
-    workbook_columns = dict(
-        (k.capitalize().replace(" ", "_"), v) for k, v in workbook_columns.items()
-    )
-    for sheet in drop:
-        sheet = sheet.capitalize().replace(" ", "_")
-        workbook.pop(sheet)
-        workbook_columns.pop(sheet)
-
-    for key, sheet_column in workbook_columns.items():
-        sheet_column = sheet_column.ffill().ffill(axis="columns")
-        sheet_column = sheet_column.transpose()
-        workbook[key].columns = pd.MultiIndex.from_frame(sheet_column)
-        workbook[key] = workbook[key].dropna(subset=[("дата", "дата")])
-        workbook[key] = workbook[key].set_index(keys=("дата", "дата"))
-
-    workbook_incomes = {key: value["доход"] for (key, value) in workbook.items()}
-    for key in workbook_incomes.keys():
-        workbook_incomes[key] = workbook_incomes[key].drop(
-            "общ. приход", axis="columns"
+    scope = section_scope(start, end, sections)
+    if not (use_cache and cache_enabled()):
+        return _parse_workbook(filename, drop, food_consume, scope)
+    params = dict(drop=sorted(drop), food_consume=food_consume)
+    if scope is not None:
+        params["scope"] = scope
+    with stage("cache_lookup"):
+        entry = cache_entry(filename, **params)
+        loaded = load_cached(entry)
+    if loaded is None:
+        loaded = _parse_workbook(filename, drop, food_consume, scope)
+        with stage("cache_store"):
+            store_cached(entry, loaded)
+    return loaded
+
+
+def section_scope(
+    start: str | None = None,
+    end: str | None = None,
+    sections: list[str] | dict | None = None,
+) -> dict | None:
+    """Periods of requested sections as month ordinals
+    ----------
+    Parameters:
+    start : first month of the period or None
+    end : last month of the period (inclusively) or None
+    sections : list of sections or dictionary section -> (start, end),
+               None means all sections
+    -------
+    Returns:
+    dictionary section -> (first ordinal or None, last ordinal or None),
+    None if all sections are requested for the whole time
+    """
+    if sections is None:
+        sections = list(SECTIONS)
+    if not isinstance(sections, dict):
+        sections = {section: (start, end) for section in sections}
+    unknown = set(sections) - set(SECTIONS)
+    if unknown:
+        raise ValueError(
+            f"Unknown sections {sorted(unknown)}, available: {', '.join(SECTIONS)}"
         )
-        workbook_incomes[key] = workbook_incomes[key].fillna(0)
+    scope = {
+        section: tuple(month_ordinal(month) if month else None for month in period)
+        for section, period in sections.items()
+    }
+    if len(scope) == len(SECTIONS) and all(
+        period == (None, None) for period in scope.values()
+    ):
+        return None
+    return scope
+
 
-    workbook_savings = {
-        key: value.xs("остаток", level=1, axis="columns", drop_level=False)
-        for (key, value) in workbook.items()
+def _sheet_sections(key: str, scope: dict | None) -> set[str]:
+    """Sections of the sheet requested by scope"""
+    if scope is None:
+        return set(SECTIONS)
+    try:
+        ordinal = month_ordinal(key)
+    except ValueError:
+        return set(scope)
+    return {
+        section
+        for section, (first, last) in scope.items()
+        if (first is None or first <= ordinal) and (last is None or ordinal <= last)
     }
-    for key in workbook_savings.keys():
-        workbook_savings[key] = (
-            workbook_savings[key].droplevel(0, axis="columns").squeeze()
-        )
-        workbook_savings[key] = workbook_savings[key].fillna(0)
-
-    workbook_expenses = {}
-    for key in workbook.keys():
-        idx = workbook[key].columns.get_level_values(1).tolist().index("остаток")
-        workbook_expenses[key] = workbook[key].iloc[:, idx + 1 :]
-        workbook_expenses[key] = workbook_expenses[key].fillna(0)
-
-    food_consuming = {}
-    if food_consume:
-        food_consuming = pd.read_excel(
-            filename,
-            sheet_name=None,
-            nrows=1,
-            skiprows=34,
-            usecols="J:O",
-            index_col=0,
-            header=None,
-        )
+
+
+@profiled()
+def prepare_many(
+    specs: list, workers: int | None = None, use_cache: bool = True
+) -> dict[str, tuple[dict, dict, dict, dict]]:
+    """Load many excel files in parallel and merge them by household
+    ----------
+    Parameters:
+    specs : list of WorkbookSpec or tuples (filename, drop, food_consume[, household]),
+            start, end and sections of WorkbookSpec limit what is loaded
+    workers : number of worker processes, all CPUs by default,
+              1 loads files in the current process (always when profiling,
+              stages of worker processes are not collected)
+    use_cache : reuse parsed data of unchanged files from on-disk cache
+    -------
+    Returns:
+    dictionary household -> (incomes, savings, expenses, food_consuming),
+    each dictionary sorted by month; later specs override months of earlier ones
+    """
+    specs = [WorkbookSpec(*spec) for spec in specs]
+    workers = 1 if profiling_enabled() else workers or os.cpu_count() or 1
+    results = [None] * len(specs)
+    errors = {}
+    if workers == 1 or len(specs) < 2:
+        for i, spec in enumerate(specs):
+            try:
+                results[i] = _prepare_spec(spec, use_cache)
+            except Exception as error:
+                errors[spec.filename] = error
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(specs))) as executor:
+            futures = [executor.submit(_prepare_spec, spec, use_cache) for spec in specs]
+            for i, (spec, future) in enumerate(zip(specs, futures)):
+                try:
+                    results[i] = future.result()
+                except Exception as error:
+                    errors[spec.filename] = error
+    if errors:
+        raise WorkbookLoadError(errors)
+
+    households = {}
+    for spec, sections in zip(specs, results):
+        merged = households.setdefault(spec.household, ({}, {}, {}, {}))
+        for merged_section, section in zip(merged, sections):
+            merged_section.update(section)
+    return {
+        household: tuple(sort_dict_by_time(section) for section in sections)
+        for household, sections in households.items()
+    }
+
+
+def _prepare_spec(spec: WorkbookSpec, use_cache: bool) -> tuple:
+    return prepare_data(
+        spec.filename,
+        spec.drop,
+        spec.food_consume,
+        use_cache,
+        start=spec.start,
+        end=spec.end,
+        sections=spec.sections,
+    )
+
+
+@profiled(rows=lambda result: sum(len(body) for body in result[1].values()))
+def read_workbook(
+    filename: str,
+    drop: list[str] = [],
+    food_consume: bool = False,
+    scope: dict | None = None,
+) -> tuple[dict, dict, dict]:
+    """Read header, daily records and food consuming row of every sheet
+    in a single pass over the workbook
+    ----------
+    Parameters:
+    filename : filename of the excel file (str)
+    drop : names of sheets to skip
+    food_consume : does this file contains food consuming info
+    scope : requested sections and periods from section_scope(), sheets out
+            of all periods are skipped, columns after savings are not read
+            for sheets which need neither expenses nor food consuming
+    -------
+    Returns:
+    dictionaries with raw headers, daily records and food consuming rows,
+    the same as pd.read_excel returns for corresponding rows
+    """
+    from openpyxl import load_workbook
+
+    drop = [sheet.capitalize().replace(" ", "_") for sheet in drop]
+    headers, bodies, food = {}, {}, {}
+    book = load_workbook(filename, read_only=True, data_only=True, keep_links=False)
+    try:
+        sheets = {
+            name.capitalize().replace(" ", "_"): name for name in book.sheetnames
+        }
         for sheet in drop:
-            food_consuming.pop(sheet)
+            if sheet not in sheets:
+                raise KeyError(sheet)
+        for key, name in sheets.items():
+            if key in drop:
+                continue
+            needed = _sheet_sections(key, scope)
+            if not needed:
+                continue
+            read_food = food_consume and "food_consuming" in needed
+            with stage("sheet_rows") as record:
+                rows = _sheet_rows(
+                    book[name],
+                    FOOD_ROWS_NEEDED if read_food else BODY_ROWS_NEEDED,
+                    full_width=read_food or "expenses" in needed,
+                )
+                record.add_rows(len(rows))
+            with stage("rows_to_frame"):
+                headers[key] = _rows_to_frame(rows, HEADER_ROWS_NEEDED, nrows=2)
+                bodies[key] = _rows_to_frame(
+                    rows, BODY_ROWS_NEEDED, nrows=31, skiprows=2
+                )
+                if read_food:
+                    food[key] = _rows_to_frame(
+                        rows,
+                        FOOD_ROWS_NEEDED,
+                        nrows=1,
+                        skiprows=34,
+                        usecols=FOOD_COLUMNS,
+                        index_col=0,
+                    )
+    finally:
+        book.close()
+    return headers, bodies, food
 
-        for key in food_consuming.keys():
-            food_consuming[key] = food_consuming[key].squeeze("columns")
-            food_consuming[key] = food_consuming[key].transpose()
-            food_consuming[key].index = (
-                workbook_expenses[key]["еда"].columns.get_level_values(0).tolist()[:5]
+
+def _convert_cell(cell):
+    """Convert openpyxl cell value the same way pandas does"""
+    if cell.value is None:
+        return ""
+    elif cell.data_type == TYPE_ERROR:
+        return np.nan
+    elif cell.data_type == TYPE_NUMERIC:
+        value = int(cell.value)
+        if value == cell.value:
+            return value
+        return float(cell.value)
+    return cell.value
+
+
+def _sheet_rows(sheet, rows_needed: int, full_width: bool = True) -> list[list]:
+    sheet.reset_dimensions()
+    rows = []
+    max_col = None
+    for row in sheet.iter_rows(max_row=rows_needed):
+        if max_col is not None:
+            row = row[:max_col]
+        converted_row = [_convert_cell(cell) for cell in row]
+        while converted_row and converted_row[-1] == "":
+            converted_row.pop()
+        rows.append(converted_row)
+        if len(rows) == 2 and not full_width and "остаток" in converted_row:
+            max_col = converted_row.index("остаток") + 1
+            rows = [r[:max_col] for r in rows]
+    return rows
+
+
+def _rows_to_frame(
+    rows: list[list],
+    rows_needed: int,
+    nrows: int,
+    skiprows: int = 0,
+    usecols: list[int] = None,
+    index_col: int = None,
+) -> pd.DataFrame:
+    """Frame of converted rows with the columns and dtypes pd.read_excel
+    gives for the same header=None, nrows, skiprows, usecols and index_col:
+    cells of NA_VALUES are missing, columns of numeric text are numbers"""
+    data = rows[:rows_needed]
+    while data and not data[-1]:
+        data = data[:-1]
+    max_width = max((len(row) for row in data), default=0)
+    data = [
+        [np.nan if cell.__class__ is str and cell in NA_VALUES else cell for cell in row]
+        + [np.nan] * (max_width - len(row))
+        for row in data[skiprows : skiprows + nrows]
+    ]
+    if not data:
+        return pd.DataFrame()
+    frame = pd.DataFrame(data)
+    if usecols is not None:
+        frame = frame[usecols]
+    for column in frame.columns[frame.dtypes.map(pd.api.types.is_string_dtype)]:
+        try:
+            frame[column] = pd.to_numeric(frame[column])
+        except (TypeError, ValueError):
+            pass
+    if index_col is not None:
+        frame = frame.set_index(frame.columns[index_col])
+    return frame
+
+
+def _parse_workbook(
+    filename: str, drop: list[str], food_consume: bool, scope: dict | None = None
+) -> tuple:
+    workbook_columns, workbook, food_consuming = read_workbook(
+        filename, drop, food_consume, scope
+    )
+
+    with stage("header_multiindex", rows=len(workbook_columns)):
+        for key, sheet_column in workbook_columns.items():
+            sheet_column = sheet_column.ffill().ffill(axis="columns")
+            sheet_column = sheet_column.transpose()
+            workbook[key].columns = pd.MultiIndex.from_frame(sheet_column)
+            workbook[key] = workbook[key].dropna(subset=[("дата", "дата")])
+            workbook[key] = workbook[key].set_index(keys=("дата", "дата"))
+    with stage("split_sections", rows=len(workbook)):
+        needed = {key: _sheet_sections(key, scope) for key in workbook.keys()}
+
+        workbook_incomes = {
+            key: value["доход"]
+            for (key, value) in workbook.items()
+            if "incomes" in needed[key]
+        }
+        for key in workbook_incomes.keys():
+            workbook_incomes[key] = workbook_incomes[key].drop(
+                "общ. приход", axis="columns"
             )
-            food_consuming[key] = food_consuming[key].fillna(0)
+            workbook_incomes[key] = workbook_incomes[key].fillna(0)
+
+        workbook_savings = {
+            key: value.xs("остаток", level=1, axis="columns", drop_level=False)
+            for (key, value) in workbook.items()
+            if "savings" in needed[key]
+        }
+        for key in workbook_savings.keys():
+            workbook_savings[key] = (
+                workbook_savings[key].droplevel(0, axis="columns").squeeze()
+            )
+            workbook_savings[key] = workbook_savings[key].fillna(0)
+
+        workbook_expenses = {}
+        for key in workbook.keys():
+            if "expenses" not in needed[key] and key not in food_consuming:
+                continue
+            idx = workbook[key].columns.get_level_values(1).tolist().index("остаток")
+            workbook_expenses[key] = workbook[key].iloc[:, idx + 1 :]
+            workbook_expenses[key] = workbook_expenses[key].fillna(0)
+
+        if food_consume:
+            for key in food_consuming.keys():
+                food_consuming[key] = food_consuming[key].squeeze("columns")
+                food_consuming[key] = food_consuming[key].transpose()
+                food_consuming[key].index = (
+                    workbook_expenses[key]["еда"].columns.get_level_values(0).tolist()[:5]
+                )
+                food_consuming[key] = food_consuming[key].fillna(0)
+        workbook_expenses = {
+            key: value
+            for (key, value) in workbook_expenses.items()
+            if "expenses" in needed[key]
+        }
 
     return workbook_incomes, workbook_savings, workbook_expenses, food_consuming
@@ -1,15 +1,28 @@
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
-from src.data_wrangling.dict_handler import sort_dict_by_time
+from src.data_wrangling.cube import CategoryCube
+from src.data_wrangling.dict_handler import month_ordinal, sort_dict_by_time
+from src.data_wrangling.forecaster import SimulationResult
+from src.data_wrangling.profiling import profiled
 
 
-def plot_margin(inc_dict: dict, savings_dict: dict, expenses_dict: dict) -> None:
+@profiled(rows=lambda fig: len(fig.data))
+def plot_margin(
+    inc_dict: dict,
+    savings_dict: dict,
+    expenses_dict: dict,
+    bands: SimulationResult = None,
+    show: bool = True,
+) -> go.Figure:
     """Plot margin bar chart
     ----------
     Parameters:
     inc_dict : dictionary with monthly incomes
     savings_dict : dictionary with monthly savings
     expenses_dict : dictionary with monthly expenses
+    bands : result of Monte Carlo simulation to draw savings percentile bands
+    show : open the picture in browser
     -------
     Returns:
     picture from plotly
@@ -60,59 +73,130 @@ def plot_margin(inc_dict: dict, savings_dict: dict, expenses_dict: dict) -> None
             name="Накопления",
         )
     )
+    if bands is not None:
+        add_savings_bands(fig, bands)
     fig.update_layout(barmode="group", yaxis=dict(title="RUB (тысячи)"))
-    fig.show()
+    if show:
+        fig.show()
+    return fig
 
 
-def plot_alluvial(inp_dict: dict) -> None:
+def add_savings_bands(fig: go.Figure, bands: SimulationResult) -> None:
+    """Add savings percentile bands of Monte Carlo simulation to the figure
+    ----------
+    Parameters:
+    fig : plotly figure with months on x axis
+    bands : result of Monte Carlo simulation
+    """
+    savings = bands.savings
+    months = savings.index.tolist()
+    low, high = savings.columns[0], savings.columns[-1]
+    fig.add_trace(
+        go.Scatter(
+            x=months,
+            y=savings[low],
+            mode="lines",
+            line=dict(width=0, color="#38761d"),
+            showlegend=False,
+            name=f"Накопления {low}",
+        )
+    )
+    fig.add_trace(
+        go.Scatter(
+            x=months,
+            y=savings[high],
+            mode="lines",
+            line=dict(width=0, color="#38761d"),
+            fill="tonexty",
+            fillcolor="rgba(56, 118, 29, 0.2)",
+            name=f"Накопления {low}-{high}",
+        )
+    )
+    median = savings.columns[len(savings.columns) // 2]
+    fig.add_trace(
+        go.Scatter(
+            x=months,
+            y=savings[median],
+            mode="lines+markers",
+            line=dict(dash="dash", color="#38761d"),
+            customdata=bands.shortfall,
+            hovertemplate="%{y}<br>P(накопления < 0) = %{customdata:.1%}",
+            name=f"Накопления {median}",
+        )
+    )
+
+
+@profiled(rows=lambda data: len(data["value"]))
+def sankey_data(inp_dict: dict) -> dict:
+    """Build nodes and links of alluvial chart from groups to monthes
+    ----------
+    Parameters:
+    inp_dict : dictionary with data, such as monthly expenses sums per group,
+               or CategoryCube
+    -------
+    Returns:
+    dictionary with node labels and link sources, targets and values
+    """
+    if isinstance(inp_dict, CategoryCube):
+        inp_dict = inp_dict.sums_dict()
+    keys = list(inp_dict.keys())
+    if not keys:
+        return dict(labels=[], source=[], target=[], value=[])
+    stacked = pd.concat([inp_dict[key] for key in keys], keys=range(len(keys)))
+    values = pd.to_numeric(stacked, errors="coerce").fillna(0).to_numpy()
+    positive = values > 0
+
+    index = stacked.index.set_names([None] * stacked.index.nlevels)
+    group_labels = index.droplevel(0).to_flat_index()
+    group_codes, group_uniques = pd.factorize(group_labels)
+    group_uniques = list(group_uniques)
+    groups = sorted(group_uniques)
+    group_rank = {group: i for i, group in enumerate(groups)}
+    group_ids = np.array([group_rank[group] for group in group_uniques])
+
+    ordinals = np.array([month_ordinal(key) for key in keys])
+    month_order = np.argsort(ordinals, kind="stable")
+    month_ids = np.empty(len(keys), dtype=np.int64)
+    month_ids[month_order] = np.arange(len(keys)) + len(groups)
+    monthes = list(sort_dict_by_time(dict.fromkeys(keys)).keys())
+
+    month_codes = index.codes[0] if len(stacked) else np.array([], int)
+    return dict(
+        labels=groups + monthes,
+        source=group_ids[group_codes[positive]].tolist(),
+        target=month_ids[np.asarray(month_codes)[positive]].tolist(),
+        value=values[positive].tolist(),
+    )
+
+
+@profiled()
+def plot_alluvial(inp_dict: dict, show: bool = True) -> go.Figure:
     """Plot alluvial chart from yearly spends or incomes groups to monthes
     ----------
     Parameters:
-    inp_dict : dictionary with data, such as monthly expenses
+    inp_dict : dictionary with data, such as monthly expenses sums,
+               or CategoryCube
+    show : open the picture in browser
     -------
     Returns:
     picture from plotly
     """
-    groups = [group.index.tolist() for group in inp_dict.values()]
-    groups = [group for sublist in groups for group in sublist]
-    groups = list(set(groups))
-    groups = sorted(groups)
-    columns = ["groups", "time", "values"]
-    df = pd.DataFrame(columns=columns)
-    for key, values in inp_dict.items():
-        for group, value in values.items():
-            row = pd.DataFrame(data=[[group, key, value]], columns=columns)
-            df = pd.concat([df, row])
-    df = df.fillna(0).infer_objects(copy=False)
-
-    inp_dict = sort_dict_by_time(inp_dict)
-    monthes = list(inp_dict.keys())
-    labels = groups + monthes
+    data = sankey_data(inp_dict)
     color = "papayawhip"
     fig = go.Figure(
         data=[
             go.Sankey(
-                node=dict(label=labels, color=color),
+                node=dict(label=data["labels"], color=color),
                 link=dict(
-                    source=[
-                        labels.index(group)
-                        for idx, group in enumerate(df["groups"])
-                        if df["values"].iloc[idx] > 0
-                    ],
-                    target=[
-                        labels.index(time)
-                        for idx, time in enumerate(df["time"])
-                        if df["values"].iloc[idx] > 0
-                    ],
-                    value=[
-                        value
-                        for idx, value in enumerate(df["values"])
-                        if df["values"].iloc[idx] > 0
-                    ],
+                    source=data["source"],
+                    target=data["target"],
+                    value=data["value"],
                     color=color,
                 ),
             )
         ]
     )
     fig.update_layout()
-    fig.show()
+    if show:
+        fig.show()
+    return fig
@@ -0,0 +1,272 @@
+# Stage-level timing, memory and cProfile instrumentation
+#
+# Enabled by HFA_PROFILE=1 (HFA_PROFILE=memory also tracks peak memory)
+# or by enable(). When disabled every hook costs a single flag check.
+
+import atexit
+import cProfile
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable
+
+PROFILE_ENV = "HFA_PROFILE"
+PROFILE_STAGE_ENV = "HFA_PROFILE_STAGE"
+PROFILE_TRACE_ENV = "HFA_PROFILE_TRACE"
+
+
+class _State:
+    enabled = False
+    memory = False
+    cprofile_stage = None
+    started = time.perf_counter()
+    stats = {}
+    events = []
+    stack = []
+    profilers = {}
+
+
+class StageRecord:
+    """Mutable record of the running stage, rows are added by the stage body"""
+
+    __slots__ = ("name", "rows", "start", "depth", "memory_start", "memory_peak")
+
+    def __init__(self, name: str, rows: int = 0):
+        self.name = name
+        self.rows = rows
+        self.start = 0.0
+        self.depth = 0
+        self.memory_start = 0
+        self.memory_peak = 0
+
+    def add_rows(self, rows: int) -> None:
+        self.rows += rows
+
+
+class _NullRecord:
+    __slots__ = ()
+
+    def add_rows(self, rows: int) -> None:
+        pass
+
+
+_NULL_RECORD = _NullRecord()
+
+
+def enabled() -> bool:
+    """Is profiling enabled"""
+    return _State.enabled
+
+
+def enable(memory: bool = False, cprofile_stage: str | None = None) -> None:
+    """Start collecting stage statistics
+    ----------
+    Parameters:
+    memory : track peak memory of stages with tracemalloc (slows the run down)
+    cprofile_stage : name of the stage to capture with cProfile
+    """
+    _State.enabled = True
+    _State.memory = memory
+    _State.cprofile_stage = cprofile_stage
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable() -> None:
+    """Stop collecting stage statistics, collected data is kept"""
+    _State.enabled = False
+    if _State.memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _State.memory = False
+
+
+def reset() -> None:
+    """Drop collected statistics"""
+    _State.started = time.perf_counter()
+    _State.stats = {}
+    _State.events = []
+    _State.stack = []
+    _State.profilers = {}
+
+
+def _enter(record: StageRecord) -> None:
+    if _State.memory:
+        current, peak = tracemalloc.get_traced_memory()
+        if _State.stack:
+            parent = _State.stack[-1]
+            parent.memory_peak = max(parent.memory_peak, peak)
+        record.memory_start = current
+        tracemalloc.reset_peak()
+    record.depth = len(_State.stack)
+    _State.stack.append(record)
+    if record.name == _State.cprofile_stage:
+        profiler = _State.profilers.setdefault(record.name, cProfile.Profile())
+        profiler.enable()
+    record.start = time.perf_counter()
+
+
+def _exit(record: StageRecord) -> None:
+    duration = time.perf_counter() - record.start
+    if record.name in _State.profilers:
+        _State.profilers[record.name].disable()
+    _State.stack.pop()
+    peak = 0
+    if _State.memory:
+        peak = max(tracemalloc.get_traced_memory()[1], record.memory_peak)
+        if _State.stack:
+            parent = _State.stack[-1]
+            parent.memory_peak = max(parent.memory_peak, peak)
+        peak -= record.memory_start
+    stats = _State.stats.setdefault(
+        record.name, {"calls": 0, "total": 0.0, "max": 0.0, "rows": 0, "peak_bytes": 0}
+    )
+    stats["calls"] += 1
+    stats["total"] += duration
+    stats["max"] = max(stats["max"], duration)
+    stats["rows"] += record.rows
+    stats["peak_bytes"] = max(stats["peak_bytes"], peak)
+    _State.events.append(
+        {
+            "name": record.name,
+            "start": record.start - _State.started,
+            "duration": duration,
+            "depth": record.depth,
+            "rows": record.rows,
+            "peak_bytes": peak,
+        }
+    )
+
+
+@contextmanager
+def stage(name: str, rows: int = 0):
+    """Measure the block as a stage
+    ----------
+    Parameters:
+    name : name of the stage
+    rows : number of rows processed, more can be added with record.add_rows()
+    -------
+    Returns:
+    context manager yielding the stage record
+    """
+    if not _State.enabled:
+        yield _NULL_RECORD
+        return
+    record = StageRecord(name, rows)
+    _enter(record)
+    try:
+        yield record
+    finally:
+        _exit(record)
+
+
+def profiled(name: str | None = None, rows: Callable | None = None) -> Callable:
+    """Decorator measuring every call of the function as a stage
+    ----------
+    Parameters:
+    name : name of the stage, function name by default
+    rows : function of the result returning number of processed rows
+    -------
+    Returns:
+    decorator
+    """
+
+    def decorator(func: Callable) -> Callable:
+        stage_name = name or func.__name__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _State.enabled:
+                return func(*args, **kwargs)
+            record = StageRecord(stage_name)
+            _enter(record)
+            try:
+                result = func(*args, **kwargs)
+                if rows is not None:
+                    record.rows += rows(result)
+                return result
+            finally:
+                _exit(record)
+
+        return wrapper
+
+    return decorator
+
+
+def stats() -> dict:
+    """Collected statistics
+    ----------
+    Returns:
+    dictionary stage -> calls, total and max wall time in seconds,
+    rows and peak memory in bytes
+    """
+    return {name: dict(values) for name, values in _State.stats.items()}
+
+
+def summary() -> str:
+    """Collected statistics as a text table sorted by total time"""
+    lines = [
+        f"{'stage':<28} {'calls':>7} {'total ms':>11} {'max ms':>10} "
+        f"{'rows':>10} {'peak MiB':>9}"
+    ]
+    ordered = sorted(_State.stats.items(), key=lambda item: -item[1]["total"])
+    for name, values in ordered:
+        lines.append(
+            f"{name:<28} {values['calls']:>7} {values['total'] * 1000:>11.2f} "
+            f"{values['max'] * 1000:>10.2f} {values['rows']:>10} "
+            f"{values['peak_bytes'] / 2**20:>9.2f}"
+        )
+    return "\n".join(lines)
+
+
+def write_trace(path: str) -> None:
+    """Write collected stages as JSON: statistics and events in Chrome trace
+    format (chrome://tracing, Perfetto); cProfile data of the captured stage
+    is written next to it as <path>.<stage>.prof
+    ----------
+    Parameters:
+    path : output JSON file
+    """
+    pid = os.getpid()
+    trace = {
+        "stats": stats(),
+        "traceEvents": [
+            {
+                "name": event["name"],
+                "ph": "X",
+                "ts": event["start"] * 1e6,
+                "dur": event["duration"] * 1e6,
+                "pid": pid,
+                "tid": 0,
+                "args": {
+                    "rows": event["rows"],
+                    "peak_bytes": event["peak_bytes"],
+                    "depth": event["depth"],
+                },
+            }
+            for event in _State.events
+        ],
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(trace, f, ensure_ascii=False)
+    for name, profiler in _State.profilers.items():
+        profiler.dump_stats(f"{path}.{name}.prof")
+
+
+def _report_at_exit() -> None:
+    if not _State.stats:
+        return
+    print(summary(), file=sys.stderr)
+    if os.environ.get(PROFILE_TRACE_ENV):
+        write_trace(os.environ[PROFILE_TRACE_ENV])
+
+
+if os.environ.get(PROFILE_ENV, "") not in ("", "0"):
+    enable(
+        memory=os.environ[PROFILE_ENV] == "memory",
+        cprofile_stage=os.environ.get(PROFILE_STAGE_ENV) or None,
+    )
+    atexit.register(_report_at_exit)
@@ -0,0 +1,70 @@
+# Headless rendering of figures into static HTML files
+
+import html
+from pathlib import Path
+
+import plotly.graph_objects as go
+from plotly.offline import get_plotlyjs
+from src.data_wrangling.profiling import profiled
+
+PLOTLY_JS = "plotly.min.js"
+
+
+@profiled()
+def write_report(
+    figures: dict[str, go.Figure], path: str, title: str = "Home finance"
+) -> Path:
+    """Write all figures into single self-contained HTML file
+    with only one embedded copy of plotly.js
+    ----------
+    Parameters:
+    figures : dictionary chart title -> plotly figure
+    path : output HTML file
+    title : title of the report
+    -------
+    Returns:
+    path to the written file
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    parts = [
+        "<!DOCTYPE html>",
+        '<html><head><meta charset="utf-8">',
+        f"<title>{html.escape(title)}</title>",
+        f"<script type=\"text/javascript\">{get_plotlyjs()}</script>",
+        "</head><body>",
+        f"<h1>{html.escape(title)}</h1>",
+    ]
+    for name, fig in figures.items():
+        parts.append(f"<h2>{html.escape(name)}</h2>")
+        parts.append(fig.to_html(full_html=False, include_plotlyjs=False))
+    parts.append("</body></html>")
+    path.write_text("\n".join(parts), encoding="utf-8")
+    return path
+
+
+@profiled(rows=len)
+def write_charts(figures: dict[str, go.Figure], directory: str) -> list[Path]:
+    """Write every figure into its own HTML file, all files share one copy
+    of plotly.js written next to them, a copy of another plotly version
+    is replaced
+    ----------
+    Parameters:
+    figures : dictionary file name (without extension) -> plotly figure
+    directory : output directory
+    -------
+    Returns:
+    paths to the written chart files
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    plotly_js = directory / PLOTLY_JS
+    source = get_plotlyjs()
+    if not plotly_js.exists() or plotly_js.read_text(encoding="utf-8") != source:
+        plotly_js.write_text(source, encoding="utf-8")
+    paths = []
+    for name, fig in figures.items():
+        chart = directory / f"{name}.html"
+        fig.write_html(chart, include_plotlyjs="directory", full_html=True)
+        paths.append(chart)
+    return paths
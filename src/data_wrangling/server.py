@@ -0,0 +1,255 @@
+# Local HTTP dashboard serving chart JSON from a single-flight LRU cache
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+from urllib.parse import parse_qs, urlsplit
+
+from src.data_wrangling.cache import file_fingerprint
+
+CHARTS = ("margin", "alluvial")
+PARAMETERS = ("household", "start", "end", "method")
+INDEX_HTML = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Home finance</title>
+<script src="/plotly.min.js"></script></head>
+<body>
+<form id="query">
+<select name="chart"></select> <select name="household"></select>
+<select name="method"></select>
+<input name="start" placeholder="Январь_2026"> <input name="end" placeholder="Декабрь_2026">
+<button>Show</button> <span id="status"></span>
+</form>
+<div id="chart" style="height:85vh"></div>
+<script>
+const form = document.getElementById("query");
+const fill = (name, values) => form[name].innerHTML =
+  values.map(v => `<option>${v}</option>`).join("");
+fetch("/api/options").then(r => r.json()).then(options => {
+  fill("chart", options.charts);
+  fill("household", options.households);
+  fill("method", options.methods);
+  form.method.value = options.method;
+  form.start.value = options.start || "";
+  form.end.value = options.end || "";
+});
+form.onsubmit = event => {
+  event.preventDefault();
+  const params = new URLSearchParams();
+  for (const name of ["household", "start", "end", "method"]) {
+    if (form[name].value) params.set(name, form[name].value);
+  }
+  document.getElementById("status").textContent = "...";
+  fetch(`/api/chart/${form.chart.value}?${params}`).then(r => r.json()).then(fig => {
+    document.getElementById("status").textContent = fig.error || "";
+    if (!fig.error) Plotly.react("chart", fig.data, fig.layout);
+  });
+};
+</script>
+</body></html>
+"""
+
+
+class InvalidQuery(ValueError):
+    """Invalid parameter of a query: unknown chart, household, method or month"""
+
+
+class SingleFlightCache:
+    """Thread-safe LRU cache, concurrent requests of a missing key share
+    one computation
+    ----------
+    Attributes:
+    maxsize : number of kept results
+    hits : results returned from the cache
+    misses : computed results
+    shared : requests which waited for computation started by another request
+    """
+
+    def __init__(self, maxsize: int = 64):
+        self.maxsize = maxsize
+        self.hits = self.misses = self.shared = 0
+        self._results = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, compute: Callable):
+        """Cached result of the key or result of compute(), errors are not cached
+        ----------
+        Parameters:
+        key : hashable key of the result
+        compute : function without arguments computing the result
+        -------
+        Returns:
+        result
+        """
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return self._results[key]
+            future = self._pending.get(key)
+            owner = future is None
+            if owner:
+                future = self._pending[key] = Future()
+                self.misses += 1
+            else:
+                self.shared += 1
+        if not owner:
+            return future.result()
+        try:
+            result = compute()
+        except BaseException as error:
+            with self._lock:
+                del self._pending[key]
+            future.set_exception(error)
+            raise
+        with self._lock:
+            del self._pending[key]
+            self._results[key] = result
+            while len(self._results) > self.maxsize:
+                self._results.popitem(last=False)
+        future.set_result(result)
+        return result
+
+    def stats(self) -> dict:
+        """Numbers of hits, misses, shared computations and kept results"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "shared": self.shared,
+                "size": len(self._results),
+            }
+
+
+class SourceFingerprints:
+    """Fingerprints of source files, content of a file is hashed again
+    only when its size or modification time changes
+    ----------
+    Attributes:
+    filenames : watched files
+    """
+
+    def __init__(self, filenames: list[str]):
+        self.filenames = list(dict.fromkeys(filenames))
+        self._known = {}
+        self._lock = threading.Lock()
+
+    def current(self) -> tuple:
+        """Fingerprints of all files in the order of filenames"""
+        with self._lock:
+            fingerprints = []
+            for filename in self.filenames:
+                stat = os.stat(filename)
+                stat = (stat.st_size, stat.st_mtime_ns)
+                known = self._known.get(filename)
+                if known is None or known[0] != stat:
+                    known = self._known[filename] = (stat, file_fingerprint(filename))
+                fingerprints.append(known[1])
+            return tuple(fingerprints)
+
+
+class DashboardServer(ThreadingHTTPServer):
+    """HTTP server of the dashboard
+    ----------
+    Attributes:
+    chart : function (chart name, parameters, fingerprints) -> figure JSON,
+            raises InvalidQuery for invalid parameters
+    fingerprints : SourceFingerprints of the source workbooks
+    options : choices shown by the page: households, methods, start, end...
+    cache : SingleFlightCache of figure JSON keyed by chart, parameters
+            and fingerprints of the sources
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: tuple,
+        chart: Callable,
+        fingerprints: SourceFingerprints,
+        options: dict,
+        cache_size: int = 64,
+    ):
+        super().__init__(address, DashboardHandler)
+        self.chart = chart
+        self.fingerprints = fingerprints
+        self.options = {"charts": list(CHARTS), **options}
+        self.cache = SingleFlightCache(cache_size)
+        self._plotly_js = None
+
+    def chart_json(self, name: str, params: dict) -> str:
+        """Figure JSON of the chart from the cache or computed
+        ----------
+        Parameters:
+        name : chart name, see CHARTS
+        params : query parameters, see PARAMETERS
+        -------
+        Returns:
+        figure JSON
+        """
+        if name not in CHARTS:
+            raise InvalidQuery(
+                f"Unknown chart {name!r}, available: {', '.join(CHARTS)}"
+            )
+        params = {key: value for key, value in params.items() if key in PARAMETERS}
+        fingerprints = self.fingerprints.current()
+        key = (name, tuple(sorted(params.items())), fingerprints)
+        return self.cache.get(key, lambda: self.chart(name, params, fingerprints))
+
+    def plotly_js(self) -> bytes:
+        if self._plotly_js is None:
+            from plotly.offline import get_plotlyjs
+
+            self._plotly_js = get_plotlyjs().encode()
+        return self._plotly_js
+
+
+class DashboardHandler(BaseHTTPRequestHandler):
+    """Routes: / (page), /plotly.min.js, /api/options, /api/stats
+    and /api/chart/<chart>?household=&start=&end=&method="""
+
+    server: DashboardServer
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/":
+            self._send(INDEX_HTML.encode(), "text/html; charset=utf-8")
+        elif url.path == "/plotly.min.js":
+            self._send(self.server.plotly_js(), "text/javascript; charset=utf-8")
+        elif url.path == "/api/options":
+            self._send_json(self.server.options)
+        elif url.path == "/api/stats":
+            self._send_json(self.server.cache.stats())
+        elif url.path.startswith("/api/chart/"):
+            name = url.path[len("/api/chart/") :]
+            params = {key: values[0] for key, values in parse_qs(url.query).items()}
+            try:
+                body = self.server.chart_json(name, params)
+            except InvalidQuery as error:
+                self._send_json({"error": str(error)}, HTTPStatus.BAD_REQUEST)
+                return
+            except Exception as error:
+                message = f"{type(error).__name__}: {error}"
+                self._send_json({"error": message}, HTTPStatus.INTERNAL_SERVER_ERROR)
+                return
+            self._send(body.encode(), "application/json; charset=utf-8")
+        else:
+            self._send_json({"error": "Not found"}, HTTPStatus.NOT_FOUND)
+
+    def _send_json(self, data, status: HTTPStatus = HTTPStatus.OK) -> None:
+        body = json.dumps(data, ensure_ascii=False).encode()
+        self._send(body, "application/json; charset=utf-8", status)
+
+    def _send(
+        self, body: bytes, content_type: str, status: HTTPStatus = HTTPStatus.OK
+    ) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
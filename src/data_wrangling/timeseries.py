@@ -0,0 +1,147 @@
+# Daily time series across all sheets with resampling and rolling windows
+
+import pandas as pd
+from src.data_wrangling.profiling import profiled
+
+FREQUENCIES = {"day": "D", "week": "W", "month": "M", "quarter": "Q", "year": "Y"}
+AGGREGATIONS = ("sum", "mean", "min", "max", "last", "first")
+DATE = "date"
+
+
+@profiled(rows=len)
+def to_daily(source_dict: dict, fill_value: float | None = 0) -> pd.DataFrame:
+    """Concatenate monthly frames into one series with DatetimeIndex
+    ----------
+    Parameters:
+    source_dict : dictionary with incomes, expenses or savings data
+    fill_value : value for channels absent in some months, None keeps NaN
+    -------
+    Returns:
+    DataFrame (Series for savings) indexed by date in ascending order,
+    later months override duplicated dates
+    """
+    frames = [frame for frame in source_dict.values() if len(frame)]
+    if not frames:
+        return pd.DataFrame(index=pd.DatetimeIndex([], name=DATE))
+    daily = pd.concat(frames)
+    daily.index = pd.DatetimeIndex(pd.to_datetime(daily.index), name=DATE)
+    daily = daily[~daily.index.duplicated(keep="last")].sort_index(kind="stable")
+    if fill_value is not None:
+        daily = daily.fillna(fill_value)
+    return daily
+
+
+def to_daily_sections(sections: tuple) -> tuple:
+    """Daily series of every section returned by prepare_data or prepare_many
+    ----------
+    Parameters:
+    sections : (incomes, savings, expenses[, food_consuming])
+    -------
+    Returns:
+    tuple of daily incomes, savings and expenses
+    """
+    return tuple(to_daily(section) for section in sections[:3])
+
+
+def _period_freq(freq: str) -> str:
+    if freq not in FREQUENCIES:
+        raise ValueError(
+            f"Unknown frequency {freq!r}, available: {', '.join(FREQUENCIES)}"
+        )
+    return FREQUENCIES[freq]
+
+
+@profiled(rows=len)
+def resample(daily: pd.DataFrame, freq: str = "month", how: str = "sum"):
+    """Aggregate daily series by calendar periods
+    ----------
+    Parameters:
+    daily : result of to_daily
+    freq : "day", "week", "month", "quarter" or "year"
+    how : "sum" for flows (incomes, expenses), "last" or "min" for savings,
+          see AGGREGATIONS
+    -------
+    Returns:
+    DataFrame (Series) indexed by PeriodIndex
+    """
+    if how not in AGGREGATIONS:
+        raise ValueError(
+            f"Unknown aggregation {how!r}, available: {', '.join(AGGREGATIONS)}"
+        )
+    periods = daily.index.to_period(_period_freq(freq))
+    return daily.groupby(periods).agg(how)
+
+
+@profiled(rows=len)
+def rolling(daily: pd.DataFrame, window: str | int = "30D", how: str = "sum"):
+    """Rolling window over daily series
+    ----------
+    Parameters:
+    daily : result of to_daily
+    window : window length, number of records or offset like "7D", "30D"
+    how : aggregation, see AGGREGATIONS except "first" and "last"
+    -------
+    Returns:
+    DataFrame (Series) with the same index
+    """
+    if how not in AGGREGATIONS[:4]:
+        raise ValueError(
+            f"Unknown aggregation {how!r}, available: {', '.join(AGGREGATIONS[:4])}"
+        )
+    return getattr(daily.rolling(window), how)()
+
+
+def totals(daily: pd.DataFrame) -> pd.Series:
+    """Sum of all channels of every day
+    ----------
+    Parameters:
+    daily : daily incomes or expenses from to_daily
+    -------
+    Returns:
+    Series indexed by date
+    """
+    if isinstance(daily, pd.Series):
+        return daily
+    return daily.sum(axis="columns")
+
+
+@profiled(rows=len)
+def low_points(savings: pd.Series, freq: str = "month") -> pd.DataFrame:
+    """The lowest savings of every period, e.g. the low point before payday
+    ----------
+    Parameters:
+    savings : daily savings from to_daily
+    freq : "week", "month", "quarter" or "year"
+    -------
+    Returns:
+    DataFrame indexed by period with columns date, low, day (day of month)
+    and drawdown (period maximum minus the low)
+    """
+    grouped = savings.groupby(savings.index.to_period(_period_freq(freq)))
+    dates = pd.DatetimeIndex(grouped.idxmin())
+    result = pd.DataFrame(
+        {
+            "date": dates,
+            "low": grouped.min(),
+            "day": dates.day,
+        }
+    )
+    result["drawdown"] = grouped.max() - result["low"]
+    return result
+
+
+@profiled(rows=len)
+def paydays(incomes: pd.DataFrame, freq: str = "month") -> pd.DataFrame:
+    """Days with the largest incomes of every period
+    ----------
+    Parameters:
+    incomes : daily incomes from to_daily
+    freq : "week", "month", "quarter" or "year"
+    -------
+    Returns:
+    DataFrame indexed by period with columns date, amount and day (day of month)
+    """
+    daily = totals(incomes)
+    grouped = daily.groupby(daily.index.to_period(_period_freq(freq)))
+    dates = pd.DatetimeIndex(grouped.idxmax())
+    return pd.DataFrame({"date": dates, "amount": grouped.max(), "day": dates.day})
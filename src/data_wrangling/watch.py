@@ -0,0 +1,135 @@
+# Change detection of workbooks per sheet and incremental re-parse of changed sheets
+
+import os
+import posixpath
+import zipfile
+from xml.etree import ElementTree
+
+from src.data_wrangling.dict_handler import month_ordinal
+from src.data_wrangling.loader import WorkbookSpec, prepare_data
+from src.data_wrangling.profiling import profiled
+
+MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+RELS_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+REL_ID = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+# Parts shared by all sheets: text cells and number formats (dates)
+SHARED_PARTS = ("xl/sharedStrings.xml", "xl/styles.xml")
+
+
+def _sheet_key(name: str) -> str:
+    return name.capitalize().replace(" ", "_")
+
+
+def _is_month(key: str) -> bool:
+    try:
+        month_ordinal(key)
+    except ValueError:
+        return False
+    return True
+
+
+@profiled()
+def sheet_fingerprints(filename: str) -> dict[str, str]:
+    """CRC of every sheet XML stored in the xlsx archive, read from the zip
+    directory without decompressing sheets
+    ----------
+    Parameters:
+    filename : filename of the excel file
+    -------
+    Returns:
+    dictionary sheet key (as in prepare_data) -> fingerprint, which also
+    changes when shared strings or styles of the workbook change
+    """
+    with zipfile.ZipFile(filename) as archive:
+        crcs = {info.filename: info.CRC for info in archive.infolist()}
+        workbook = ElementTree.fromstring(archive.read("xl/workbook.xml"))
+        rels = ElementTree.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+    targets = {}
+    for rel in rels.iter(f"{RELS_NS}Relationship"):
+        target = rel.get("Target")
+        if target.startswith("/"):
+            target = target[1:]
+        else:
+            target = posixpath.normpath(posixpath.join("xl", target))
+        targets[rel.get("Id")] = target
+    shared = "".join(f"-{crcs.get(part, 0):08x}" for part in SHARED_PARTS)
+    fingerprints = {}
+    for sheet in workbook.iter(f"{MAIN_NS}sheet"):
+        crc = crcs[targets[sheet.get(REL_ID)]]
+        fingerprints[_sheet_key(sheet.get("name"))] = f"{crc:08x}{shared}"
+    return fingerprints
+
+
+class WorkbookWatcher:
+    """Parsed data of a workbook, kept up to date by re-parsing changed sheets
+    ----------
+    Attributes:
+    spec : WorkbookSpec of the workbook
+    sections : (incomes, savings, expenses, food_consuming) as prepare_data returns
+    fingerprints : fingerprints of sheets from sheet_fingerprints
+    """
+
+    def __init__(self, spec: WorkbookSpec, use_cache: bool = True):
+        self.spec = WorkbookSpec(*spec)
+        self._stat = _stat(self.spec.filename)
+        self.fingerprints = sheet_fingerprints(self.spec.filename)
+        self.sections = tuple(
+            dict(section)
+            for section in prepare_data(
+                self.spec.filename,
+                self.spec.drop,
+                self.spec.food_consume,
+                use_cache,
+                start=self.spec.start,
+                end=self.spec.end,
+                sections=self.spec.sections,
+            )
+        )
+
+    @profiled("watch_poll")
+    def poll(self) -> set[str]:
+        """Re-parse sheets changed since the previous poll
+        ----------
+        Returns:
+        keys of changed, added and removed month sheets, empty set if the file
+        has not changed (checked by size and modification time first);
+        dropped sheets and sheets which are not months (e.g. a report)
+        are never returned nor parsed, a change of shared strings or styles
+        marks every month sheet as changed;
+        if the file can not be read (e.g. it is being saved) the error is
+        raised and the same changes are found by the next poll
+        """
+        stat = _stat(self.spec.filename)
+        if stat == self._stat:
+            return set()
+        fingerprints = sheet_fingerprints(self.spec.filename)
+        dropped = {_sheet_key(key) for key in self.spec.drop}
+        changed = {
+            key
+            for key in fingerprints.keys() | self.fingerprints.keys()
+            if fingerprints.get(key) != self.fingerprints.get(key)
+            and key not in dropped
+            and _is_month(key)
+        }
+        if changed:
+            parsed = prepare_data(
+                self.spec.filename,
+                sorted(key for key in fingerprints if key not in changed),
+                self.spec.food_consume,
+                use_cache=False,
+                start=self.spec.start,
+                end=self.spec.end,
+                sections=self.spec.sections,
+            )
+            for section, update in zip(self.sections, parsed):
+                for key in changed:
+                    section.pop(key, None)
+                section.update(update)
+        self._stat = stat
+        self.fingerprints = fingerprints
+        return changed
+
+
+def _stat(filename: str) -> tuple:
+    stat = os.stat(filename)
+    return stat.st_size, stat.st_mtime_ns
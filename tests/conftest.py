@@ -0,0 +1,24 @@
+# Shared fixtures: synthetic workbooks and an isolated cache directory
+
+import pytest
+from benchmarks.synthetic import generate
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    directory = tmp_path / "cache"
+    monkeypatch.setenv("HFA_CACHE_DIR", str(directory))
+    monkeypatch.delenv("HFA_NO_CACHE", raising=False)
+    return directory
+
+
+@pytest.fixture(scope="session")
+def specs(tmp_path_factory):
+    """Two households, two yearly workbooks each, with food consuming rows"""
+    directory = tmp_path_factory.mktemp("workbooks")
+    return generate(directory, years=2, households=2, food=True, first_year=2020)
+
+
+@pytest.fixture(scope="session")
+def workbook(specs):
+    return specs[0].filename
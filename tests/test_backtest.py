@@ -0,0 +1,70 @@
+# Vectorized backtest against forecasts made at every cutoff one by one
+
+import numpy as np
+import pytest
+from src.data_wrangling.backtest import _loop, backtest, method_forecasts
+from src.data_wrangling.forecaster import FORECAST_METHODS, forecast, monthly_matrix
+from src.data_wrangling.loader import prepare_many
+
+
+@pytest.fixture(scope="module")
+def expenses(specs):
+    return prepare_many(specs, workers=1, use_cache=False)["household_1"][2]
+
+
+@pytest.mark.parametrize("method", list(FORECAST_METHODS))
+def test_vectorized_matches_loop(expenses, method):
+    matrix = monthly_matrix(expenses)
+    values = np.asarray(matrix.values, dtype=np.float64)
+    cutoffs = np.arange(1, len(values))
+    horizon = 6
+    targets = np.minimum(cutoffs[:, np.newaxis] + np.arange(horizon), len(values) - 1)
+    expected = _loop(
+        FORECAST_METHODS[method], values, matrix.ordinals, cutoffs, targets
+    )
+    result = method_forecasts(matrix, method, cutoffs, horizon)
+    np.testing.assert_allclose(result, expected, rtol=1e-9, atol=1e-6)
+
+
+@pytest.mark.parametrize("kwargs", [{"window": 3}, {"alpha": 0.7}])
+def test_vectorized_matches_loop_with_options(expenses, kwargs):
+    matrix = monthly_matrix(expenses)
+    method = "trailing_mean" if "window" in kwargs else "ewm"
+    values = np.asarray(matrix.values, dtype=np.float64)
+    cutoffs = np.arange(1, len(values))
+    targets = np.minimum(cutoffs[:, np.newaxis] + np.arange(3), len(values) - 1)
+    expected = _loop(
+        FORECAST_METHODS[method], values, matrix.ordinals, cutoffs, targets, **kwargs
+    )
+    result = method_forecasts(matrix, method, cutoffs, 3, **kwargs)
+    np.testing.assert_allclose(result, expected, rtol=1e-9, atol=1e-6)
+
+
+def test_backtest_matches_forecast(expenses):
+    result = backtest(expenses, horizon=3, methods=["mean", "seasonal_naive"])
+    rows = result.forecasts[result.forecasts["cutoff"] == "Декабрь_2020"]
+    for method, group in rows.groupby("method", sort=False):
+        expected = forecast(expenses, "Декабрь_2020", method)
+        assert group["month"].tolist() == ["Январь_2021", "Февраль_2021", "Март_2021"]
+        assert group["forecast"].tolist() == pytest.approx(
+            [expected[month] for month in group["month"]], abs=0.5
+        )
+        assert group["actual"].tolist() == pytest.approx(
+            [expenses[month].to_numpy().sum() for month in group["month"]]
+        )
+    assert list(result.total.index) == ["mean", "seasonal_naive"]
+    assert (result.total["count"] > 0).all()
+
+
+def test_aliases_are_backtested_once(expenses):
+    result = backtest(expenses, horizon=2)
+    assert list(result.total.index) == [
+        "mean",
+        "trailing_mean",
+        "ewm",
+        "seasonal_naive",
+        "linear_trend",
+    ]
+    assert set(result.channels.index.get_level_values("method")) == set(
+        result.total.index
+    )
@@ -0,0 +1,86 @@
+# On-disk cache of parsed workbooks: round trip and invalidation
+
+import os
+import shutil
+
+import pandas as pd
+import pandas.testing as pdt
+from benchmarks.synthetic import write_workbook
+from src.data_wrangling import loader
+from src.data_wrangling.cache import cache_entry, clear_cache, load_cached
+
+
+def assert_sections_equal(left: tuple, right: tuple) -> None:
+    assert len(left) == len(right)
+    for left_section, right_section in zip(left, right):
+        assert list(left_section) == list(right_section)
+        for key, value in left_section.items():
+            if isinstance(value, pd.Series):
+                pdt.assert_series_equal(value, right_section[key])
+            else:
+                pdt.assert_frame_equal(value, right_section[key])
+
+
+def count_parses(monkeypatch) -> list:
+    calls = []
+    parse = loader._parse_workbook
+
+    def counted(*args):
+        calls.append(args[0])
+        return parse(*args)
+
+    monkeypatch.setattr(loader, "_parse_workbook", counted)
+    return calls
+
+
+def test_cache_round_trip(workbook, cache_dir, monkeypatch):
+    calls = count_parses(monkeypatch)
+    parsed = loader.prepare_data(workbook, food_consume=True)
+    cached = loader.prepare_data(workbook, food_consume=True)
+    assert len(calls) == 1
+    assert len(list(cache_dir.iterdir())) == 1
+    assert_sections_equal(cached, parsed)
+    assert_sections_equal(
+        load_cached(cache_entry(workbook, drop=[], food_consume=True)), parsed
+    )
+
+
+def test_cache_keyed_by_arguments(workbook, monkeypatch):
+    calls = count_parses(monkeypatch)
+    loader.prepare_data(workbook)
+    loader.prepare_data(workbook, food_consume=True)
+    loader.prepare_data(workbook, ["Январь_2020"])
+    loader.prepare_data(workbook, sections=["savings"])
+    loader.prepare_data(workbook, sections=["savings"])
+    loader.prepare_data(workbook, start="Март_2020", sections=["savings"])
+    assert len(calls) == 5
+
+
+def test_cache_invalidated_by_changed_file(workbook, tmp_path, cache_dir, monkeypatch):
+    path = tmp_path / "workbook.xlsx"
+    shutil.copy(workbook, path)
+    first = loader.prepare_data(str(path))
+    stat = os.stat(path)
+    write_workbook(str(path), 2020, seed=7)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    calls = count_parses(monkeypatch)
+    changed = loader.prepare_data(str(path))
+    assert len(calls) == 1
+    assert not first[0]["Январь_2020"].equals(changed[0]["Январь_2020"])
+    assert_sections_equal(changed, loader.prepare_data(str(path), use_cache=False))
+    assert len(list(cache_dir.iterdir())) == 1
+
+
+def test_cache_disabled(workbook, cache_dir, monkeypatch):
+    calls = count_parses(monkeypatch)
+    monkeypatch.setenv("HFA_NO_CACHE", "1")
+    loader.prepare_data(workbook)
+    loader.prepare_data(workbook)
+    assert len(calls) == 2
+    assert not cache_dir.exists() or not any(cache_dir.iterdir())
+
+
+def test_clear_cache(workbook, cache_dir):
+    loader.prepare_data(workbook)
+    clear_cache()
+    assert not cache_dir.exists() or not any(cache_dir.iterdir())
@@ -0,0 +1,174 @@
+# Configuration file and command line interface
+
+import json
+import os
+import subprocess
+import sys
+
+import cli
+import pytest
+from src.data_wrangling.config import load_config
+from src.data_wrangling.server import InvalidQuery
+
+CONFIG = """
+[households.both]
+members = ["household_1", "household_2"]
+history_start = { incomes = "Март_2020" }
+
+[forecast]
+method = "mean"
+incomes_until = "Июнь_2021"
+expenses_until = "Март_2021"
+options = { channels = [["еда", "мясо"], "машина"] }
+
+[plot]
+start = "Январь_2021"
+end = "Декабрь_2021"
+"""
+
+
+@pytest.fixture
+def config_path(specs, tmp_path):
+    workbooks = "".join(
+        f"[[workbooks]]\nhousehold = {json.dumps(spec.household)}\n"
+        f"path = {json.dumps(spec.filename)}\nfood_consume = true\n\n"
+        for spec in specs
+    )
+    path = tmp_path / "config.toml"
+    path.write_text(workbooks + CONFIG, encoding="utf-8")
+    return path
+
+
+def test_load_config(config_path, specs):
+    config = load_config(str(config_path))
+    assert config.workbooks == specs
+    assert list(config.households) == ["household_1", "household_2", "both"]
+    assert config.households["both"].history_start == {"incomes": "Март_2020"}
+    assert config.forecast["options"]["channels"] == [("еда", "мясо"), "машина"]
+
+
+def test_load_json_config_with_relative_paths(specs, tmp_path):
+    path = tmp_path / "config.json"
+    workbook = {"path": specs[0].filename, "household": "me", "drop": ["Май_2020"]}
+    path.write_text(json.dumps({"workbooks": [workbook]}), encoding="utf-8")
+    config = load_config(str(path))
+    assert config.workbooks[0].drop == ["Май_2020"]
+    relative = tmp_path / "relative.json"
+    workbook["path"] = "workbooks/1.xlsx"
+    relative.write_text(json.dumps({"workbooks": [workbook]}), encoding="utf-8")
+    assert load_config(str(relative)).workbooks[0].filename == str(
+        tmp_path / "workbooks" / "1.xlsx"
+    )
+
+
+@pytest.mark.parametrize(
+    "text, message",
+    [
+        ('[[workbooks]]\npath = "a.xlsx"\n', "requires 'path' and 'household'"),
+        ('[households.x]\nmembers = ["y"]\n', "unknown members"),
+        ("[households.x]\n", "neither workbooks nor members"),
+        (
+            '[[workbooks]]\npath = "a.xlsx"\nhousehold = "x"\n'
+            '[households.x]\nhistory_start = { food = "Май_2020" }\n',
+            "Unknown sections",
+        ),
+    ],
+)
+def test_invalid_config(tmp_path, text, message):
+    path = tmp_path / "config.toml"
+    path.write_text(text, encoding="utf-8")
+    with pytest.raises(ValueError, match=message):
+        load_config(str(path))
+
+
+def test_forecast_command(config_path, capsys):
+    assert cli.main([str(config_path), "--household", "both", "forecast"]) == 0
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].split() == [
+        "incomes",
+        "expenses",
+        "savings",
+        "incomes_forecasted",
+        "expenses_forecasted",
+        "savings_forecasted",
+    ]
+    assert len(lines) == 2 + 12
+    assert lines[2].split()[:2] == ["both", "Январь_2021"]
+    flags = [line.split()[-3:] for line in lines[2:]]
+    assert [incomes for incomes, _, _ in flags] == ["False"] * 6 + ["True"] * 6
+    assert [expenses for _, expenses, _ in flags] == ["False"] * 3 + ["True"] * 9
+    assert all(savings == expenses for _, expenses, savings in flags)
+
+
+def test_daily_table_matches_months(config_path):
+    config = load_config(str(config_path))
+    households = cli.build_households(config, use_cache=False)
+    incomes, savings, expenses = households["household_1"]
+    table = cli.daily_table(households, ["household_1"], "month").loc["household_1"]
+    assert len(table) == len(incomes) == 24
+    assert table["incomes"].tolist() == pytest.approx(
+        [frame.to_numpy().sum() for frame in incomes.values()]
+    )
+    assert table["expenses"].tolist() == pytest.approx(
+        [frame.to_numpy().sum() for frame in expenses.values()]
+    )
+    assert table["savings"].tolist() == [series.iat[-1] for series in savings.values()]
+    assert table["low"].tolist() == [series.min() for series in savings.values()]
+
+
+def test_daily_command(config_path, capsys):
+    argv = [str(config_path), "--household", "both", "daily", "--freq", "quarter"]
+    assert cli.main(argv) == 0
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].split() == [
+        "incomes",
+        "expenses",
+        "savings",
+        "low",
+        "low_date",
+        "payday",
+    ]
+    assert [line.split()[-7] for line in lines[2:]] == [
+        f"{year}Q{quarter}" for year in (2020, 2021) for quarter in range(1, 5)
+    ]
+
+
+def test_report_command(config_path, tmp_path):
+    report = tmp_path / "report.html"
+    assert cli.main([str(config_path), "report", str(report)]) == 0
+    assert report.read_text(encoding="utf-8").count('class="plotly-graph-div"') == 3
+
+
+def test_unknown_household(config_path):
+    with pytest.raises(SystemExit, match="Unknown household"):
+        cli.main([str(config_path), "--household", "nobody", "forecast"])
+
+
+def test_config_does_not_import_pandas(config_path):
+    code = (
+        "import sys, cli; cli.load_config(sys.argv[1]); "
+        "print(sorted({'pandas', 'numpy', 'plotly'} & set(sys.modules)))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code, str(config_path)],
+        cwd=os.path.dirname(os.path.abspath(cli.__file__)),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.strip() == "[]"
+
+
+def test_dashboard_chart_invalid_query(config_path):
+    config = load_config(str(config_path))
+    households = cli.build_households(config, use_cache=False)
+    cubes = cli.build_cubes(households)
+    for params in (
+        {"household": "nobody"},
+        {"household": "both", "method": "median"},
+        {"household": "both", "start": "Январь 2021"},
+    ):
+        with pytest.raises(InvalidQuery):
+            cli.dashboard_chart(config, households, cubes, "margin", **params)
+    chart = cli.dashboard_chart(config, households, cubes, "alluvial", "both")
+    assert json.loads(chart)["data"][0]["type"] == "sankey"
@@ -0,0 +1,95 @@
+# CompactArchive round trip and exact kopeck matrices
+
+import numpy as np
+import pandas as pd
+import pandas.testing as pdt
+import pytest
+from src.data_wrangling.compact import compact
+from src.data_wrangling.forecaster import forecast, monthly_matrix
+from src.data_wrangling.household import combine_households, combine_sections
+from src.data_wrangling.loader import prepare_many
+
+SECTION_NAMES = ("incomes", "savings", "expenses")
+
+
+@pytest.fixture(scope="module")
+def prepared(specs):
+    return prepare_many(specs, workers=1, use_cache=False)
+
+
+@pytest.fixture(scope="module")
+def archive(prepared):
+    return compact(prepared)
+
+
+def assert_dicts_close(result: dict, expected: dict) -> None:
+    """Equal up to kopecks, amounts of the archive are always float64"""
+    assert list(result) == list(expected)
+    options = dict(atol=0.005, rtol=0, check_dtype=False)
+    for key, value in expected.items():
+        if isinstance(value, pd.Series):
+            pdt.assert_series_equal(result[key], value, **options)
+        else:
+            pdt.assert_frame_equal(
+                result[key], value, check_column_type=False, **options
+            )
+
+
+@pytest.mark.parametrize("household", ["household_1", "household_2"])
+@pytest.mark.parametrize("section", range(3))
+def test_round_trip(prepared, archive, household, section):
+    assert_dicts_close(
+        archive.to_dict(SECTION_NAMES[section], household),
+        prepared[household][section],
+    )
+
+
+def test_summed_households(prepared, archive):
+    combined = combine_sections(prepared)
+    for result, expected in zip(archive.to_dicts(), combined):
+        assert_dicts_close(result, expected)
+
+
+def test_savings_keep_last_balance(prepared):
+    first = prepared["household_1"]
+    second = tuple(
+        {key: value for key, value in section.items() if key != "Май_2021"}
+        for section in prepared["household_2"][:3]
+    )
+    archive = compact({"household_1": first, "household_2": second})
+    savings = archive.to_dict("savings")
+    expected = combine_households(
+        {"first": first[1], "second": second[1]}, balances=True
+    )
+    assert_dicts_close(savings, expected)
+    assert savings["Май_2021"].iat[-1] == pytest.approx(
+        first[1]["Май_2021"].iat[-1] + second[1]["Апрель_2021"].iat[-1]
+    )
+    expenses = archive.to_dict("expenses")
+    assert expenses["Май_2021"].to_numpy().sum() == pytest.approx(
+        first[2]["Май_2021"].to_numpy().sum()
+    )
+
+
+def test_households_and_months(archive):
+    assert archive.households == ["household_1", "household_2"]
+    months = archive.months("expenses", "household_1")
+    assert len(months) == 24
+    assert months[0] == "Январь_2020" and months[-1] == "Декабрь_2021"
+    with pytest.raises(ValueError):
+        archive.add("household_1", ({}, {}, {}))
+
+
+def test_kopeck_matrix(prepared, archive):
+    expenses = prepared["household_1"][2]
+    matrix = archive.matrix("expenses", "household_1", kopecks=True)
+    assert matrix.unit == 100
+    assert matrix.values.dtype.kind == "i"
+    rubles = archive.matrix("expenses", "household_1")
+    assert rubles.unit == 1
+    pdt.assert_index_equal(matrix.columns, rubles.columns)
+    np.testing.assert_allclose(matrix.values / 100, rubles.values)
+    expected = forecast(monthly_matrix(expenses), "Декабрь_2020")
+    result = forecast(matrix, "Декабрь_2020")
+    assert list(result) == list(expected)
+    assert list(result.values()) == pytest.approx(list(expected.values()))
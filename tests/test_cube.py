@@ -0,0 +1,119 @@
+# Category cube: incremental updates and queries against pandas groupby
+
+import numpy as np
+import pandas as pd
+import pandas.testing as pdt
+import pytest
+from src.data_wrangling.cube import CategoryCube
+from src.data_wrangling.loader import prepare_many
+
+
+@pytest.fixture(scope="module")
+def expenses(specs):
+    return prepare_many(specs, workers=1, use_cache=False)["household_1"][2]
+
+
+@pytest.fixture(scope="module")
+def sums(expenses):
+    """Monthly sums month x (group, channel) built with pandas"""
+    return pd.DataFrame({key: frame.sum() for key, frame in expenses.items()}).T
+
+
+def assert_cubes_equal(result: CategoryCube, expected: CategoryCube) -> None:
+    assert result.months == expected.months
+    assert result.ordinals.tolist() == expected.ordinals.tolist()
+    assert list(result.channels) == list(expected.channels)
+    assert list(result.groups) == list(expected.groups)
+    np.testing.assert_allclose(result.values, expected.values)
+    np.testing.assert_allclose(result.group_values, expected.group_values)
+    np.testing.assert_allclose(result.month_totals, expected.month_totals)
+
+
+def test_update_matches_build(expenses):
+    keys = list(expenses)
+    cube = CategoryCube({key: expenses[key] for key in keys[6:12]})
+    cube.update({key: expenses[key] for key in keys[12:]})
+    cube.update({key: expenses[key] for key in keys[:6]})
+    assert_cubes_equal(cube, CategoryCube(expenses))
+
+
+def test_update_replaces_months_and_adds_channels(expenses):
+    keys = list(expenses)
+    cube = CategoryCube(expenses)
+    changed = expenses[keys[3]] * 2
+    changed[("Новая группа", "канал")] = 7.0
+    cube.update({keys[3]: changed})
+    assert cube.channels[-1] == ("Новая группа", "канал")
+    assert cube.groups[-1] == "Новая группа"
+    assert cube.series("Новая группа").sum() == 7.0 * len(changed)
+    first = {key: expenses[key] for key in keys[:3]}
+    rebuilt = CategoryCube({**first, keys[3]: changed})
+    rebuilt.update({key: expenses[key] for key in keys[4:]})
+    assert_cubes_equal(cube, rebuilt)
+    assert cube.month(keys[3]).sum() == pytest.approx(changed.to_numpy().sum())
+
+
+def test_duplicated_channels_are_summed(expenses):
+    keys = list(expenses)
+    channel = expenses[keys[0]].columns[0]
+
+    def duplicated(frame):
+        position = frame.columns.get_loc(channel)
+        return frame.iloc[:, [*range(frame.shape[1]), position]]
+
+    def summed(frame):
+        frame = frame.copy()
+        frame[channel] = frame[channel] * 2
+        return frame
+
+    expected = CategoryCube({key: summed(frame) for key, frame in expenses.items()})
+    cube = CategoryCube({key: duplicated(frame) for key, frame in expenses.items()})
+    assert cube.channels.is_unique
+    assert_cubes_equal(cube, expected)
+    cube = CategoryCube({key: expenses[key] for key in keys[:6]})
+    cube.update({key: duplicated(expenses[key]) for key in keys[6:]})
+    partial = CategoryCube({key: expenses[key] for key in keys[:6]})
+    partial.update({key: summed(expenses[key]) for key in keys[6:]})
+    assert_cubes_equal(cube, partial)
+
+
+def test_empty_cube_update(expenses):
+    cube = CategoryCube()
+    cube.update(expenses)
+    assert_cubes_equal(cube, CategoryCube(expenses))
+
+
+def test_queries_match_groupby(expenses, sums):
+    cube = CategoryCube(expenses)
+    period = sums.loc["Март_2020":"Август_2020"]
+    total = period.sum()
+    pdt.assert_series_equal(
+        cube.total(start="Март_2020", end="Август_2020"), total, check_names=False
+    )
+    groups = total.groupby(level=0, sort=False).sum()
+    pdt.assert_series_equal(
+        cube.total("group", "Март_2020", "Август_2020"), groups, check_names=False
+    )
+    top = cube.top(3, "group", months=12)
+    expected = sums.iloc[-12:].sum().groupby(level=0).sum().nlargest(3)
+    assert list(top.index) == list(expected.index)
+    assert top.tolist() == pytest.approx(expected.tolist())
+    assert cube.series("еда", "мясо").tolist() == pytest.approx(
+        sums[("еда", "мясо")].tolist()
+    )
+    assert cube.series().tolist() == pytest.approx(sums.sum(axis=1).tolist())
+    with pytest.raises(ValueError, match="Unknown level"):
+        cube.total("month")
+
+
+@pytest.mark.parametrize("level", ["channel", "group"])
+def test_sums_dict_matches_groupby(expenses, sums, level):
+    result = CategoryCube(expenses).sums_dict("Ноябрь_2020", "Февраль_2021", level)
+    months = ["Ноябрь_2020", "Декабрь_2020", "Январь_2021", "Февраль_2021"]
+    assert list(result) == months
+    for key, value in result.items():
+        expected = sums.loc[key]
+        if level == "group":
+            expected = expected.groupby(level=0, sort=False).sum()
+        assert list(value.index) == list(expected.index)
+        assert value.tolist() == pytest.approx(expected.tolist())
@@ -0,0 +1,138 @@
+# Month keys: ordinals, sorting and period selection against the original versions
+
+from datetime import datetime
+
+import pytest
+from src.data_wrangling.dict_handler import ENG_MONTHS, MONTHS, MonthDict
+from src.data_wrangling.dict_handler import MonthIndex, month_key, month_ordinal
+from src.data_wrangling.dict_handler import reduce_dict_by_time, select_months
+from src.data_wrangling.dict_handler import select_ranges, sort_dict_by_time
+
+KEYS = ["Март_2021", "январь_2024", "December_2020", "Февраль_2021", "Май_2019"]
+
+
+def baseline_sort(source_dict: dict, ascending: bool = True) -> dict:
+    """sort_dict_by_time of the first version of dict_handler"""
+    ru_to_eng_months = dict(zip(MONTHS, ENG_MONTHS))
+    keys = []
+    for key in source_dict.keys():
+        for ru_month, eng_month in ru_to_eng_months.items():
+            key = key.lower().capitalize()
+            key = key.replace(ru_month, eng_month)
+        keys.append(datetime.strptime(key, "%B_%Y"))
+    time_dict = dict(zip(keys, list(source_dict.values())))
+    sorted_time_dict = dict(sorted(time_dict.items(), reverse=(not ascending)))
+    keys = []
+    for key in sorted_time_dict.keys():
+        key = key.strftime("%B_%Y")
+        for ru_month, eng_month in ru_to_eng_months.items():
+            key = key.replace(eng_month, ru_month)
+        keys.append(key)
+    return dict(zip(keys, list(sorted_time_dict.values())))
+
+
+def baseline_reduce(source_dict: dict, start_month: str, end_month=False) -> dict:
+    """reduce_dict_by_time of the first version of dict_handler"""
+
+    def del_items(sdict: dict, keys: list, month: str):
+        for key in keys:
+            if key == month:
+                break
+            del sdict[key]
+        return sdict
+
+    source_dict = baseline_sort(source_dict)
+    source_dict = del_items(source_dict, list(source_dict.keys()), start_month)
+    if end_month:
+        end_keys = list(source_dict.keys())
+        end_keys.reverse()
+        source_dict = del_items(source_dict, end_keys, end_month)
+    return source_dict
+
+
+def test_month_ordinal_round_trip():
+    assert month_ordinal("Январь_2024") == 2024 * 12
+    assert month_ordinal("december_2023") == 2024 * 12 - 1
+    for ordinal in range(2019 * 12, 2026 * 12):
+        assert month_ordinal(month_key(ordinal)) == ordinal
+
+
+@pytest.mark.parametrize("key", ["Январь", "Январь_24a", "Jan_2024", "2024_Январь"])
+def test_month_ordinal_rejects_other_formats(key):
+    with pytest.raises(ValueError, match="does not match format"):
+        month_ordinal(key)
+
+
+@pytest.mark.parametrize("ascending", [True, False])
+def test_sort_matches_baseline(ascending):
+    source = {key: i for i, key in enumerate(KEYS)}
+    result = sort_dict_by_time(source, ascending)
+    expected = baseline_sort(source, ascending)
+    assert list(result.items()) == list(expected.items())
+    assert result.ascending == ascending
+
+
+def test_month_dict_tracks_order():
+    months = sort_dict_by_time({key: None for key in KEYS})
+    months["Апрель_2024"] = None
+    assert months.ascending is True
+    assert sort_dict_by_time(months) is not months
+    months["Январь_2000"] = None
+    assert months.ascending is None
+    assert list(sort_dict_by_time(months))[0] == "Январь_2000"
+    months = MonthDict(ascending=True)
+    months.update({"Май_2020": None})
+    assert months.ascending is None
+
+
+@pytest.fixture
+def months():
+    """Two years of months in reverse order as in workbooks, values are objects"""
+    keys = [month_key(ordinal) for ordinal in range(2021 * 12 + 11, 2020 * 12 - 1, -1)]
+    return {key: object() for key in keys}
+
+
+@pytest.mark.parametrize(
+    "start, end",
+    [
+        ("Январь_2020", False),
+        ("Март_2020", "Май_2020"),
+        ("Декабрь_2021", "Декабрь_2021"),
+        ("Февраль_2020", "Ноябрь_2021"),
+    ],
+)
+def test_reduce_matches_baseline(months, start, end):
+    result = reduce_dict_by_time(months, start, end)
+    assert list(result.items()) == list(baseline_reduce(months, start, end).items())
+
+
+def test_select_months_absent_boundaries(months):
+    assert list(select_months(months, "Июнь_2019", "Февраль_2020")) == [
+        "Январь_2020",
+        "Февраль_2020",
+    ]
+    assert list(select_months(months, "Декабрь_2021", "Май_2030")) == [
+        "Декабрь_2021"
+    ]
+    assert len(select_months(months)) == 24
+    assert select_months(months, "Май_2020", "Март_2020") == {}
+    assert select_months(months, "Январь_2030") == {}
+
+
+def test_select_ranges_matches_select_months(months):
+    ranges = [("Март_2020", "Май_2020"), (None, "Февраль_2020"), ("Ноябрь_2021", None)]
+    selected = select_ranges(months, ranges)
+    assert len(selected) == 3
+    for result, period in zip(selected, ranges):
+        expected = select_months(months, *period)
+        assert list(result.items()) == list(expected.items())
+        assert result.ascending is True
+        assert all(value is months[key] for key, value in result.items())
+
+
+def test_month_index_bounds(months):
+    index = MonthIndex(months)
+    assert index.keys[0] == "Январь_2020" and index.ordinals == sorted(index.ordinals)
+    assert index.bounds() == slice(0, 24)
+    assert index.bounds("Март_2020", "Май_2020") == slice(2, 5)
+    assert index.bounds("Май_2020", "Март_2020") == slice(4, 4)
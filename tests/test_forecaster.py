@@ -0,0 +1,288 @@
+# Forecasts against the original implementation and seeded Monte Carlo simulation
+
+import numpy as np
+import pandas as pd
+import pandas.testing as pdt
+import pytest
+from src.data_wrangling.dict_handler import MONTHS, month_key, month_ordinal
+from src.data_wrangling.dict_handler import reduce_dict_by_time, sort_dict_by_time
+from src.data_wrangling.forecaster import FORECAST_METHODS, Scenario, forecast
+from src.data_wrangling.forecaster import SavingsScenario, forecast_many
+from src.data_wrangling.forecaster import forecast_savings
+from src.data_wrangling.forecaster import register_method, savings_trajectories
+from src.data_wrangling.forecaster import scenario_dicts, simulate
+from src.data_wrangling.loader import prepare_many
+
+UNTIL = "Декабрь_2020"
+
+
+@pytest.fixture(scope="module")
+def sections(specs):
+    return prepare_many(specs, workers=1, use_cache=False)["household_1"]
+
+
+def baseline_mean(source_dict: dict, until: str, channels: list = []) -> dict:
+    """mean and drop_channels methods of the first version of forecast"""
+    forecasted_dict = {}
+    stop_summirize = False
+    mean = 0
+    for i, (key, value) in enumerate(sort_dict_by_time(source_dict).items()):
+        value = value.drop(columns=[c for c in channels if c in value.columns])
+        if not stop_summirize:
+            forecasted_dict[key] = value.values.sum()
+            if key == until:
+                mean = round(sum(forecasted_dict.values()) / (i + 1))
+                stop_summirize = True
+        else:
+            forecasted_dict[key] = mean
+    return forecasted_dict
+
+
+def baseline_savings(savings: dict, incomes: dict, expenses: dict, until: str):
+    """forecast_savings of the first version of forecaster"""
+    forecasted_dict = {}
+    start_sum_savings = False
+    save_value = 0
+    for key, value in sort_dict_by_time(savings).items():
+        if not start_sum_savings:
+            forecasted_dict[key] = value.iat[-1]
+            if key == until:
+                save_value = value.iat[-1]
+                start_sum_savings = True
+        else:
+            forecasted_dict[key] = incomes[key] - expenses[key] + save_value
+            save_value = forecasted_dict[key]
+    return forecasted_dict
+
+
+def assert_dict_approx(result: dict, expected: dict) -> None:
+    assert list(result) == list(expected)
+    assert list(result.values()) == pytest.approx(list(expected.values()))
+
+
+@pytest.mark.parametrize("section", [0, 2])
+def test_mean_matches_baseline(sections, section):
+    assert_dict_approx(
+        forecast(sections[section], UNTIL), baseline_mean(sections[section], UNTIL)
+    )
+
+
+@pytest.mark.filterwarnings("ignore::pandas.errors.PerformanceWarning")
+def test_drop_channels_matches_baseline(sections):
+    expenses = sections[2]
+    channels = ["еда", ("машина", "бензин")]
+    assert_dict_approx(
+        forecast(expenses, UNTIL, "drop_channels", channels=channels),
+        baseline_mean(expenses, UNTIL, channels),
+    )
+
+
+def test_forecast_savings_matches_baseline(sections):
+    incomes, savings, expenses, _ = sections
+    forecasted_incomes = forecast(incomes, UNTIL)
+    forecasted_expenses = forecast(expenses, UNTIL)
+    result = forecast_savings(savings, forecasted_incomes, forecasted_expenses, UNTIL)
+    expected = baseline_savings(
+        savings,
+        baseline_mean(incomes, UNTIL),
+        baseline_mean(expenses, UNTIL),
+        UNTIL,
+    )
+    assert_dict_approx(result, expected)
+
+
+def test_seasonal_naive_repeats_last_year(sections):
+    expenses = sections[2]
+    result = forecast(expenses, UNTIL, "seasonal_naive")
+    assert result["Март_2021"] == round(expenses["Март_2020"].values.sum())
+
+
+def test_unknown_method(sections):
+    with pytest.raises(ValueError, match="Unknown forecast method"):
+        forecast(sections[0], UNTIL, "median")
+
+
+def linear_months(n: int) -> dict:
+    """Months of 2020 with a single channel growing by 10 every month"""
+    return {
+        month_key(2020 * 12 + i): pd.DataFrame({"a": [100.0 + 10 * i, 0.0]})
+        for i in range(n)
+    }
+
+
+def test_trend_and_trailing_mean():
+    source = linear_months(12)
+    trend = forecast(source, "Июнь_2020", "linear_trend")
+    assert list(trend.values())[6:] == [160, 170, 180, 190, 200, 210]
+    trailing = forecast(source, "Июнь_2020", "trailing_mean", window=2)
+    assert trailing["Декабрь_2020"] == 145
+
+
+def test_register_method():
+    @register_method("test_last")
+    def last(history: np.ndarray, months: np.ndarray, horizon: int, **kwargs):
+        return np.repeat(history[-1:], horizon, axis=0)
+
+    try:
+        result = forecast(linear_months(4), "Февраль_2020", "test_last")
+        assert list(result.values()) == [100, 110, 110, 110]
+    finally:
+        del FORECAST_METHODS["test_last"]
+
+
+@pytest.mark.filterwarnings("ignore::pandas.errors.PerformanceWarning")
+def test_forecast_many_matches_forecast(specs):
+    prepared = prepare_many(specs, workers=1, use_cache=False)
+    series = {}
+    for household, sections in prepared.items():
+        series[f"{household} incomes"] = sections[0]
+        series[f"{household} savings"] = sections[1]
+        series[f"{household} expenses"] = sections[2]
+    scenarios = [
+        Scenario("mean", "household_1 incomes", UNTIL),
+        Scenario("seasonal", "household_1 expenses", "Март_2021", "seasonal_naive"),
+        Scenario("no food", "household_2 expenses", UNTIL, "drop_channels", ("еда",)),
+        Scenario("ewm", "household_2 incomes", UNTIL, "ewm", (), {"alpha": 0.5}),
+        Scenario("trend", "household_1 incomes", UNTIL, "linear_trend"),
+    ]
+    savings = [
+        SavingsScenario(
+            "mean savings", "household_1 savings", "mean", "seasonal", UNTIL
+        ),
+        SavingsScenario(
+            "trend savings", "household_1 savings", "trend", "seasonal", UNTIL
+        ),
+        SavingsScenario(
+            "savings 2", "household_2 savings", "ewm", "no food", "Март_2021", "zero"
+        ),
+    ]
+    table = forecast_many(series, scenarios, savings)
+    result = scenario_dicts(table)
+    assert list(result) == [
+        "mean",
+        "seasonal",
+        "no food",
+        "ewm",
+        "trend",
+        "mean savings",
+        "trend savings",
+        "savings 2",
+    ]
+    for scenario in scenarios:
+        expected = forecast(
+            series[scenario.series],
+            scenario.until,
+            scenario.method,
+            channels=scenario.channels,
+            **(scenario.kwargs or {}),
+        )
+        assert_dict_approx(result[scenario.name], expected)
+        rows = table[table["scenario"] == scenario.name]
+        assert rows["forecasted"].tolist() == [
+            month_ordinal(month) > month_ordinal(scenario.until) for month in expected
+        ]
+    for scenario in savings:
+        expected = forecast_savings(
+            series[scenario.series],
+            result[scenario.incomes],
+            result[scenario.expenses],
+            scenario.until,
+            scenario.fill,
+        )
+        assert list(result[scenario.name]) == list(expected)
+        assert_dict_approx(result[scenario.name], expected)
+        rows = table[table["scenario"] == scenario.name]
+        assert rows["forecasted"].tolist() == [
+            month_ordinal(month) > month_ordinal(scenario.until) for month in expected
+        ]
+
+
+@pytest.mark.parametrize(
+    "start, end",
+    [("Март_2020", "Август_2020"), ("Май_2019", "Март_2020"), (None, "Май_2020")],
+)
+def test_scenario_dicts_select_period(start, end):
+    series = {"short": linear_months(6), "long": linear_months(12)}
+    table = forecast_many(
+        series,
+        [
+            Scenario("short", "short", "Апрель_2020"),
+            Scenario("long", "long", "Июнь_2020", "linear_trend"),
+        ],
+    )
+    result = scenario_dicts(table, start, end)
+    for name, forecasted in scenario_dicts(table).items():
+        expected = reduce_dict_by_time(forecasted, start, end)
+        assert list(result[name].items()) == list(expected.items())
+
+
+def month_savings(balances: dict) -> dict:
+    """Savings series with the balance at the last day of every month"""
+    return {
+        key: pd.Series([0.0, balance], name="остаток")
+        for key, balance in balances.items()
+    }
+
+
+def test_forecast_savings_fill_policies():
+    savings = month_savings({"Январь_2020": 100, "Февраль_2020": 150})
+    incomes = {"Март_2020": 50, "Май_2020": 40}
+    expenses = {"Март_2020": 20, "Апрель_2020": 10, "Май_2020": 30}
+    until = "Февраль_2020"
+    truncated = forecast_savings(savings, incomes, expenses, until)
+    assert list(truncated) == ["Январь_2020", "Февраль_2020", "Март_2020"]
+    assert list(truncated.values()) == [100, 150, 180]
+    zero = forecast_savings(savings, incomes, expenses, until, fill="zero")
+    assert list(zero.values())[2:] == [180, 170, 180]
+    ffill = forecast_savings(savings, incomes, expenses, until, fill="ffill")
+    assert list(ffill.values())[2:] == [180, 220, 230]
+    with pytest.raises(KeyError, match="Апрель_2020"):
+        forecast_savings(savings, incomes, expenses, until, fill="raise")
+    with pytest.raises(ValueError, match="Unknown fill policy"):
+        forecast_savings(savings, incomes, expenses, until, fill="bfill")
+
+
+def test_forecast_savings_cutoff_absent_in_savings():
+    savings = month_savings({"Январь_2020": 100})
+    result = forecast_savings(
+        savings, {"Март_2020": 50}, {"Март_2020": 20}, "Февраль_2020"
+    )
+    assert dict(result) == {"Январь_2020": 100, "Март_2020": 130}
+    with pytest.raises(ValueError, match="No savings recorded"):
+        forecast_savings(savings, {}, {}, "Декабрь_2019")
+
+
+def test_savings_trajectories_per_scenario():
+    incomes = np.array([[10, 20], [10, 20], [10, 20]])
+    expenses = np.array([[5, 30], [5, 30], [5, 30]])
+    result = savings_trajectories(np.array([100, 200]), incomes, expenses)
+    assert result.tolist() == [[105, 190], [110, 180], [115, 170]]
+
+
+def test_simulate_is_reproducible(sections):
+    incomes, savings, expenses, _ = sections
+    first = simulate(incomes, expenses, savings, UNTIL, n_paths=500, seed=42)
+    second = simulate(incomes, expenses, savings, UNTIL, n_paths=500, seed=42)
+    other = simulate(incomes, expenses, savings, UNTIL, n_paths=500, seed=43)
+    for left, right in zip(first, second):
+        if left.ndim == 1:
+            pdt.assert_series_equal(left, right)
+        else:
+            pdt.assert_frame_equal(left, right)
+    assert not first.savings.equals(other.savings)
+    assert list(first.savings.index) == [f"{month}_2021" for month in MONTHS]
+    assert np.all(np.diff(first.savings.to_numpy(), axis=1) >= 0)
+
+
+def test_simulate_draws_whole_months(sections):
+    incomes, savings, expenses, _ = sections
+    until = "Январь_2020"
+    result = simulate(incomes, expenses, savings, until, horizon=3, n_paths=50, seed=0)
+    income = incomes[until].values.sum()
+    expense = expenses[until].values.sum()
+    assert np.allclose(result.incomes.to_numpy(), income)
+    assert np.allclose(result.expenses.to_numpy(), expense)
+    start = savings[until].iat[-1]
+    assert np.allclose(
+        result.savings["p50"].to_numpy(), start + (income - expense) * np.arange(1, 4)
+    )
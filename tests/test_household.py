@@ -0,0 +1,89 @@
+# Combined households: month policies and savings balances
+
+import pandas as pd
+import pytest
+from src.data_wrangling.household import combine_households, combine_sections
+from src.data_wrangling.loader import prepare_many
+
+
+@pytest.fixture(scope="module")
+def prepared(specs):
+    return prepare_many(specs, workers=1, use_cache=False)
+
+
+def test_sum_of_households(prepared):
+    incomes, savings, expenses = combine_sections(prepared)
+    for combined, section in zip((incomes, expenses), (0, 2)):
+        assert len(combined) == 24
+        assert combined["Май_2021"].to_numpy().sum() == pytest.approx(
+            sum(
+                sections[section]["Май_2021"].to_numpy().sum()
+                for sections in prepared.values()
+            )
+        )
+    assert savings["Май_2021"].iat[-1] == pytest.approx(
+        sum(sections[1]["Май_2021"].iat[-1] for sections in prepared.values())
+    )
+
+
+def test_month_policies(prepared):
+    first, second = (sections[2] for sections in prepared.values())
+    second = {key: value for key, value in second.items() if key != "Май_2021"}
+    union = combine_households({"first": first, "second": second})
+    intersection = combine_households(
+        {"first": first, "second": second}, months="intersection"
+    )
+    assert len(union) == 24 and len(intersection) == 23
+    assert "Май_2021" not in intersection
+    assert union["Май_2021"].to_numpy().sum() == pytest.approx(
+        first["Май_2021"].to_numpy().sum()
+    )
+
+
+def test_union_keeps_last_balance(prepared):
+    first, second = (sections[1] for sections in prepared.values())
+    second = {key: value for key, value in second.items() if key != "Май_2021"}
+    combined = combine_households({"first": first, "second": second})
+    intersection = combine_households(
+        {"first": first, "second": second}, months="intersection", balances=True
+    )
+    balances = combine_households({"first": first, "second": second}, balances=True)
+    assert "Май_2021" not in intersection
+    assert combined["Май_2021"].iat[-1] == pytest.approx(first["Май_2021"].iat[-1])
+    assert balances["Май_2021"].iat[-1] == pytest.approx(
+        first["Май_2021"].iat[-1] + second["Апрель_2021"].iat[-1]
+    )
+    assert balances["Июнь_2021"].iat[-1] == pytest.approx(combined["Июнь_2021"].iat[-1])
+
+
+def test_balances_start_with_first_month():
+    index = pd.date_range("2024-01-01", "2024-01-31", name=("дата", "дата"))
+    later = pd.date_range("2024-02-01", "2024-02-29", name=("дата", "дата"))
+    first = {
+        "Январь_2024": pd.Series(1.0, index=index, name="остаток"),
+        "Февраль_2024": pd.Series(2.0, index=later, name="остаток"),
+    }
+    second = {"Февраль_2024": pd.Series(10.0, index=later, name="остаток")}
+    combined = combine_households({"a": first, "b": second}, balances=True)
+    assert combined["Январь_2024"].iat[-1] == 1
+    assert combined["Февраль_2024"].iat[-1] == 12
+
+
+def test_keep_household(prepared):
+    expenses = combine_households(
+        {name: sections[2] for name, sections in prepared.items()},
+        keep_household=True,
+    )
+    frame = expenses["Май_2021"]
+    assert list(frame.index.get_level_values(0).unique()) == [
+        "household_1",
+        "household_2",
+    ]
+    assert frame.loc["household_2"].to_numpy().sum() == pytest.approx(
+        prepared["household_2"][2]["Май_2021"].to_numpy().sum()
+    )
+
+
+def test_unknown_policy(prepared):
+    with pytest.raises(ValueError, match="Unknown months policy"):
+        combine_sections(prepared, months="all")
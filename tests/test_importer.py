@@ -0,0 +1,124 @@
+# Bank statement import: categorization, daily sums and invalid rows
+
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+from benchmarks.synthetic import statement_rules, write_statement
+from src.data_wrangling.importer import CompiledRules, Rule, StatementFormat
+from src.data_wrangling.importer import import_statement, template_columns
+
+RULES = [
+    Rule("Зарплата", pattern=r"^ZARPLATA"),
+    Rule(("жилье", "аренда"), keywords=("ZHKU",), min_amount=5_000),
+    Rule(("жилье", "ремонт"), keywords=("ZHKU",)),
+    Rule(("еда", "мясо"), keywords=("myasnoy", "ferma")),
+]
+STATEMENT = """date,description,amount
+2024-01-05,ZARPLATA OOO ROMASHKA,100000
+2024-01-05,Myasnoy dvor 12,-1500.50
+2024-01-20,ZHKU january,-7000
+2024-02-03,zhku repair,-300
+2024-02-03,FERMA 7,-200
+2024-02-10,CAFE,-450
+2024-02-11,PEREVOD OT,2500
+2024-02-11,,-50
+"""
+
+
+def test_categorize():
+    rules = CompiledRules(RULES)
+    descriptions = pd.Series(
+        ["ZARPLATA 1", "zhku", "ZHKU", "Ferma", "ZARPLATA 2", None]
+    )
+    expense, codes = rules.categorize(
+        descriptions, np.array([10.0, -6_000, -100, -5, -3, -1])
+    )
+    assert expense.tolist() == [False, True, True, True, True, True]
+    columns = [
+        rules.expenses[code] if is_expense else rules.incomes[code]
+        for is_expense, code in zip(expense, codes)
+    ]
+    assert columns == [
+        "Зарплата",
+        ("жилье", "аренда"),
+        ("жилье", "ремонт"),
+        ("еда", "мясо"),
+        ("Разное", "разное"),
+        ("Разное", "разное"),
+    ]
+
+
+def test_unknown_column(workbook):
+    incomes, expenses = template_columns(workbook)
+    assert "Зарплата" in incomes and ("еда", "мясо") in expenses
+    with pytest.raises(ValueError, match="absent in expenses"):
+        CompiledRules([Rule(("еда", "икра"), keywords=("IKRA",))], incomes, expenses)
+
+
+@pytest.mark.parametrize("chunk_rows", [2, 100])
+def test_import_statement(chunk_rows):
+    incomes, savings, expenses, food = import_statement(
+        io.StringIO(STATEMENT), RULES, opening_balance=1_000, chunk_rows=chunk_rows
+    )
+    assert list(incomes) == ["Январь_2024", "Февраль_2024"]
+    assert food == {}
+    january, february = expenses["Январь_2024"], expenses["Февраль_2024"]
+    assert len(january) == 31 and len(february) == 29
+    assert january.loc["2024-01-05", ("еда", "мясо")] == 1500.5
+    assert january.loc["2024-01-20", ("жилье", "аренда")] == 7000
+    assert february.loc["2024-02-03", ("жилье", "ремонт")] == 300
+    assert february.loc["2024-02-10", ("Разное", "разное")] == 450
+    assert february.loc["2024-02-11", ("Разное", "разное")] == 50
+    assert incomes["Февраль_2024"].loc["2024-02-11", "Разное"] == 2500
+    assert incomes["Январь_2024"].to_numpy().sum() == 100_000
+    january_savings = savings["Январь_2024"]
+    assert january_savings.loc["2024-01-04"] == 1_000
+    assert january_savings.loc["2024-01-05"] == 1_000 + 100_000 - 1500.5
+    assert (january_savings["2024-01-20":] == 1_000 + 100_000 - 1500.5 - 7000).all()
+    assert savings["Февраль_2024"].iat[-1] == pytest.approx(
+        1_000 + 100_000 + 2500 - 1500.5 - 7000 - 300 - 200 - 450 - 50
+    )
+
+
+@pytest.mark.parametrize("amount", ["", "NaN", "inf"])
+def test_rows_without_amount(amount):
+    statement = STATEMENT + f"2024-02-12,CAFE,{amount}\n"
+    with pytest.raises(ValueError, match="rows of the statement: 9"):
+        import_statement(io.StringIO(statement), RULES)
+
+
+def test_rows_without_date():
+    statement = STATEMENT.replace("2024-02-10", "")
+    with pytest.raises(ValueError, match="rows of the statement: 6"):
+        import_statement(io.StringIO(statement), RULES, chunk_rows=4)
+
+
+def test_statement_format():
+    statement = (
+        "Дата;Описание;Сумма\n05.01.2024;ZARPLATA;1 000,50\n06.01.2024;CAFE;-10,25\n"
+    )
+    statement_format = StatementFormat(
+        "Дата", "Описание", "Сумма", dayfirst=True, sep=";", decimal=",", thousands=" "
+    )
+    incomes, savings, expenses, _ = import_statement(
+        io.StringIO(statement), RULES, statement_format
+    )
+    assert incomes["Январь_2024"].loc["2024-01-05", "Зарплата"] == 1000.5
+    assert expenses["Январь_2024"].loc["2024-01-06", ("Разное", "разное")] == 10.25
+
+
+def test_synthetic_statement_totals(workbook, tmp_path):
+    path = tmp_path / "statement.csv"
+    write_statement(str(path), 2_000, first_year=2020, seed=3)
+    rules = CompiledRules(statement_rules(), *template_columns(workbook))
+    incomes, savings, expenses, _ = import_statement(str(path), rules, chunk_rows=500)
+    amounts = pd.read_csv(path)["amount"]
+    assert sum(frame.to_numpy().sum() for frame in incomes.values()) == pytest.approx(
+        amounts[amounts > 0].sum()
+    )
+    assert sum(frame.to_numpy().sum() for frame in expenses.values()) == pytest.approx(
+        -amounts[amounts < 0].sum()
+    )
+    assert next(reversed(savings.values())).iat[-1] == pytest.approx(amounts.sum())
@@ -0,0 +1,69 @@
+# Long-format ledger: round trip to month dictionaries and groupby sums
+
+import pandas as pd
+import pandas.testing as pdt
+import pytest
+from src.data_wrangling.ledger import concat_ledgers, from_ledger, monthly_totals
+from src.data_wrangling.ledger import channel_sums, month_end_savings, to_ledger
+from src.data_wrangling.loader import prepare_many
+
+SECTION_NAMES = ("incomes", "savings", "expenses")
+
+
+@pytest.fixture(scope="module")
+def prepared(specs):
+    return prepare_many(specs, workers=1, use_cache=False)
+
+
+@pytest.fixture(scope="module")
+def ledger(prepared):
+    return concat_ledgers(
+        [
+            to_ledger(*sections[:3], household=household)
+            for household, sections in prepared.items()
+        ]
+    )
+
+
+def assert_dict_equal(result: dict, expected: dict) -> None:
+    """Equal values, amounts of the ledger are always float64"""
+    assert list(result) == list(expected)
+    for key, value in expected.items():
+        if isinstance(value, pd.Series):
+            pdt.assert_series_equal(result[key], value, check_dtype=False)
+        else:
+            pdt.assert_frame_equal(
+                result[key], value, check_dtype=False, check_column_type=False
+            )
+
+
+@pytest.mark.parametrize("section", range(3))
+def test_round_trip(prepared, section):
+    sections = prepared["household_1"]
+    ledger = to_ledger(*sections[:3], household="household_1")
+    assert_dict_equal(from_ledger(ledger, SECTION_NAMES[section]), sections[section])
+
+
+def test_households_share_categories(ledger):
+    assert list(ledger["household"].cat.categories) == ["household_1", "household_2"]
+    for column in ("household", "section", "group", "channel"):
+        assert isinstance(ledger[column].dtype, pd.CategoricalDtype)
+
+
+def test_monthly_and_channel_sums(prepared, ledger):
+    totals = monthly_totals(ledger, "expenses")
+    channels = channel_sums(ledger, "expenses")
+    month = pd.Period("2021-05", freq="M")
+    for household, sections in prepared.items():
+        expected = sections[2]["Май_2021"]
+        assert totals.loc[month, household] == pytest.approx(expected.values.sum())
+    both = sum(sections[2]["Май_2021"].sum() for sections in prepared.values())
+    assert channels.loc[month, ("еда", "мясо")] == pytest.approx(both["еда", "мясо"])
+
+
+def test_month_end_savings(prepared, ledger):
+    savings = month_end_savings(ledger)
+    for household, sections in prepared.items():
+        assert savings[household].tolist() == pytest.approx(
+            [value.iat[-1] for value in sections[1].values()]
+        )
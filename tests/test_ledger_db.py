@@ -0,0 +1,103 @@
+# SQLite ledger: incremental sync, household reassignment and queries
+
+import os
+import shutil
+
+import pandas as pd
+import pandas.testing as pdt
+import pytest
+from src.data_wrangling.ledger import from_ledger, to_ledger
+from src.data_wrangling.ledger_db import connect, load_sections, query_ledger, sync
+from src.data_wrangling.ledger_db import total
+from src.data_wrangling.loader import WorkbookSpec, prepare_many
+
+
+@pytest.fixture
+def workbooks(specs, tmp_path):
+    """Copies of the synthetic workbooks which tests may change"""
+    copies = []
+    for spec in specs:
+        path = tmp_path / os.path.basename(spec.filename)
+        shutil.copy(spec.filename, path)
+        copies.append(spec._replace(filename=str(path)))
+    return copies
+
+
+@pytest.fixture
+def connection(tmp_path):
+    connection = connect(str(tmp_path / "ledger.sqlite"))
+    yield connection
+    connection.close()
+
+
+def assert_matches_workbooks(connection, specs: list, household: str) -> None:
+    prepared = prepare_many(specs, workers=1)[household]
+    ledger = to_ledger(*prepared[:3], household=household)
+    for section, loaded in zip(
+        ("incomes", "savings", "expenses"), load_sections(connection, household)
+    ):
+        expected = from_ledger(ledger, section)
+        assert list(loaded) == list(expected)
+        for key, value in expected.items():
+            if isinstance(value, pd.Series):
+                pdt.assert_series_equal(loaded[key], value)
+            else:
+                pdt.assert_frame_equal(loaded[key], value)
+
+
+def test_sync_round_trip(connection, workbooks):
+    status = sync(connection, workbooks, workers=1)
+    assert set(status.values()) == {"added"}
+    for household in ("household_1", "household_2"):
+        household_specs = [spec for spec in workbooks if spec.household == household]
+        assert_matches_workbooks(connection, household_specs, household)
+
+
+def test_sync_is_incremental(connection, workbooks):
+    sync(connection, workbooks, workers=1)
+    status = sync(connection, workbooks, workers=1)
+    assert set(status.values()) == {"unchanged"}
+
+    stat = os.stat(workbooks[0].filename)
+    os.utime(workbooks[0].filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    status = sync(connection, workbooks[:3], workers=1)
+    assert status == {
+        workbooks[0].filename: "updated",
+        workbooks[1].filename: "unchanged",
+        workbooks[2].filename: "unchanged",
+        os.path.abspath(workbooks[3].filename): "removed",
+    }
+    assert query_ledger(connection, "household_2", start="Январь_2021").empty
+    assert_matches_workbooks(connection, workbooks[2:3], "household_2")
+
+
+def test_sync_household_reassignment(connection, workbooks):
+    sync(connection, workbooks, workers=1)
+    moved = workbooks[3]._replace(household="household_3")
+    status = sync(connection, workbooks[:3] + [moved], workers=1)
+    assert status[moved.filename] == "updated"
+    assert query_ledger(connection, "household_2", start="Январь_2021").empty
+    assert_matches_workbooks(connection, [moved], "household_3")
+    assert_matches_workbooks(connection, workbooks[2:3], "household_2")
+
+
+def test_later_workbook_overrides_months(connection, workbooks):
+    first = workbooks[0]
+    second = WorkbookSpec(workbooks[2].filename, household=first.household)
+    sync(connection, [second, first], workers=1)
+    assert_matches_workbooks(connection, [second, first], first.household)
+    sync(connection, [first, second], workers=1)
+    assert_matches_workbooks(connection, [first, second], first.household)
+
+
+def test_total_and_query(connection, workbooks):
+    sync(connection, workbooks, workers=1)
+    ledger = query_ledger(
+        connection, "household_1", "expenses", "Март_2020", "Май_2020", group="еда"
+    )
+    assert set(ledger["group"]) == {"еда"}
+    assert set(ledger["month"].astype(str)) == {"2020-03", "2020-04", "2020-05"}
+    assert total(
+        connection, "expenses", "household_1", "Март_2020", "Май_2020", "еда"
+    ) == pytest.approx(ledger["amount"].sum())
+    assert query_ledger(connection, "nobody").empty
@@ -0,0 +1,180 @@
+# prepare_data and read_workbook against the original pd.read_excel loader
+
+import pandas as pd
+import pandas.testing as pdt
+import pytest
+from src.data_wrangling.loader import WorkbookLoadError, prepare_data, prepare_many
+from src.data_wrangling.loader import read_workbook
+from tests.test_cache import assert_sections_equal
+
+
+def baseline_prepare_data(filename: str, drop: list[str] = [], food_consume=False):
+    """prepare_data of the first version of the loader"""
+    workbook = pd.read_excel(
+        filename, sheet_name=None, nrows=31, skiprows=2, header=None
+    )
+    workbook_columns = pd.read_excel(filename, sheet_name=None, nrows=2, header=None)
+    workbook = dict((k.capitalize().replace(" ", "_"), v) for k, v in workbook.items())
+    workbook_columns = dict(
+        (k.capitalize().replace(" ", "_"), v) for k, v in workbook_columns.items()
+    )
+    for sheet in drop:
+        sheet = sheet.capitalize().replace(" ", "_")
+        workbook.pop(sheet)
+        workbook_columns.pop(sheet)
+
+    for key, sheet_column in workbook_columns.items():
+        sheet_column = sheet_column.ffill().ffill(axis="columns")
+        sheet_column = sheet_column.transpose()
+        workbook[key].columns = pd.MultiIndex.from_frame(sheet_column)
+        workbook[key] = workbook[key].dropna(subset=[("дата", "дата")])
+        workbook[key] = workbook[key].set_index(keys=("дата", "дата"))
+
+    workbook_incomes = {
+        key: value["доход"].drop("общ. приход", axis="columns").fillna(0)
+        for (key, value) in workbook.items()
+    }
+    workbook_savings = {
+        key: value.xs("остаток", level=1, axis="columns", drop_level=False)
+        .droplevel(0, axis="columns")
+        .squeeze()
+        .fillna(0)
+        for (key, value) in workbook.items()
+    }
+    workbook_expenses = {}
+    for key in workbook.keys():
+        idx = workbook[key].columns.get_level_values(1).tolist().index("остаток")
+        workbook_expenses[key] = workbook[key].iloc[:, idx + 1 :].fillna(0)
+
+    food_consuming = {}
+    if food_consume:
+        food_consuming = pd.read_excel(
+            filename,
+            sheet_name=None,
+            nrows=1,
+            skiprows=34,
+            usecols="J:O",
+            index_col=0,
+            header=None,
+        )
+        for key in food_consuming.keys():
+            food_consuming[key] = food_consuming[key].squeeze("columns").transpose()
+            food_consuming[key].index = (
+                workbook_expenses[key]["еда"].columns.get_level_values(0).tolist()[:5]
+            )
+            food_consuming[key] = food_consuming[key].fillna(0)
+    return workbook_incomes, workbook_savings, workbook_expenses, food_consuming
+
+
+def test_read_workbook_matches_read_excel(workbook):
+    headers, bodies, food = read_workbook(workbook, food_consume=True)
+    expected = [
+        pd.read_excel(workbook, sheet_name=None, header=None, nrows=2),
+        pd.read_excel(workbook, sheet_name=None, header=None, nrows=31, skiprows=2),
+        pd.read_excel(
+            workbook,
+            sheet_name=None,
+            header=None,
+            nrows=1,
+            skiprows=34,
+            usecols="J:O",
+            index_col=0,
+        ),
+    ]
+    for frames, excel in zip((headers, bodies, food), expected):
+        assert list(frames) == list(excel)
+        for key, frame in frames.items():
+            pdt.assert_frame_equal(frame, excel[key])
+
+
+def test_prepare_data_matches_baseline(workbook):
+    assert_sections_equal(
+        prepare_data(workbook, food_consume=True, use_cache=False),
+        baseline_prepare_data(workbook, food_consume=True),
+    )
+
+
+def test_prepare_data_drop(workbook):
+    incomes, savings, expenses, food = prepare_data(
+        workbook, ["январь 2020"], food_consume=True, use_cache=False
+    )
+    for section in (incomes, savings, expenses, food):
+        assert "Январь_2020" not in section
+        assert len(section) == 11
+    with pytest.raises(KeyError):
+        prepare_data(workbook, ["Январь_1999"], use_cache=False)
+
+
+def test_prepare_data_period_and_sections(workbook):
+    incomes, savings, expenses, food = prepare_data(workbook, use_cache=False)
+    partial = prepare_data(
+        workbook,
+        start="Март_2020",
+        end="Май_2020",
+        sections=["savings", "expenses"],
+        use_cache=False,
+    )
+    months = ["Май_2020", "Апрель_2020", "Март_2020"]
+    assert partial[0] == {} and partial[3] == {}
+    assert_sections_equal(
+        partial[1:3],
+        ({key: savings[key] for key in months}, {key: expenses[key] for key in months}),
+    )
+
+
+def test_prepare_many_merges_households(specs):
+    households = prepare_many(specs, workers=1, use_cache=False)
+    assert list(households) == ["household_1", "household_2"]
+    incomes = households["household_1"][0]
+    assert len(incomes) == 24
+    assert list(incomes)[:2] == ["Январь_2020", "Февраль_2020"]
+    pdt.assert_frame_equal(
+        incomes["Январь_2021"],
+        prepare_data(specs[1].filename, use_cache=False)[0]["Январь_2021"],
+    )
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_prepare_many_reports_every_failed_workbook(specs, tmp_path, workers):
+    missing = [str(tmp_path / "missing_1.xlsx"), str(tmp_path / "missing_2.xlsx")]
+    specs = specs[:1] + [(filename,) for filename in missing]
+    with pytest.raises(WorkbookLoadError) as error:
+        prepare_many(specs, workers=workers, use_cache=False)
+    assert list(error.value.errors) == missing
+
+
+def test_prepare_data_section_periods(workbook):
+    incomes, savings, expenses, food = prepare_data(
+        workbook, food_consume=True, use_cache=False
+    )
+    partial = prepare_data(
+        workbook,
+        food_consume=True,
+        sections={"incomes": ("Ноябрь_2020", None), "food_consuming": (None, None)},
+        use_cache=False,
+    )
+    assert list(partial[0]) == ["Декабрь_2020", "Ноябрь_2020"]
+    assert partial[1] == {} and partial[2] == {}
+    assert_sections_equal(
+        (partial[0], partial[3]),
+        ({key: incomes[key] for key in partial[0]}, food),
+    )
+
+
+def test_read_workbook_text_cells(workbook, tmp_path):
+    from openpyxl import load_workbook
+
+    book = load_workbook(workbook)
+    sheet = book["Март_2020"]
+    sheet["B5"], sheet["C5"], sheet["D6"] = "n/a", "NA", "#N/A"
+    sheet["E7"] = "нет данных"
+    for row in range(3, 34):
+        sheet.cell(row, 16).value = str(sheet.cell(row, 16).value or 0)
+    path = tmp_path / "text.xlsx"
+    book.save(path)
+    headers, bodies, food = read_workbook(str(path), food_consume=True)
+    excel = pd.read_excel(path, sheet_name=None, header=None, nrows=31, skiprows=2)
+    for key, frame in bodies.items():
+        pdt.assert_frame_equal(frame, excel[key])
+    assert bodies["Март_2020"].iloc[2, 1:3].isna().all()
+    assert bodies["Март_2020"].iat[4, 4] == "нет данных"
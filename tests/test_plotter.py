@@ -0,0 +1,39 @@
+# Alluvial chart data against the original plot_alluvial
+
+import pandas as pd
+import pytest
+from src.data_wrangling.dict_handler import sort_dict_by_time
+from src.data_wrangling.loader import prepare_data
+from src.data_wrangling.plotter import sankey_data
+
+
+def baseline_sankey(inp_dict: dict) -> dict:
+    """Nodes and links of plot_alluvial of the first version of plotter"""
+    groups = [group.index.tolist() for group in inp_dict.values()]
+    groups = sorted(set(group for sublist in groups for group in sublist))
+    rows = [
+        (group, key, value)
+        for key, values in inp_dict.items()
+        for group, value in values.items()
+    ]
+    df = pd.DataFrame(rows, columns=["groups", "time", "values"]).fillna(0)
+    labels = groups + list(sort_dict_by_time(inp_dict).keys())
+    positive = df["values"] > 0
+    return dict(
+        labels=labels,
+        source=[labels.index(group) for group in df["groups"][positive]],
+        target=[labels.index(time) for time in df["time"][positive]],
+        value=df["values"][positive].tolist(),
+    )
+
+
+@pytest.mark.parametrize("section", [0, 2])
+def test_sankey_data_matches_baseline(workbook, section):
+    source = prepare_data(workbook, use_cache=False)[section]
+    monthly = {key: value.sum() for key, value in source.items()}
+    monthly["Май_2020"].iloc[0] = float("nan")
+    assert sankey_data(monthly) == baseline_sankey(monthly)
+
+
+def test_sankey_data_empty():
+    assert sankey_data({}) == dict(labels=[], source=[], target=[], value=[])
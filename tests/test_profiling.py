@@ -0,0 +1,64 @@
+# Stage-level profiling: nested stages, rows and disabled hooks
+
+import json
+
+import pytest
+from src.data_wrangling import profiling
+from src.data_wrangling.loader import prepare_data
+
+
+@pytest.fixture
+def profile():
+    profiling.reset()
+    yield profiling
+    profiling.disable()
+    profiling.reset()
+
+
+@profiling.profiled("count", rows=len)
+def count(n: int) -> list:
+    return list(range(n))
+
+
+def test_nested_stages(profile, tmp_path):
+    profile.enable(memory=True, cprofile_stage="inner")
+    with profile.stage("outer", rows=1) as outer:
+        for n in (2, 3):
+            with profile.stage("inner") as inner:
+                inner.add_rows(n)
+                count(n)
+        outer.add_rows(10)
+    stats = profile.stats()
+    assert stats["outer"]["calls"] == 1 and stats["outer"]["rows"] == 11
+    assert stats["inner"]["calls"] == 2 and stats["inner"]["rows"] == 5
+    assert stats["count"]["rows"] == 5
+    assert stats["outer"]["total"] >= stats["inner"]["total"]
+    assert stats["outer"]["peak_bytes"] >= stats["inner"]["peak_bytes"] >= 0
+    path = tmp_path / "trace.json"
+    profile.write_trace(str(path))
+    events = json.loads(path.read_text(encoding="utf-8"))["traceEvents"]
+    depths = {(event["name"], event["args"]["depth"]) for event in events}
+    assert depths == {("outer", 0), ("inner", 1), ("count", 2)}
+    assert (tmp_path / "trace.json.inner.prof").exists()
+    assert profile.summary().splitlines()[1].split()[0] == "outer"
+
+
+def test_disabled_records_nothing(profile):
+    assert not profile.enabled()
+    with profile.stage("outer", rows=1) as record:
+        record.add_rows(5)
+        count(3)
+    assert profile.stats() == {}
+    profile.enable()
+    count(3)
+    profile.disable()
+    count(3)
+    assert profile.stats()["count"]["calls"] == 1
+
+
+def test_loader_stages(profile, workbook):
+    profile.enable()
+    prepare_data(workbook, use_cache=False)
+    stats = profile.stats()
+    assert stats["prepare_data"]["calls"] == 1
+    assert stats["read_workbook"]["rows"] > 0
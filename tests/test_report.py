@@ -0,0 +1,51 @@
+# Headless charts written into static HTML reports
+
+import plotly.graph_objects as go
+import pytest
+from plotly.offline import get_plotlyjs
+from src.data_wrangling.loader import prepare_data
+from src.data_wrangling.plotter import plot_alluvial, plot_margin
+from src.data_wrangling.report import PLOTLY_JS, write_charts, write_report
+
+
+@pytest.fixture
+def figures(workbook, monkeypatch):
+    def no_browser(*args, **kwargs):
+        raise AssertionError("browser launched")
+
+    monkeypatch.setattr(go.Figure, "show", no_browser)
+    monkeypatch.setattr("webbrowser.open", no_browser)
+    incomes, savings, expenses, _ = prepare_data(workbook, use_cache=False)
+    margin = plot_margin(
+        {key: value.values.sum() for key, value in incomes.items()},
+        {key: value.iat[-1] for key, value in savings.items()},
+        {key: value.values.sum() for key, value in expenses.items()},
+        show=False,
+    )
+    monthly = {key: value.sum() for key, value in expenses.items()}
+    return {"Margin": margin, "Expenses": plot_alluvial(monthly, show=False)}
+
+
+def test_report_embeds_plotly_once(figures, tmp_path):
+    path = write_report(figures, tmp_path / "out" / "report.html", title="Test <1>")
+    text = path.read_text(encoding="utf-8")
+    assert text.count(get_plotlyjs()) == 1
+    assert "<title>Test &lt;1&gt;</title>" in text
+    assert "<h2>Margin</h2>" in text and "<h2>Expenses</h2>" in text
+    assert text.count('class="plotly-graph-div"') == 2
+
+
+def test_charts_share_current_plotly(figures, tmp_path):
+    (tmp_path / PLOTLY_JS).write_text("/* stale plotly */", encoding="utf-8")
+    paths = write_charts(figures, tmp_path)
+    assert [path.name for path in paths] == ["Margin.html", "Expenses.html"]
+    assert (tmp_path / PLOTLY_JS).read_text(encoding="utf-8") == get_plotlyjs()
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "Expenses.html",
+        "Margin.html",
+        PLOTLY_JS,
+    ]
+    for path in paths:
+        text = path.read_text(encoding="utf-8")
+        assert f'src="{PLOTLY_JS}"' in text
+        assert get_plotlyjs() not in text
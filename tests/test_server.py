@@ -0,0 +1,130 @@
+# SingleFlightCache under concurrent requests and status codes of the dashboard
+
+import json
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import pytest
+from src.data_wrangling.server import DashboardServer, InvalidQuery
+from src.data_wrangling.server import SingleFlightCache, SourceFingerprints
+
+
+def test_concurrent_requests_share_computation():
+    cache = SingleFlightCache(maxsize=4)
+    calls = []
+    started = threading.Event()
+
+    def compute():
+        calls.append(threading.get_ident())
+        started.set()
+        time.sleep(0.2)
+        return object()
+
+    results = [None] * 8
+
+    def request(i):
+        results[i] = cache.get("chart", compute)
+
+    threads = [threading.Thread(target=request, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    stats = cache.stats()
+    assert stats["misses"] == 1
+    assert stats["shared"] + stats["hits"] == 7
+
+
+def test_errors_are_shared_and_not_cached():
+    cache = SingleFlightCache()
+    started, release = threading.Event(), threading.Event()
+
+    def failing():
+        started.set()
+        release.wait(5)
+        raise RuntimeError("boom")
+
+    errors = []
+
+    def request(compute):
+        try:
+            cache.get("key", compute)
+        except RuntimeError as error:
+            errors.append(error)
+
+    owner = threading.Thread(target=request, args=(failing,))
+    owner.start()
+    started.wait(5)
+    waiter = threading.Thread(target=request, args=(lambda: "not called",))
+    waiter.start()
+    while cache.stats()["shared"] == 0:
+        time.sleep(0.01)
+    release.set()
+    owner.join()
+    waiter.join()
+    assert len(errors) == 2
+    assert cache.get("key", lambda: "computed") == "computed"
+
+
+def test_lru_eviction():
+    cache = SingleFlightCache(maxsize=2)
+    for key in "abc":
+        cache.get(key, lambda: key)
+    assert cache.get("a", lambda: "again") == "again"
+    assert cache.get("c", lambda: "again") == "c"
+
+
+@pytest.fixture
+def server():
+    def chart(name, params, fingerprints):
+        household = params.get("household")
+        if household == "unknown":
+            raise InvalidQuery(f"Unknown household {household!r}")
+        if household == "broken":
+            raise KeyError("internal")
+        return json.dumps({"chart": name, **params})
+
+    server = DashboardServer(("127.0.0.1", 0), chart, SourceFingerprints([]), {})
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def get(url: str) -> tuple:
+    try:
+        with urllib.request.urlopen(url) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as error:
+        return error.code, json.loads(error.read())
+
+
+@pytest.mark.parametrize(
+    "path, status",
+    [
+        ("/api/chart/margin?household=me", 200),
+        ("/api/chart/pie?household=me", 400),
+        ("/api/chart/margin?household=unknown", 400),
+        ("/api/chart/margin?household=broken", 500),
+        ("/api/missing", 404),
+        ("/api/options", 200),
+        ("/api/stats", 200),
+    ],
+)
+def test_status_codes(server, path, status):
+    code, body = get(server + path)
+    assert code == status
+    assert ("error" in body) == (status != 200)
+
+
+def test_chart_parameters(server):
+    query = urllib.parse.urlencode({"household": "me", "start": "Январь_2020", "x": 1})
+    code, body = get(f"{server}/api/chart/alluvial?{query}")
+    assert code == 200
+    assert body == {"chart": "alluvial", "household": "me", "start": "Январь_2020"}
@@ -0,0 +1,84 @@
+# Daily series: resampling against manual groupby, low points and paydays
+
+import pandas as pd
+import pandas.testing as pdt
+import pytest
+from src.data_wrangling.loader import prepare_many
+from src.data_wrangling.timeseries import low_points, paydays, resample, rolling
+from src.data_wrangling.timeseries import to_daily, to_daily_sections
+
+
+@pytest.fixture(scope="module")
+def daily(specs):
+    prepared = prepare_many(specs, workers=1, use_cache=False)
+    return to_daily_sections(prepared["household_1"])
+
+
+def manual_keys(index: pd.DatetimeIndex, freq: str) -> list:
+    if freq == "week":
+        return [(index - pd.to_timedelta(index.dayofweek, unit="D")).normalize()]
+    if freq == "month":
+        return [index.year, index.month]
+    if freq == "quarter":
+        return [index.year, (index.month - 1) // 3]
+    return [index.year]
+
+
+@pytest.mark.parametrize("freq", ["week", "month", "quarter", "year"])
+@pytest.mark.parametrize("section", [0, 2])
+def test_resample_sums_match_groupby(daily, freq, section):
+    series = daily[section]
+    result = resample(series, freq)
+    expected = series.groupby(manual_keys(series.index, freq)).sum()
+    assert len(result) == len(expected)
+    pdt.assert_frame_equal(
+        result.reset_index(drop=True), expected.reset_index(drop=True)
+    )
+
+
+def test_resample_month_matches_sheets(specs, daily):
+    incomes = prepare_many(specs, workers=1, use_cache=False)["household_1"][0]
+    monthly = resample(daily[0], "month").sum(axis="columns")
+    assert monthly.tolist() == pytest.approx(
+        [frame.to_numpy().sum() for frame in incomes.values()]
+    )
+    assert str(monthly.index[0]) == "2020-01"
+
+
+def test_to_daily_overrides_duplicated_dates():
+    index = pd.date_range("2024-01-30", periods=3, name=("дата", "дата"))
+    first = pd.DataFrame({"a": [1.0, 2.0, 3.0]}, index=index)
+    second = pd.DataFrame({"a": [20.0], "b": [5.0]}, index=index[1:2])
+    daily = to_daily({"Январь_2024": first, "Февраль_2024": second})
+    assert daily.index.name == "date"
+    assert daily["a"].tolist() == [1, 20, 3]
+    assert daily["b"].tolist() == [0, 5, 0]
+
+
+def test_low_points_and_paydays():
+    index = pd.date_range("2024-01-01", "2024-02-29")
+    savings = pd.Series(range(len(index)), index=index, dtype="float64")
+    savings["2024-01-10"] = -5
+    savings["2024-02-20"] = 1
+    lows = low_points(savings)
+    assert lows["day"].tolist() == [10, 20]
+    assert lows["low"].tolist() == [-5, 1]
+    assert lows["drawdown"].tolist() == [30 + 5, 59 - 1]
+    incomes = pd.DataFrame({"salary": 0.0, "bonus": 0.0}, index=index)
+    incomes.loc["2024-01-05", "salary"] = 100
+    incomes.loc["2024-01-20", ["salary", "bonus"]] = [60, 50]
+    incomes.loc["2024-02-05", "bonus"] = 10
+    result = paydays(incomes)
+    assert result["day"].tolist() == [20, 5]
+    assert result["amount"].tolist() == [110, 10]
+    assert [str(period) for period in result.index] == ["2024-01", "2024-02"]
+
+
+def test_rolling_and_unknown_options():
+    index = pd.date_range("2024-01-01", periods=5)
+    daily = pd.Series([1.0, 2, 3, 4, 5], index=index)
+    assert rolling(daily, "2D").tolist() == [1, 3, 5, 7, 9]
+    with pytest.raises(ValueError, match="Unknown frequency"):
+        resample(daily, "decade")
+    with pytest.raises(ValueError, match="Unknown aggregation"):
+        rolling(daily, how="last")
@@ -0,0 +1,104 @@
+# Sheet fingerprints and incremental re-parse of changed sheets
+
+import os
+import re
+import shutil
+import zipfile
+
+import pandas as pd
+import pandas.testing as pdt
+import pytest
+from src.data_wrangling.loader import prepare_data
+from src.data_wrangling.watch import WorkbookWatcher, sheet_fingerprints
+
+SHEETS = "xl/worksheets/sheet{}.xml"
+
+
+def rewrite_part(path, part: str, edit) -> None:
+    """Replace one part of the xlsx archive keeping all other parts intact"""
+    with zipfile.ZipFile(path) as archive:
+        parts = [(info, archive.read(info)) for info in archive.infolist()]
+    stat = os.stat(path)
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for info, data in parts:
+            if info.filename == part:
+                data = edit(data.decode("utf-8")).encode("utf-8")
+            archive.writestr(info, data)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+def set_cell(cell: str, value: float):
+    def edit(xml: str) -> str:
+        pattern = rf'<c r="{cell}"[^>]*>.*?</c>'
+        assert re.search(pattern, xml)
+        return re.sub(pattern, f'<c r="{cell}" t="n"><v>{value}</v></c>', xml)
+
+    return edit
+
+
+@pytest.fixture
+def watcher(workbook, tmp_path):
+    path = tmp_path / "workbook.xlsx"
+    shutil.copy(workbook, path)
+    return WorkbookWatcher((str(path), [], True), use_cache=False)
+
+
+def assert_matches_prepare_data(watcher, drop: list = None) -> None:
+    expected = prepare_data(
+        watcher.spec.filename,
+        watcher.spec.drop if drop is None else drop,
+        food_consume=True,
+        use_cache=False,
+    )
+    for section, expected_section in zip(watcher.sections, expected):
+        assert section.keys() == expected_section.keys()
+        for key, value in expected_section.items():
+            if isinstance(value, pd.Series):
+                pdt.assert_series_equal(section[key], value)
+            else:
+                pdt.assert_frame_equal(section[key], value)
+
+
+def test_unchanged_workbook(watcher):
+    assert watcher.poll() == set()
+    path = watcher.spec.filename
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert watcher.poll() == set()
+    assert_matches_prepare_data(watcher)
+
+
+def test_one_sheet_edited(watcher):
+    before = sheet_fingerprints(watcher.spec.filename)
+    # sheets go from December to January, sheet1 is December
+    rewrite_part(watcher.spec.filename, SHEETS.format(1), set_cell("B10", 777777))
+    after = sheet_fingerprints(watcher.spec.filename)
+    assert {key for key in after if after[key] != before[key]} == {"Декабрь_2020"}
+    assert watcher.poll() == {"Декабрь_2020"}
+    assert watcher.sections[0]["Декабрь_2020"].iat[7, 0] == 777777
+    assert_matches_prepare_data(watcher)
+    assert watcher.poll() == set()
+
+
+def test_non_month_sheets_are_skipped(workbook, tmp_path):
+    from openpyxl import load_workbook
+
+    path = tmp_path / "workbook.xlsx"
+    book = load_workbook(workbook)
+    book.create_sheet("Отчет")["A1"] = "итоги года"
+    book.save(path)
+    report = SHEETS.format(len(book.sheetnames))
+    watcher = WorkbookWatcher((str(path), ["Отчет"], True), use_cache=False)
+    months = set(watcher.sections[0])
+    rewrite_part(path, report, set_cell("A1", 5))
+    assert watcher.poll() == set()
+    # styles change every fingerprint, only month sheets are re-parsed
+    rewrite_part(path, "xl/styles.xml", lambda xml: xml.replace("Calibri", "Arial"))
+    assert watcher.poll() == months
+    assert_matches_prepare_data(watcher)
+    # a new sheet which is not a month and not in drop is skipped as well
+    book = load_workbook(path)
+    book.create_sheet("Заметки")["A1"] = "заметка"
+    book.save(path)
+    assert "Заметки" not in watcher.poll()
+    assert_matches_prepare_data(watcher, ["Отчет", "Заметки"])